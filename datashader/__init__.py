@@ -5,12 +5,17 @@ from distutils.version import LooseVersion
 import param
 __version__ = str(param.version.Version(fpath=__file__, archive_commit="$Format:%h$",reponame="datashader"))
 
-from .core import Canvas                                 # noqa (API import)
+from .core import Canvas, bypixel_many, warmup           # noqa (API import)
 from .reductions import *                                # noqa (API import)
 from .glyphs import Point                                # noqa (API import)
 from .pipeline import Pipeline                           # noqa (API import)
 from . import transfer_functions as tf                   # noqa (API import)
 from . import data_libraries                             # noqa (API import)
+from .streaming import StreamingAggregator, WindowedAggregator  # noqa (API import)
+from .pyramid import AggregatePyramid                    # noqa (API import)
+from .cache import AggregateCache                        # noqa (API import)
+from .memmap import MemmapFrame                          # noqa (API import)
+from . import profiling                                  # noqa (API import)
 
 
 # Make RaggedArray pandas extension array available for
@@ -1,12 +1,99 @@
+import sys
+
+
 def main(args=None):
+    argv = sys.argv[1:] if args is None else args
+    if argv and argv[0] == 'warmup':
+        return warmup_main(argv[1:])
     try:
         import pyct.cmd
     except ImportError:
-        import sys
         from . import _missing_cmd
         print(_missing_cmd())
         sys.exit(1)
     return pyct.cmd.substitute_main('datashader',args=args)
 
+
+_warmup_glyphs = {
+    'points': 'Point',
+    'line': 'LineAxis0',
+    'area': 'AreaToZeroAxis0',
+}
+
+
+def warmup_main(argv):
+    """Command line entry point for ``datashader.warmup``.
+
+    Example
+    -------
+    datashader warmup --column x:float64 --column y:float64 \\
+        --column cat:category:a,b,c --glyph points:x:y --glyph line:x:y \\
+        --agg count --agg mean:y --agg count_cat:cat --axis linear:log
+    """
+    import argparse
+    from collections import OrderedDict
+
+    parser = argparse.ArgumentParser(
+        prog='datashader warmup',
+        description="Precompile aggregation kernels for the given columns, "
+                    "glyphs and reductions")
+    parser.add_argument(
+        '--column', action='append', required=True, metavar='NAME:DTYPE',
+        help="Column name and dtype; categorical columns are given as "
+             "NAME:category:CAT1,CAT2,...")
+    parser.add_argument(
+        '--glyph', action='append', required=True, metavar='KIND:X:Y',
+        help="Glyph to compile for, where KIND is one of {0}".format(
+            ', '.join(sorted(_warmup_glyphs))))
+    parser.add_argument(
+        '--agg', action='append', metavar='REDUCTION[:COLUMN]',
+        help="Reduction to compile for (default: count)")
+    parser.add_argument(
+        '--axis', action='append', metavar='X_TYPE:Y_TYPE',
+        help="Axis types to compile for (default: linear:linear)")
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+    import datashader as ds
+    from datashader import glyphs as gl
+    from datashader import reductions as rd
+
+    schema = OrderedDict()
+    for spec in args.column:
+        parts = spec.split(':')
+        if len(parts) == 3 and parts[1] == 'category':
+            schema[parts[0]] = pd.api.types.CategoricalDtype(
+                parts[2].split(','))
+        elif len(parts) == 2:
+            schema[parts[0]] = parts[1]
+        else:
+            parser.error("invalid column specification: {0}".format(spec))
+
+    glyphs = []
+    for spec in args.glyph:
+        parts = spec.split(':')
+        if len(parts) != 3 or parts[0] not in _warmup_glyphs:
+            parser.error("invalid glyph specification: {0}".format(spec))
+        glyphs.append(getattr(gl, _warmup_glyphs[parts[0]])(*parts[1:]))
+
+    aggs = []
+    for spec in args.agg or ['count']:
+        parts = spec.split(':')
+        if (len(parts) > 2 or parts[0] not in rd.__all__ or
+                parts[0] == 'summary'):
+            parser.error("invalid reduction specification: {0}".format(spec))
+        try:
+            aggs.append(getattr(rd, parts[0])(*parts[1:]))
+        except (TypeError, ValueError) as e:
+            parser.error("invalid reduction specification: {0} ({1})"
+                         .format(spec, e))
+
+    axis_types = [tuple(spec.split(':')) for spec in args.axis or []]
+    if any(len(a) != 2 for a in axis_types):
+        parser.error("invalid axis specification")
+
+    ds.warmup(schema, glyphs, aggs, axis_types or [('linear', 'linear')])
+
+
 if __name__ == "__main__":
     main()
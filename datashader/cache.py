@@ -0,0 +1,163 @@
+from __future__ import absolute_import, division
+
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+
+import pandas as pd
+import dask.dataframe as dd
+
+
+__all__ = ['AggregateCache']
+
+
+class AggregateCache(object):
+    """Memory-bounded LRU cache of finalized aggregates.
+
+    Enable it for every aggregation by assigning an instance to
+    ``datashader.core.bypixel.cache``:
+
+    >>> import datashader as ds                          # doctest: +SKIP
+    >>> ds.core.bypixel.cache = ds.AggregateCache(max_bytes=2**30)  # doctest: +SKIP
+
+    Aggregates are keyed by the source, the canvas size, ranges and axis
+    types, the glyph and the reduction. Dask DataFrames are identified by
+    their graph token. pandas DataFrames are identified by a cheap
+    fingerprint of their identity, shape, dtypes and a fixed-size sample of
+    their rows, so in-place modifications outside the sampled rows are not
+    detected: call ``clear`` after modifying a DataFrame in place. The cache
+    holds a weak reference to each DataFrame, and evicts its aggregates once
+    it is garbage collected, so that a new DataFrame reusing its identity is
+    never served them.
+
+    Cached aggregates are returned as is, and must not be modified in place.
+
+    Parameters
+    ----------
+    max_bytes : int, optional
+        Budget for the total size of the cached aggregates. The least
+        recently used aggregates are evicted to stay within it. Aggregates
+        larger than the budget are not cached.
+    """
+    def __init__(self, max_bytes=2**29):
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        """Remove all cached aggregates and reset the statistics."""
+        with self._lock:
+            self._data = OrderedDict()
+            # Weak references to the cached pandas DataFrames by id, and the
+            # ids of those since garbage collected
+            self._sources = {}
+            self._dead = []
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    @property
+    def stats(self):
+        """Dictionary of hit, miss and eviction counts and cache usage."""
+        return dict(hits=self.hits, misses=self.misses,
+                    evictions=self.evictions, entries=len(self._data),
+                    nbytes=self.nbytes, max_bytes=self.max_bytes)
+
+    def key(self, source, canvas, glyph, agg):
+        """Cache key of an aggregation, or None if ``source`` is unsupported."""
+        token = source_token(source)
+        if token is None:
+            return None
+        if token[0] == 'pandas':
+            self._track(source)
+        return (token,
+                (canvas.plot_width, canvas.plot_height,
+                 canvas.x_range, canvas.y_range,
+                 type(canvas.x_axis).__name__, type(canvas.y_axis).__name__),
+                glyph, agg)
+
+    def get(self, key):
+        """Return the aggregate cached under ``key``, or None."""
+        with self._lock:
+            self._purge()
+            try:
+                value, nbytes = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            # Re-insert as most recently used
+            self._data[key] = value, nbytes
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Cache the aggregate ``value`` under ``key``, evicting as needed."""
+        nbytes = value.nbytes
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            self._purge()
+            if key in self._data:
+                self.nbytes -= self._data.pop(key)[1]
+            self._data[key] = value, nbytes
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted) = self._data.popitem(last=False)
+                self.nbytes -= evicted
+                self.evictions += 1
+
+    def _track(self, source):
+        """Evict the aggregates of the pandas DataFrame ``source`` once it is
+        garbage collected, before its id can be reused."""
+        source_id = id(source)
+        with self._lock:
+            self._purge()
+            if source_id in self._sources:
+                return
+            dead = self._dead
+            # The callback only records the id, since it may run in the
+            # middle of any operation, e.g. while the lock is held
+            self._sources[source_id] = weakref.ref(
+                source, lambda ref: dead.append(source_id))
+
+    def _purge(self):
+        """Remove the aggregates of garbage collected DataFrames."""
+        while self._dead:
+            source_id = self._dead.pop()
+            self._sources.pop(source_id, None)
+            for key in [k for k in self._data
+                        if k[0][:2] == ('pandas', source_id)]:
+                self.nbytes -= self._data.pop(key)[1]
+
+
+def source_token(source, nsamples=64):
+    """Token identifying the contents of ``source``, or None if unsupported.
+
+    Dask DataFrames are identified by their graph token, pandas DataFrames
+    by their identity, shape, dtypes and a hash of ``nsamples`` evenly
+    spaced rows plus the last row.
+    """
+    if isinstance(source, dd.DataFrame):
+        return ('dask', source.__dask_tokenize__())
+    if type(source) is not pd.DataFrame:
+        return None
+    n = len(source)
+    sample = source.iloc[::max(n // nsamples, 1)]
+    if n:
+        sample = pd.concat([sample, source.iloc[-1:]])
+    try:
+        hashed = pd.util.hash_pandas_object(sample, index=True).values
+        digest = hashlib.sha1(hashed.tobytes()).hexdigest()
+    except TypeError:
+        # Unhashable columns, e.g. ragged arrays
+        digest = None
+    return ('pandas', id(source), source.shape, tuple(source.columns),
+            tuple(str(d) for d in source.dtypes), digest)
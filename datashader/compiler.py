@@ -6,15 +6,15 @@ from toolz import unique, concat, pluck, get, memoize
 import numpy as np
 import xarray as xr
 
+from . import profiling
 from .compatibility import _exec
 from .reductions import summary
 from .utils import ngjit
 
 
-__all__ = ['compile_components']
+__all__ = ['compile_components', 'compile_retract']
 
 
-@memoize
 def compile_components(agg, schema, glyph, cuda=False):
     """Given a ``Aggregation`` object and a schema, return 5 sub-functions.
 
@@ -47,28 +47,85 @@ def compile_components(agg, schema, glyph, cuda=False):
     ``finalize(aggs)``
         Given a tuple of base numpy arrays, returns the finalized ``DataArray``
         or ``Dataset``.
+
+    The functions are generated once for each combination of arguments.
     """
-    reds = list(traverse_aggregation(agg))
+    with profiling.stage('compile') as stage:
+        ncompiled = len(_components_cache)
+        components = _compile_components(agg, schema, glyph, cuda)
+        stage.cache_hit = len(_components_cache) == ncompiled
+    return components
 
-    # List of base reductions (actually computed)
-    bases = list(unique(concat(r._build_bases(cuda) for r in reds)))
-    dshapes = [b.out_dshape(schema) for b in bases]
-    # List of tuples of (append, base, input columns, temps)
-    calls = [_get_call_tuples(b, d, schema, cuda) for (b, d) in zip(bases, dshapes)]
+
+_components_cache = {}
+
+
+@memoize(cache=_components_cache)
+def _compile_components(agg, schema, glyph, cuda):
+    bases, dshapes, calls, temps = _base_reductions(agg, schema, cuda)
     # List of unique column names needed
     cols = list(unique(concat(pluck(2, calls))))
-    # List of temps needed
-    temps = list(pluck(3, calls))
 
     create = make_create(bases, dshapes, cuda)
     info = make_info(cols)
     append = make_append(bases, cols, calls, glyph)
-    combine = make_combine(bases, dshapes, temps)
-    finalize = make_finalize(bases, agg, schema, cuda)
+    combine = _timed_combine(make_combine(bases, dshapes, temps, cuda))
+    finalize = _timed_finalize(make_finalize(bases, agg, schema, cuda))
 
     return create, info, append, combine, finalize
 
 
+def _timed_combine(combine):
+    """``combine``, reported as the ``combine`` stage to ``profiling``"""
+    def timed_combine(base_tuples):
+        with profiling.stage('combine'):
+            return combine(base_tuples)
+    return timed_combine
+
+
+def _timed_finalize(finalize):
+    """``finalize``, reported as the ``finalize`` stage to ``profiling``"""
+    def timed_finalize(bases, cuda=False, **kwargs):
+        with profiling.stage('finalize') as stage:
+            result = finalize(bases, cuda=cuda, **kwargs)
+            stage.nbytes = result.nbytes
+        return result
+    return timed_finalize
+
+
+@memoize
+def compile_retract(agg, schema, cuda=False):
+    """Given a ``Aggregation`` object and a schema, return a function that
+    subtracts one set of base arrays from another.
+
+    Returns
+    -------
+    ``retract(base_tuples)``
+        Takes a pair of base tuples, ``(aggregate, removed)``, where
+        ``removed`` was aggregated from a subset of the rows of
+        ``aggregate``, and returns the base tuple of the remaining rows.
+        This is the inverse of ``combine``.
+
+    Or ``None`` if any of the base reductions cannot be retracted (e.g.
+    ``min`` or ``max``).
+    """
+    bases, dshapes, _, temps = _base_reductions(agg, schema, cuda)
+    return make_retract(bases, dshapes, temps)
+
+
+def _base_reductions(agg, schema, cuda):
+    reds = list(traverse_aggregation(agg))
+
+    # List of base reductions (actually computed)
+    bases = list(unique(concat(r._build_bases(cuda) for r in reds)))
+    dshapes = [b.out_dshape(schema) for b in bases]
+    # List of tuples of (append, base, input columns, temps)
+    calls = [_get_call_tuples(b, d, schema, cuda) for (b, d) in zip(bases, dshapes)]
+    # List of temps needed
+    temps = list(pluck(3, calls))
+    return bases, dshapes, calls, temps
+
+
 def traverse_aggregation(agg):
     """Yield a left->right traversal of an aggregation"""
     if isinstance(agg, summary):
@@ -112,6 +169,9 @@ def make_append(bases, cols, calls, glyph):
     else:
         subscript = None
 
+    # Append to the bases reading temps first, since temps of categorical
+    # bases are read as views, which must hold the values before the update
+    calls = sorted(calls, key=lambda c: len(c[3]) == 0)
     for func, bases, cols, temps in calls:
         local_lk.update(zip(temps, (next(names) for i in temps)))
         func_name = next(names)
@@ -138,16 +198,57 @@ def make_append(bases, cols, calls, glyph):
     return ngjit(namespace['append'])
 
 
-def make_combine(bases, dshapes, temps):
+def make_combine(bases, dshapes, temps, cuda=False):
     arg_lk = dict((k, v) for (v, k) in enumerate(bases))
-    calls = [(b._build_combine(d), [arg_lk[i] for i in (b,) + t])
-             for (b, d, t) in zip(bases, dshapes, temps)]
+    if cuda:
+        calls = [(b._build_combine(d), [arg_lk[i] for i in (b,) + t])
+                 for (b, d, t) in zip(bases, dshapes, temps)]
+
+        def combine(base_tuples):
+            bases = tuple(np.stack(bs) for bs in zip(*base_tuples))
+            return tuple(f(*get(inds, bases)) for (f, inds) in calls)
+
+        return combine
+
+    merges = [(b._build_merge(d) or _stacked_merge(b._build_combine(d)),
+               [arg_lk[i] for i in (b,) + t])
+              for (b, d, t) in zip(bases, dshapes, temps)]
+    # Merge the bases reading temps first, while the accumulators of the
+    # temps still hold their values from before the merge
+    merges.sort(key=lambda m: len(m[1]) == 1)
 
     def combine(base_tuples):
+        # Accumulate pairwise into a copy of the first base tuple, so peak
+        # memory is independent of the number of base tuples (and the inputs,
+        # which may be views or still in use, are left untouched)
+        acc = tuple(b.copy() for b in base_tuples[0])
+        for part in base_tuples[1:]:
+            for f, inds in merges:
+                f(*[(acc[i], part[i]) for i in inds])
+        return acc
+
+    return combine
+
+
+def _stacked_merge(combine):
+    """Build an in-place ``_merge`` from a stacking ``_combine``"""
+    def merge(*pairs):
+        pairs[0][0][...] = combine(*[np.stack(p) for p in pairs])
+    return merge
+
+
+def make_retract(bases, dshapes, temps):
+    arg_lk = dict((k, v) for (v, k) in enumerate(bases))
+    calls = [(b._build_retract(d), [arg_lk[i] for i in (b,) + t])
+             for (b, d, t) in zip(bases, dshapes, temps)]
+    if any(f is None for (f, _) in calls):
+        return None
+
+    def retract(base_tuples):
         bases = tuple(np.stack(bs) for bs in zip(*base_tuples))
         return tuple(f(*get(inds, bases)) for (f, inds) in calls)
 
-    return combine
+    return retract
 
 
 def make_finalize(bases, agg, schema, cuda):
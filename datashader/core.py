@@ -1,6 +1,7 @@
 from __future__ import absolute_import, division, print_function
 
-from numbers import Number
+import sys
+from numbers import Integral, Number
 from math import log10
 
 import numpy as np
@@ -10,13 +11,16 @@ import dask.array as da
 from six import string_types
 from xarray import DataArray, Dataset
 from collections import OrderedDict
+from toolz import concat, unique
 
 from datashader.spatial.points import SpatialPointsFrame
+from .memmap import MemmapFrame
 from .utils import Dispatcher, ngjit, calc_res, calc_bbox, orient_array, \
     compute_coords, dshape_from_xarray_dataset
 from .utils import get_indices, dshape_from_pandas, dshape_from_dask
 from .utils import Expr # noqa (API import)
 from .resampling import resample_2d, resample_2d_distributed
+from . import profiling
 from . import reductions as rd
 
 try:
@@ -133,6 +137,12 @@ class LogAxis(Axis):
 _axis_lookup = {'linear': LinearAxis(), 'log': LogAxis()}
 
 
+def _float_range(rng):
+    """``rng`` as a tuple, with integer bounds converted to floats, so ranges
+    like ``(0, 1)`` do not compile another signature of the kernels"""
+    return tuple(float(b) if isinstance(b, Integral) else b for b in rng)
+
+
 class Canvas(object):
     """An abstract canvas representing the space in which to bin.
 
@@ -152,8 +162,8 @@ class Canvas(object):
                  x_axis_type='linear', y_axis_type='linear'):
         self.plot_width = plot_width
         self.plot_height = plot_height
-        self.x_range = None if x_range is None else tuple(x_range)
-        self.y_range = None if y_range is None else tuple(y_range)
+        self.x_range = None if x_range is None else _float_range(x_range)
+        self.y_range = None if y_range is None else _float_range(y_range)
         self.x_axis = _axis_lookup[x_axis_type]
         self.y_axis = _axis_lookup[y_axis_type]
 
@@ -162,7 +172,9 @@ class Canvas(object):
 
         Parameters
         ----------
-        source : pandas.DataFrame, dask.DataFrame, or xarray.DataArray/Dataset
+        source : pandas.DataFrame, dask.DataFrame, xarray.DataArray/Dataset,
+                 MemmapFrame, pyarrow.Table/RecordBatch/RecordBatchReader,
+                 or an iterable of pandas.DataFrame
             The input datasource.
         x, y : str
             Column names for the x and y coordinates of each point.
@@ -199,7 +211,9 @@ class Canvas(object):
 
         Parameters
         ----------
-        source : pandas.DataFrame, dask.DataFrame, or xarray.DataArray/Dataset
+        source : pandas.DataFrame, dask.DataFrame, xarray.DataArray/Dataset,
+                 MemmapFrame, pyarrow.Table/RecordBatch/RecordBatchReader,
+                 or an iterable of pandas.DataFrame
             The input datasource.
         x, y : str or number or list or tuple or np.ndarray
             Specification of the x and y coordinates of each vertex
@@ -344,7 +358,9 @@ The axis argument to Canvas.line must be 0 or 1
 
         Parameters
         ----------
-        source : pandas.DataFrame, dask.DataFrame, or xarray.DataArray/Dataset
+        source : pandas.DataFrame, dask.DataFrame, xarray.DataArray/Dataset,
+                 MemmapFrame, pyarrow.Table/RecordBatch/RecordBatchReader,
+                 or an iterable of pandas.DataFrame
             The input datasource.
         x, y : str or number or list or tuple or np.ndarray
             Specification of the x and y coordinates of each vertex of the
@@ -984,13 +1000,135 @@ def bypixel(source, canvas, glyph, agg):
 
     Parameters
     ----------
-    source : pandas.DataFrame, dask.DataFrame
+    source : pandas.DataFrame, dask.DataFrame, MemmapFrame,
+             pyarrow.Table/RecordBatch/RecordBatchReader,
+             or an iterable of pandas.DataFrame
         Input datasource
     canvas : Canvas
     glyph : Glyph
     agg : Reduction
+
+    Arrow sources are aggregated one record batch at a time, from numpy views
+    of their column buffers, with dictionary-encoded columns as categorical
+    columns. Readers without both ranges on the canvas are read into memory
+    to compute the missing bounds.
+
+    Iterables of DataFrames, e.g. generators of the chunks of a file, are
+    aggregated one DataFrame at a time, so only one needs to be in memory.
+    Bounds missing from the canvas are computed in a first pass, which
+    requires an iterable that can be iterated over again, like a list,
+    rather than an iterator.
+
+    If ``bypixel.cache`` is set to an ``AggregateCache``, finalized
+    aggregates of pandas and dask DataFrames are looked up in and stored
+    into it.
     """
+    with profiling.stage('bypixel') as stage:
+        cache = bypixel.cache
+        key = None if cache is None else cache.key(source, canvas, glyph, agg)
+        if key is not None:
+            cached = cache.get(key)
+            stage.cache_hit = cached is not None
+            if cached is not None:
+                return cached
+
+        with profiling.stage('schema'):
+            source, schema = _bypixel_sanitise(source, glyph, [agg])
+        canvas.validate()
+
+        # All-NaN objects (e.g. chunks of arrays with no data) are valid in Datashader
+        with np.warnings.catch_warnings():
+            np.warnings.filterwarnings('ignore', r'All-NaN (slice|axis) encountered')
+            result = bypixel.pipeline(source, schema, canvas, glyph, agg)
+        if key is not None:
+            cache.put(key, result)
+        stage.nbytes = result.nbytes
+    return result
+
+
+def bypixel_many(source, canvases, glyph, aggs=None):
+    """Compute aggregates of ``source`` for several canvases in one pass.
+
+    Equivalent to ``[bypixel(source, c, glyph, a) for c, a in zip(canvases,
+    aggs)]``, for e.g. a main view, an overview and a zoomed inset of the
+    same data, but pandas DataFrames are traversed once in blocks of rows,
+    each aggregated onto every canvas while in cache, and each partition of
+    dask DataFrames is read once, in a single graph computing all the
+    aggregates. Other sources are aggregated onto each canvas in turn.
 
+    Parameters
+    ----------
+    source : pandas.DataFrame, dask.DataFrame, MemmapFrame,
+             pyarrow.Table/RecordBatch/RecordBatchReader,
+             or an iterable of pandas.DataFrame
+        Input datasource
+    canvases : list of Canvas
+        Canvases to aggregate onto, each with its own size, ranges and axis
+        types.
+    glyph : Glyph
+        The glyph to bin by, e.g. ``Point('x', 'y')``.
+    aggs : Reduction or list of Reduction, optional
+        The reduction to compute for every canvas, or one reduction per
+        canvas. Default is ``count()``.
+
+    Returns
+    -------
+    aggregates : list of xarray.DataArray or xarray.Dataset
+        The aggregate for each canvas, in order.
+
+    Examples
+    --------
+    >>> import datashader as ds                          # doctest: +SKIP
+    >>> main = ds.Canvas(800, 600, x_range=(0, 10), y_range=(0, 10))  # doctest: +SKIP
+    >>> overview = ds.Canvas(200, 150)  # doctest: +SKIP
+    >>> agg, overview_agg = ds.bypixel_many(df, [main, overview],  # doctest: +SKIP
+    ...                                     ds.Point('x', 'y'), ds.mean('v'))
+    """
+    canvases = list(canvases)
+    if aggs is None:
+        aggs = rd.count()
+    if isinstance(aggs, (rd.Reduction, rd.summary)):
+        aggs = [aggs] * len(canvases)
+    aggs = list(aggs)
+    if len(aggs) != len(canvases):
+        raise ValueError("Expected one reduction per canvas, got {0} "
+                         "reductions for {1} canvases".format(
+                             len(aggs), len(canvases)))
+    if not canvases:
+        return []
+
+    with profiling.stage('bypixel_many') as stage:
+        cache = bypixel.cache
+        keys = [None if cache is None else
+                cache.key(source, canvas, glyph, agg)
+                for canvas, agg in zip(canvases, aggs)]
+        if None not in keys:
+            cached = [cache.get(key) for key in keys]
+            stage.cache_hit = hit = all(c is not None for c in cached)
+            if hit:
+                return cached
+
+        with profiling.stage('schema'):
+            source, schema = _bypixel_sanitise(source, glyph, aggs)
+        for canvas in canvases:
+            canvas.validate()
+
+        with np.warnings.catch_warnings():
+            np.warnings.filterwarnings('ignore',
+                                       r'All-NaN (slice|axis) encountered')
+            results = bypixel_many.pipeline(source, schema, canvases, glyph,
+                                            aggs)
+        for key, result in zip(keys, results):
+            if key is not None:
+                cache.put(key, result)
+        stage.nbytes = sum(result.nbytes for result in results)
+    return results
+
+
+def _bypixel_sanitise(source, glyph, aggs):
+    """Convert ``source`` to a DataFrame (or multi-dimensional Dataset) with
+    only the columns needed by ``glyph`` and the reductions ``aggs``, and
+    return it with its validated schema"""
     # Convert 1D xarray DataArrays and DataSets into Dask DataFrames
     if isinstance(source, DataArray) and source.ndim == 1:
         if not source.name:
@@ -998,36 +1136,118 @@ def bypixel(source, canvas, glyph, agg):
         source = source.reset_coords()
     if isinstance(source, Dataset) and len(source.dims) == 1:
         columns = list(source.coords.keys()) + list(source.data_vars.keys())
-        cols_to_keep = _cols_to_keep(columns, glyph, agg)
+        cols_to_keep = _cols_to_keep_all(columns, glyph, aggs)
         source = source.drop([col for col in columns if col not in cols_to_keep])
         source = source.to_dask_dataframe()
 
-    if (isinstance(source, pd.DataFrame) or
+    if (isinstance(source, (pd.DataFrame, dd.DataFrame)) or
             (cudf and isinstance(source, cudf.DataFrame))):
         # Avoid datashape.Categorical instantiation bottleneck
         # by only retaining the necessary columns:
         # https://github.com/bokeh/datashader/issues/396
+        # For dask, this also lets column stores like parquet only read
+        # (and categorize) the necessary columns.
         # Preserve column ordering without duplicates
-        cols_to_keep = _cols_to_keep(source.columns, glyph, agg)
+        cols_to_keep = _cols_to_keep_all(source.columns, glyph, aggs)
         if len(cols_to_keep) < len(source.columns):
             source = source[cols_to_keep]
-        dshape = dshape_from_pandas(source)
-    elif isinstance(source, dd.DataFrame):
+    if isinstance(source, dd.DataFrame):
         dshape = dshape_from_dask(source)
+    elif (isinstance(source, pd.DataFrame) or
+            (cudf and isinstance(source, cudf.DataFrame))):
+        dshape = dshape_from_pandas(source)
     elif isinstance(source, Dataset):
         # Multi-dimensional Dataset
         dshape = dshape_from_xarray_dataset(source)
+    elif isinstance(source, MemmapFrame):
+        source = source[_cols_to_keep_all(source.columns, glyph, aggs)]
+        dshape = source.dshape
+    elif _is_arrow(source):
+        # Imported here, as pyarrow is optional
+        from .data_libraries.arrow import ArrowBatches
+        source = ArrowBatches(source, _cols_to_keep_all(source.schema.names,
+                                                        glyph, aggs))
+        dshape = source.dshape
+    elif (hasattr(source, '__iter__') and
+            not isinstance(source, string_types)):
+        # Iterables of DataFrames are aggregated one DataFrame at a time
+        from .data_libraries.chunked import DataFrameChunks
+        source = DataFrameChunks(source)
+        source = source[_cols_to_keep_all(source.columns, glyph, aggs)]
+        dshape = source.dshape
     else:
         raise ValueError("source must be a pandas or dask DataFrame")
     schema = dshape.measure
     glyph.validate(schema)
-    agg.validate(schema)
-    canvas.validate()
+    for agg in aggs:
+        agg.validate(schema)
+    return source, schema
 
-    # All-NaN objects (e.g. chunks of arrays with no data) are valid in Datashader
-    with np.warnings.catch_warnings():
-        np.warnings.filterwarnings('ignore', r'All-NaN (slice|axis) encountered')
-        return bypixel.pipeline(source, schema, canvas, glyph, agg)
+
+def _is_arrow(source):
+    """Whether ``source`` is an Arrow ``Table``, ``RecordBatch`` or
+    ``RecordBatchReader``"""
+    # pyarrow has been imported by the caller if source is an Arrow object
+    pa = sys.modules.get('pyarrow')
+    return pa is not None and isinstance(
+        source, (pa.Table, pa.RecordBatch, pa.RecordBatchReader))
+
+
+def warmup(schema, glyphs, aggs=None, axis_types=(('linear', 'linear'),)):
+    """Compile the aggregation kernels for the given combinations ahead of time.
+
+    Renders each combination of glyph, reduction and axis types once on a
+    tiny dummy DataFrame with the dtypes of ``schema``, so the first real
+    request for that combination runs with steady-state latency. When the
+    kernel cache is enabled (see ``datashader.kernel_cache``), the compiled
+    kernels are also persisted for other processes.
+
+    Parameters
+    ----------
+    schema : pandas.DataFrame or dict
+        Either a DataFrame with the columns and dtypes of the data to be
+        rendered (it may be empty), or a mapping of column name to dtype.
+        Categorical columns should use a ``pandas.CategoricalDtype`` with the
+        actual categories.
+    glyphs : list of Glyph
+        Glyphs to compile for, e.g. ``[Point('x', 'y'), LineAxis0('x', 'y')]``.
+    aggs : list of Reduction, optional
+        Reductions to compile for. Default is ``[count()]``.
+    axis_types : list of tuple, optional
+        ``(x_axis_type, y_axis_type)`` pairs to compile for. Default is
+        ``[('linear', 'linear')]``.
+    """
+    if aggs is None:
+        aggs = [rd.count()]
+    if isinstance(schema, pd.DataFrame):
+        schema = OrderedDict(schema.dtypes.items())
+    source = pd.DataFrame(OrderedDict(
+        (col, _warmup_values(dtype)) for col, dtype in schema.items()))
+
+    for x_axis_type, y_axis_type in axis_types:
+        # Log axes require explicit ranges, linear ones also compile the
+        # kernels computing the data bounds
+        canvas = Canvas(plot_width=2, plot_height=2,
+                        x_range=(1, 2) if x_axis_type == 'log' else None,
+                        y_range=(1, 2) if y_axis_type == 'log' else None,
+                        x_axis_type=x_axis_type, y_axis_type=y_axis_type)
+        for glyph in glyphs:
+            for agg in aggs:
+                bypixel(source, canvas, glyph, agg)
+
+
+def _warmup_values(dtype):
+    """Two values of ``dtype``, valid on both linear and log axes"""
+    if isinstance(dtype, pd.api.types.CategoricalDtype):
+        return pd.Categorical.from_codes([0, 0], categories=dtype.categories,
+                                         ordered=dtype.ordered)
+    try:
+        from .datatypes import RaggedDtype
+    except ImportError:
+        RaggedDtype = type(None)
+    if isinstance(dtype, RaggedDtype) or str(dtype).startswith('Ragged'):
+        return pd.array([[1, 2], [2, 1]], dtype=dtype)
+    return pd.Series([1, 2]).astype(dtype)
 
 
 def _cols_to_keep(columns, glyph, agg):
@@ -1035,15 +1255,20 @@ def _cols_to_keep(columns, glyph, agg):
     for col in glyph.required_columns():
         cols_to_keep[col] = True
 
-    if hasattr(agg, 'values'):
-        for subagg in agg.values:
-            if subagg.column is not None:
-                cols_to_keep[subagg.column] = True
-    elif agg.column is not None:
-        cols_to_keep[agg.column] = True
+    for subagg in getattr(agg, 'values', (agg,)):
+        # Reductions like ``by`` use several columns, given by their inputs
+        for col in [subagg.column] + [i.column for i in subagg.inputs]:
+            if col is not None:
+                cols_to_keep[col] = True
     return [col for col, keepit in cols_to_keep.items() if keepit]
 
 
+def _cols_to_keep_all(columns, glyph, aggs):
+    """Columns needed by ``glyph`` and any of the reductions ``aggs``"""
+    return list(unique(concat(_cols_to_keep(columns, glyph, agg)
+                              for agg in aggs)))
+
+
 def _broadcast_column_specifications(*args):
     lengths = {len(a) for a in args if isinstance(a, (list, tuple))}
     if len(lengths) != 1:
@@ -1058,3 +1283,14 @@ def _broadcast_column_specifications(*args):
 
 
 bypixel.pipeline = Dispatcher()
+#: Optional ``AggregateCache`` of finalized aggregates, disabled by default.
+bypixel.cache = None
+
+bypixel_many.pipeline = Dispatcher()
+
+
+@bypixel_many.pipeline.register(object)
+def _bypixel_many_separately(source, schema, canvases, glyph, aggs):
+    # Sources without a single-pass pipeline are aggregated once per canvas
+    return [bypixel.pipeline(source, schema, canvas, glyph, agg)
+            for canvas, agg in zip(canvases, aggs)]
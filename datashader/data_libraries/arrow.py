@@ -0,0 +1,167 @@
+"""Aggregation of Apache Arrow tables and record batches.
+
+The record batches are aggregated one at a time, handing numpy views of
+their column buffers to the compiled ``extend`` functions instead of
+converting them to a pandas DataFrame. Dictionary-encoded columns are
+aggregated by their indices, as categorical columns.
+"""
+from __future__ import absolute_import, division
+
+from collections import OrderedDict
+from itertools import chain
+
+import datashape
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from datashader.core import bypixel, bypixel_many
+from datashader.data_libraries.chunked import (ColumnFrame, aggregate_chunks,
+                                                column_extremes)
+from datashader.utils import dshape_from_pandas_helper
+
+__all__ = ()
+
+
+class ArrowBatches(object):
+    """The record batches of an Arrow ``Table``, ``RecordBatch`` or
+    ``RecordBatchReader``, restricted to the given columns.
+
+    The categories of dictionary-encoded columns are the dictionary values
+    of all the batches of tables, in order of first appearance. Those of
+    readers, which can only be read once, are the dictionary values of their
+    first batch, and later batches may only use these values.
+    """
+    def __init__(self, source, columns):
+        schema = source.schema
+        missing = [c for c in columns if schema.get_field_index(c) < 0]
+        if missing:
+            raise KeyError("Columns {0} not found in Arrow "
+                           "source".format(missing))
+        self.fields = [schema.field(c) for c in columns]
+
+        if isinstance(source, pa.RecordBatch):
+            self._batches = [source]
+        elif isinstance(source, pa.Table):
+            self._batches = source.to_batches()
+        else:
+            self._batches = iter(source)
+
+        self.categories = OrderedDict()
+        self._dictionaries = {}
+        dict_fields = [f for f in self.fields
+                       if pa.types.is_dictionary(f.type)]
+        if not dict_fields:
+            return
+        if isinstance(self._batches, list):
+            batches = self._batches
+        else:
+            # Only the dictionaries of the first batch are known up front
+            first = next(self._batches, None)
+            batches = [] if first is None else [first]
+            self._batches = chain(batches, self._batches)
+        for field in dict_fields:
+            categories = []
+            seen = set()
+            for batch in batches:
+                for value in _column(batch, field.name).dictionary.to_pylist():
+                    if value not in seen:
+                        seen.add(value)
+                        categories.append(value)
+            self.categories[field.name] = categories
+            self._dictionaries[field.name] = pa.array(
+                categories, type=field.type.value_type)
+
+    @property
+    def dshape(self):
+        """The datashape of the columns, as for the equivalent DataFrame"""
+        return datashape.var * datashape.Record([
+            (f.name, dshape_from_pandas_helper(
+                pd.Series([], dtype=self._pandas_dtype(f))))
+            for f in self.fields])
+
+    def _pandas_dtype(self, field):
+        if pa.types.is_dictionary(field.type):
+            return pd.api.types.CategoricalDtype(
+                self.categories[field.name], ordered=field.type.ordered)
+        return field.type.to_pandas_dtype()
+
+    def load(self):
+        """Keep the batches of readers in memory, so they can be iterated
+        over more than once"""
+        self._batches = list(self._batches)
+
+    def frames(self):
+        """Iterate over views of the batches as ``ColumnFrame`` objects"""
+        start = 0
+        for batch in self._batches:
+            values = OrderedDict()
+            for field in self.fields:
+                array = _column(batch, field.name)
+                if pa.types.is_dictionary(field.type):
+                    values[field.name] = self._codes(array, field.name)
+                else:
+                    values[field.name] = _values(array, field.name)
+            yield ColumnFrame(values, set(self.categories), start,
+                              batch.num_rows)
+            start += batch.num_rows
+
+    def _codes(self, array, name):
+        """The indices of a dictionary array into the column's categories,
+        with -1 for missing values"""
+        indices = array.indices
+        if indices.null_count:
+            indices = indices.fill_null(-1)
+        codes = indices.to_numpy(zero_copy_only=False)
+        dictionary = array.dictionary
+        categories = self._dictionaries[name]
+        if (len(dictionary) <= len(categories) and
+                dictionary.equals(categories.slice(0, len(dictionary)))):
+            return codes
+        # The batch has its own dictionary, map it onto the categories
+        positions = {v: i for i, v in enumerate(self.categories[name])}
+        try:
+            # Missing values (-1) take the last entry
+            lookup = np.array([positions[v] for v in dictionary.to_pylist()] +
+                              [-1], dtype='i8')
+        except KeyError as e:
+            raise ValueError("Value {0!r} of column {1!r} is not in the "
+                             "dictionary of the first record batch".format(
+                                 e.args[0], name))
+        return lookup[codes]
+
+
+def _column(batch, name):
+    return batch.column(batch.schema.get_field_index(name))
+
+
+def _values(array, name):
+    """Numpy view of a primitive Arrow array, or a copy with NaN or None for
+    missing values"""
+    if array.null_count and not (pa.types.is_floating(array.type) or
+                                 pa.types.is_string(array.type) or
+                                 pa.types.is_binary(array.type)):
+        raise ValueError("Column {0!r} of type {1} has missing values, which "
+                         "are only supported for floating point and string "
+                         "columns".format(name, array.type))
+    return array.to_numpy(zero_copy_only=False)
+
+
+@bypixel.pipeline.register(ArrowBatches)
+def arrow_pipeline(source, schema, canvas, glyph, summary):
+    agg, = arrow_pipeline_many(source, schema, [canvas], glyph, [summary])
+    return agg
+
+
+@bypixel_many.pipeline.register(ArrowBatches)
+def arrow_pipeline_many(source, schema, canvases, glyph, summaries):
+    bounds_source = None
+    if [c for c in canvases if c.x_range is None or c.y_range is None]:
+        # The bounds are computed in a first pass over the batches
+        source.load()
+        bounds_source = column_extremes(
+            source.frames(), [f.name for f in source.fields
+                              if pa.types.is_integer(f.type) or
+                              pa.types.is_floating(f.type)])
+    return aggregate_chunks(glyph, source.frames(), schema, canvases,
+                            summaries, bounds_source)
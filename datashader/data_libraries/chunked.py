@@ -0,0 +1,271 @@
+"""Aggregation of sources read one chunk of rows at a time.
+
+Every chunk is aggregated into the same base arrays by the compiled
+``extend`` functions, so only one chunk needs to be in memory at once. The
+columns of a ``MemmapFrame`` are aggregated in chunks of ``chunk_size``
+rows, and iterables of pandas DataFrames one DataFrame at a time.
+"""
+from __future__ import absolute_import, division
+
+from collections import OrderedDict, namedtuple
+from copy import copy
+from itertools import chain
+
+import datashape
+import numpy as np
+import pandas as pd
+
+from datashader import profiling
+from datashader.core import bypixel, bypixel_many
+from datashader.data_libraries.pandas import _prepare, _connected_glyphs
+from datashader.memmap import MemmapFrame
+from datashader.reductions import _uses_row_index
+from datashader.utils import dshape_from_pandas_helper, with_row_offset
+
+__all__ = ()
+
+
+# Categorical columns expose their codes like pandas categorical Series
+_Categorical = namedtuple('_Categorical', ['codes'])
+_CategoricalColumn = namedtuple('_CategoricalColumn', ['cat'])
+
+
+class ColumnFrame(object):
+    """Read-only, DataFrame-like view of a chunk of numpy columns.
+
+    Indexing by name gives a pandas Series wrapping the column values, or,
+    for the ``categorical`` columns holding category codes, an object
+    exposing them as ``.cat.codes``. Rows are indexed from ``start``, their
+    position in the source.
+    """
+    def __init__(self, values, categorical, start, length, columns=None):
+        self._values = values
+        self._categorical = categorical
+        self.columns = list(values) if columns is None else columns
+        self.index = pd.RangeIndex(start, start + length)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, key):
+        if isinstance(key, list):
+            return ColumnFrame(self._values, self._categorical,
+                               self.index.start, len(self), columns=key)
+        values = self._values[key]
+        if key in self._categorical:
+            return _CategoricalColumn(_Categorical(pd.Series(values,
+                                                             copy=False)))
+        return pd.Series(values, copy=False)
+
+    @property
+    def values(self):
+        return np.column_stack([self._values[k] for k in self.columns])
+
+    def after(self, previous):
+        """Frame of the last row of ``previous`` followed by these rows"""
+        values = OrderedDict(
+            (k, np.concatenate([previous._values[k][-1:], v]))
+            for k, v in self._values.items())
+        return ColumnFrame(values, self._categorical,
+                           previous.index.stop - 1, len(self) + 1)
+
+
+def column_extremes(frames, columns):
+    """Frame of the minimum and maximum of ``columns`` in each of ``frames``,
+    from which glyphs compute the same bounds as from all their rows"""
+    extremes = OrderedDict((k, []) for k in columns)
+    with profiling.stage('bounds') as stage:
+        rows = 0
+        for frame in frames:
+            if not len(frame):
+                continue
+            rows += len(frame)
+            for k, minmax in extremes.items():
+                values = frame[k].values
+                minmax.extend([np.nanmin(values), np.nanmax(values)])
+        stage.rows = rows
+    values = OrderedDict((k, np.array(v, dtype='f8'))
+                         for k, v in extremes.items())
+    length = len(next(iter(values.values()))) if values else 0
+    return ColumnFrame(values, set(), 0, length)
+
+
+def aggregate_chunks(glyph, chunks, schema, canvases, summaries,
+                     bounds_source=None):
+    """Aggregate the frames ``chunks`` onto each of ``canvases``.
+
+    ``bounds_source`` is a frame from which to compute the bounds of
+    canvases without ranges, e.g. from ``column_extremes``.
+    """
+    aggs = [_prepare(glyph, bounds_source, schema, canvas, summary)
+            for canvas, summary in zip(canvases, summaries)]
+    with profiling.stage('create') as stage:
+        bases = [agg.create(agg.shape) for agg in aggs]
+        stage.nbytes = profiling.nbytes(bases)
+
+    connected = isinstance(glyph, _connected_glyphs)
+    previous = None
+    for chunk in chunks:
+        kwargs = {}
+        block = chunk
+        if connected:
+            if not len(chunk):
+                continue
+            kwargs['plot_start'] = previous is None
+            if previous is not None:
+                # Connect to the last row of the previous chunk, which copies
+                # the columns of this one
+                block = _after(previous, chunk)
+            previous = chunk
+        with profiling.stage('extend', rows=len(chunk)):
+            for agg, agg_bases in zip(aggs, bases):
+                agg.extend(agg_bases, block, agg.st, agg.bounds, **kwargs)
+    return [agg.finish(agg_bases) for agg, agg_bases in zip(aggs, bases)]
+
+
+def _after(previous, chunk):
+    """The last row of the chunk ``previous`` followed by ``chunk``"""
+    if isinstance(chunk, ColumnFrame):
+        return chunk.after(previous)
+    block = pd.concat([previous.iloc[-1:], chunk])
+    if isinstance(chunk.index, pd.RangeIndex):
+        block = with_row_offset(block, chunk.index.start - 1)
+    return block
+
+
+@bypixel.pipeline.register(MemmapFrame)
+def memmap_pipeline(source, schema, canvas, glyph, summary):
+    agg, = memmap_pipeline_many(source, schema, [canvas], glyph, [summary])
+    return agg
+
+
+@bypixel_many.pipeline.register(MemmapFrame)
+def memmap_pipeline_many(source, schema, canvases, glyph, summaries):
+    bounds_source = None
+    if [c for c in canvases if c.x_range is None or c.y_range is None]:
+        # The bounds are computed in a first pass over the chunks
+        bounds_source = column_extremes(
+            memmap_chunks(source), [k for k, a in source.arrays.items()
+                                    if k not in source.categories and
+                                    a.dtype.kind in 'iuf'])
+    return aggregate_chunks(glyph, memmap_chunks(source), schema, canvases,
+                            summaries, bounds_source)
+
+
+def memmap_chunks(source):
+    """Iterate over ``ColumnFrame`` views of ``chunk_size`` rows of the
+    columns of the ``MemmapFrame`` ``source``"""
+    categorical = set(source.categories)
+    for start in range(0, len(source), source.chunk_size):
+        stop = min(start + source.chunk_size, len(source))
+        values = OrderedDict((k, np.asarray(a[start:stop]))
+                             for k, a in source.arrays.items())
+        yield ColumnFrame(values, categorical, start, stop - start)
+
+
+class DataFrameChunks(object):
+    """An iterable of pandas DataFrames with the same columns, such as a
+    generator of the row groups of a file, aggregated one DataFrame at a
+    time.
+
+    The schema is that of the first DataFrame. Categorical columns of later
+    ones are recoded to its categories, and may only use these categories.
+    Iterators, which can only be read once, can only be aggregated onto
+    canvases with both ranges set, as bounds are computed in a first pass.
+    """
+    def __init__(self, source):
+        self._source = source
+        iterator = iter(source)
+        self.reiterable = iterator is not source
+        self._first = next(iterator, None)
+        self._rest = iterator
+        if not isinstance(self._first, pd.DataFrame):
+            raise ValueError("source must be a pandas or dask DataFrame, or "
+                             "an iterable of pandas DataFrames")
+        self.columns = list(self._first.columns)
+
+    def __getitem__(self, key):
+        """View of the columns in the list ``key``"""
+        missing = [k for k in key if k not in self.columns]
+        if missing:
+            raise KeyError("Columns {0} not found in source".format(missing))
+        selection = copy(self)
+        selection.columns = list(key)
+        return selection
+
+    @property
+    def dshape(self):
+        """The datashape of the columns of the first DataFrame"""
+        return datashape.var * datashape.Record([
+            (k, dshape_from_pandas_helper(self._first[k]))
+            for k in self.columns])
+
+    @property
+    def categories(self):
+        return OrderedDict(
+            (k, self._first[k].cat.categories) for k in self.columns
+            if isinstance(self._first[k].dtype,
+                          pd.api.types.CategoricalDtype))
+
+    def chunks(self, row_offsets=False):
+        """Iterate over the DataFrames, numbering their rows from their
+        position in the source if ``row_offsets``"""
+        if self._rest is not None:
+            iterator = chain([self._first], self._rest)
+            self._rest = None
+        elif self.reiterable:
+            iterator = iter(self._source)
+        else:
+            raise ValueError("The iterator of DataFrames has already been "
+                             "read")
+        categories = self.categories
+        start = 0
+        for df in iterator:
+            if not isinstance(df, pd.DataFrame):
+                raise ValueError("Expected a pandas DataFrame, got {0}"
+                                 .format(type(df).__name__))
+            for k, cats in categories.items():
+                df = _recode(df, k, cats)
+            if row_offsets:
+                df = with_row_offset(df, start)
+            yield df
+            start += len(df)
+
+
+def _recode(df, column, categories):
+    """``df`` with the categorical ``column`` using ``categories``"""
+    values = df[column]
+    if not isinstance(values.dtype, pd.api.types.CategoricalDtype):
+        raise ValueError("Column {0!r} is not categorical".format(column))
+    if values.cat.categories.equals(categories):
+        return df
+    unknown = values.cat.categories.difference(categories)
+    if len(unknown):
+        raise ValueError("Categories {0} of column {1!r} are not in the "
+                         "first DataFrame".format(list(unknown), column))
+    return df.assign(**{column: values.cat.set_categories(categories)})
+
+
+@bypixel.pipeline.register(DataFrameChunks)
+def chunks_pipeline(source, schema, canvas, glyph, summary):
+    agg, = chunks_pipeline_many(source, schema, [canvas], glyph, [summary])
+    return agg
+
+
+@bypixel_many.pipeline.register(DataFrameChunks)
+def chunks_pipeline_many(source, schema, canvases, glyph, summaries):
+    bounds_source = None
+    if [c for c in canvases if c.x_range is None or c.y_range is None]:
+        # The bounds are computed in a first pass over the DataFrames
+        if not source.reiterable:
+            raise ValueError("An iterator of DataFrames can only be read "
+                             "once. Set both x_range and y_range on the "
+                             "Canvas, or pass an iterable such as a list.")
+        categories = source.categories
+        bounds_source = column_extremes(
+            source.chunks(), [k for k in source.columns
+                              if k not in categories and
+                              source._first[k].dtype.kind in 'iuf'])
+    row_offsets = bool([s for s in summaries if _uses_row_index(s)])
+    return aggregate_chunks(glyph, source.chunks(row_offsets), schema,
+                            canvases, summaries, bounds_source)
@@ -2,43 +2,176 @@ from __future__ import absolute_import, division
 
 import dask
 import dask.dataframe as dd
+import numpy as np
 from collections import OrderedDict
+from operator import getitem
 from dask.base import tokenize, compute
+from dask.optimization import cull
 
-from datashader.core import bypixel
+from datashader import profiling
+from datashader.core import bypixel, bypixel_many
 from datashader.compatibility import apply
 from datashader.compiler import compile_components
+from datashader.kernel_cache import cache_kernels
 from datashader.glyphs import Glyph, LineAxis0
-from datashader.utils import Dispatcher
+from datashader.glyphs.points import _PointLike
+from datashader.reductions import _uses_row_index
+from datashader.utils import Dispatcher, with_row_offset
 
 __all__ = ()
 
 
+#: Maximum number of partition aggregates merged by each ``combine`` task.
+#: Partition aggregates are merged in a tree with this fan-in, bounding the
+#: memory of each task and merging in parallel. ``None`` merges all of them
+#: in a single task.
+split_every = 8
+
+#: Whether to skip the partitions whose data cannot be drawn within the
+#: ranges of a Canvas. This needs the bounds of the data in every
+#: partition, computed by one pass over the glyph's columns the first time
+#: a DataFrame (identified by its token) is rendered with explicit ranges,
+#: and cached afterwards. Worthwhile when repeatedly rendering zoomed-in
+#: views of spatially partitioned data.
+prune_partitions = False
+
+
 @bypixel.pipeline.register(dd.DataFrame)
 def dask_pipeline(df, schema, canvas, glyph, summary, cuda=False):
-    dsk, name = glyph_dispatch(glyph, df, schema, canvas, summary, cuda=cuda)
+    dsk, (name,) = glyph_dispatch(glyph, df, schema, [canvas], [summary],
+                                  cuda=cuda)
+    return _compute(df, dsk, name)
+
+
+@bypixel_many.pipeline.register(dd.DataFrame)
+def dask_pipeline_many(df, schema, canvases, glyph, summaries, cuda=False):
+    dsk, names = glyph_dispatch(glyph, df, schema, canvases, summaries,
+                                cuda=cuda)
+    return _compute(df, dsk, names)
 
+
+def _compute(df, dsk, keys):
+    """Compute ``keys`` of the aggregation graph ``dsk`` of ``df``"""
     # Get user configured scheduler (if any), or fall back to default
     # scheduler for dask DataFrame
     scheduler = dask.base.get_scheduler() or df.__dask_scheduler__
-    keys = df.__dask_keys__()
     optimize = df.__dask_optimize__
     graph = df.__dask_graph__()
 
-    dsk.update(optimize(graph, keys))
+    dsk.update(optimize(graph, df.__dask_keys__()))
+    # Drop the tasks of any pruned partitions
+    dsk, _ = cull(dsk, keys)
+
+    with profiling.stage('compute'):
+        return scheduler(dsk, keys)
+
+
+#: Maximum number of data bounds (and partition bounds) of dask DataFrames
+#: to remember.
+bounds_cache_size = 128
+_bounds_cache = OrderedDict()
+_partition_bounds_cache = OrderedDict()
+_partition_offsets_cache = OrderedDict()
+
+
+def _cached(cache, key, compute):
+    """Look ``key`` up in the LRU ``cache``, calling ``compute`` on a miss"""
+    try:
+        value = cache.pop(key)
+    except KeyError:
+        value = compute()
+    # (Re-)insert as most recently used
+    cache[key] = value
+    while len(cache) > bounds_cache_size:
+        cache.popitem(last=False)
+    return value
+
+
+def compute_bounds(df, glyph):
+    """Compute the x and y extents of ``glyph`` over the dask DataFrame ``df``.
+
+    Extents are cached by the token of ``df`` and the glyph, so rendering
+    the default view of the same data again (even from a new DataFrame
+    object, e.g. from another call to ``dd.read_parquet`` with the same
+    arguments) does not require another pass over the data.
+    """
+    return _cached(_bounds_cache, (df.__dask_tokenize__(), glyph),
+                   lambda: glyph.compute_bounds_dask(df))
+
+
+def partition_bounds(df, glyph):
+    """Compute the ``(x_min, x_max, y_min, y_max)`` extents of ``glyph`` in
+    each partition of the dask DataFrame ``df``, as an ``(npartitions, 4)``
+    array. Empty partitions have ``NaN`` extents.
+
+    Extents are cached by the token of ``df`` and the glyph.
+    """
+    def extents(part):
+        if len(part) == 0:
+            return np.full((1, 4), np.nan)
+        return np.array([glyph.compute_x_bounds(part) +
+                         glyph.compute_y_bounds(part)], dtype='f8')
+
+    return _cached(_partition_bounds_cache, (df.__dask_tokenize__(), glyph),
+                   lambda: df.map_partitions(extents).compute())
 
-    return scheduler(dsk, name)
+
+def partition_offsets(df):
+    """Positions of the first rows of the partitions of the dask DataFrame
+    ``df`` among all its rows.
+
+    Offsets are cached by the token of ``df``.
+    """
+    def offsets():
+        lengths = df.map_partitions(len).compute()
+        return [0] + list(np.cumsum(lengths)[:-1].tolist())
+
+    return _cached(_partition_offsets_cache, df.__dask_tokenize__(), offsets)
+
+
+def row_offsets(df, summaries, cuda=False):
+    """Row offsets to aggregate the partitions of ``df`` with, which are
+    None unless one of ``summaries`` numbers the rows of the source"""
+    if cuda or not [s for s in summaries if _uses_row_index(s)]:
+        return [None] * df.npartitions
+    return partition_offsets(df)
+
+
+def visible_partitions(df, canvas, glyph, connected=False, cuda=False):
+    """Indices of the partitions of ``df`` that may be drawn on ``canvas``.
+
+    All partitions unless ``prune_partitions`` is set and both ranges of
+    ``canvas`` are given. If ``connected``, each partition is drawn joined
+    to the last row of the previous one, and is kept if the extents of both
+    together intersect the ranges.
+    """
+    if (not prune_partitions or cuda or not isinstance(glyph, _PointLike) or
+            not canvas.x_range or not canvas.y_range):
+        return list(range(df.npartitions))
+    extents = partition_bounds(df, glyph)
+    if connected:
+        extents = extents.copy()
+        extents[1:, [0, 2]] = np.fmin(extents[1:, [0, 2]], extents[:-1, [0, 2]])
+        extents[1:, [1, 3]] = np.fmax(extents[1:, [1, 3]], extents[:-1, [1, 3]])
+    x_min, x_max = sorted(canvas.x_range)
+    y_min, y_max = sorted(canvas.y_range)
+    with np.errstate(invalid='ignore'):
+        visible = ((extents[:, 0] <= x_max) & (extents[:, 1] >= x_min) &
+                   (extents[:, 2] <= y_max) & (extents[:, 3] >= y_min))
+    # Aggregate at least one partition, to produce an (empty) aggregate
+    return list(np.flatnonzero(visible)) or [0]
 
 
 def shape_bounds_st_and_axis(df, canvas, glyph):
     if not canvas.x_range or not canvas.y_range:
-        x_extents, y_extents = glyph.compute_bounds_dask(df)
+        with profiling.stage('bounds'):
+            x_extents, y_extents = compute_bounds(df, glyph)
+            x_range = canvas.x_range or x_extents
+            y_range = canvas.y_range or y_extents
+            x_min, x_max, y_min, y_max = bounds = compute(*(x_range +
+                                                            y_range))
     else:
-        x_extents, y_extents = None, None
-
-    x_range = canvas.x_range or x_extents
-    y_range = canvas.y_range or y_extents
-    x_min, x_max, y_min, y_max = bounds = compute(*(x_range + y_range))
+        x_min, x_max, y_min, y_max = bounds = canvas.x_range + canvas.y_range
     x_range, y_range = (x_min, x_max), (y_min, y_max)
 
     width = canvas.plot_width
@@ -56,65 +189,121 @@ def shape_bounds_st_and_axis(df, canvas, glyph):
     return shape, bounds, st, axis
 
 
+def combine_tree(dsk, name, keys, combine):
+    """Add tasks to ``dsk`` merging the aggregates at ``keys`` in a tree.
+
+    Returns the task merging the last level of the tree, whose fan-in (like
+    that of every other level) is at most ``split_every``.
+    """
+    fan_in = split_every or len(keys)
+    if fan_in < 2:
+        raise ValueError("split_every must be at least 2, got {0}"
+                         .format(split_every))
+    depth = 0
+    while len(keys) > fan_in:
+        depth += 1
+        level = []
+        for i in range(0, len(keys), fan_in):
+            key = ('combine-' + name, depth, i // fan_in)
+            dsk[key] = (combine, keys[i:i + fan_in])
+            level.append(key)
+        keys = level
+    return (combine, keys)
+
+
 glyph_dispatch = Dispatcher()
 
 
 @glyph_dispatch.register(Glyph)
-def default(glyph, df, schema, canvas, summary, cuda=False):
-    shape, bounds, st, axis = shape_bounds_st_and_axis(df, canvas, glyph)
-
-    # Compile functions
-    create, info, append, combine, finalize = \
-        compile_components(summary, schema, glyph, cuda=cuda)
-    x_mapper = canvas.x_axis.mapper
-    y_mapper = canvas.y_axis.mapper
-    extend = glyph._build_extend(x_mapper, y_mapper, info, append)
-
-    def chunk(df):
-        aggs = create(shape)
-        extend(aggs, df, st, bounds)
-        return aggs
-
-    name = tokenize(df.__dask_tokenize__(), canvas, glyph, summary)
-    keys = df.__dask_keys__()
-    keys2 = [(name, i) for i in range(len(keys))]
-    dsk = dict((k2, (chunk, k)) for (k2, k) in zip(keys2, keys))
-    dsk[name] = (apply, finalize, [(combine, keys2)],
-                 dict(cuda=cuda, coords=axis, dims=[glyph.y_label, glyph.x_label]))
-    return dsk, name
+def default(glyph, df, schema, canvases, summaries, cuda=False,
+            finalized=True):
+    return aggregate_graph(glyph, df, schema, canvases, summaries, cuda=cuda,
+                           finalized=finalized)
 
 
 @glyph_dispatch.register(LineAxis0)
-def line(glyph, df, schema, canvas, summary, cuda=False):
+def line(glyph, df, schema, canvases, summaries, cuda=False, finalized=True):
+    return aggregate_graph(glyph, df, schema, canvases, summaries, cuda=cuda,
+                           connected=True, finalized=finalized)
+
+
+def aggregate_graph(glyph, df, schema, canvases, summaries, cuda=False,
+                    connected=False, finalized=True):
+    """Build the graph aggregating ``df`` onto each of ``canvases``.
+
+    Each partition is read once, by a task aggregating it onto every canvas.
+    If ``connected``, each partition after the first is drawn joined to the
+    last row of the previous one.
+
+    Returns the graph and the keys of the finalized aggregates, or of the
+    combined base arrays of each aggregate if ``finalized`` is False.
+    """
     if cuda:
         from cudf import concat
     else:
         from pandas import concat
 
-    shape, bounds, st, axis = shape_bounds_st_and_axis(df, canvas, glyph)
+    chunks = []
+    finalizes = []
+    for canvas, summary in zip(canvases, summaries):
+        shape, bounds, st, axis = shape_bounds_st_and_axis(df, canvas, glyph)
 
-    # Compile functions
-    create, info, append, combine, finalize = \
-        compile_components(summary, schema, glyph, cuda=cuda)
-    x_mapper = canvas.x_axis.mapper
-    y_mapper = canvas.y_axis.mapper
-    extend = glyph._build_extend(x_mapper, y_mapper, info, append)
+        # Compile functions
+        create, info, append, combine, finalize = \
+            compile_components(summary, schema, glyph, cuda=cuda)
+        x_mapper = canvas.x_axis.mapper
+        y_mapper = canvas.y_axis.mapper
+        extend = cache_kernels(
+            glyph._build_extend(x_mapper, y_mapper, info, append))
+        chunks.append((create, extend, shape, st, bounds))
+        finalizes.append((combine, finalize, dict(
+            cuda=cuda, coords=axis, dims=[glyph.y_label, glyph.x_label])))
 
-    def chunk(df, df2=None):
-        plot_start = True
+    def chunk(offset, df, df2=None):
+        kwargs = {}
+        if connected:
+            kwargs['plot_start'] = df2 is None
         if df2 is not None:
             df = concat([df.iloc[-1:], df2])
-            plot_start = False
-        aggs = create(shape)
-        extend(aggs, df, st, bounds, plot_start=plot_start)
-        return aggs
-
-    name = tokenize(df.__dask_tokenize__(), canvas, glyph, summary)
-    old_name = df.__dask_tokenize__()
-    dsk = {(name, 0): (chunk, (old_name, 0))}
-    for i in range(1, df.npartitions):
-        dsk[(name, i)] = (chunk, (old_name, i - 1), (old_name, i))
-    keys2 = [(name, i) for i in range(df.npartitions)]
-    dsk[name] = (apply, finalize, [(combine, keys2)],
-                 dict(cuda=cuda, coords=axis, dims=[glyph.y_label, glyph.x_label]))
-    return dsk, name
+            if offset is not None:
+                offset -= 1
+        if offset is not None:
+            df = with_row_offset(df, offset)
+        with profiling.stage('extend', rows=len(df)) as stage:
+            bases = []
+            for create, extend, shape, st, bounds in chunks:
+                aggs = create(shape)
+                extend(aggs, df, st, bounds, **kwargs)
+                bases.append(aggs)
+            stage.nbytes = profiling.nbytes(bases)
+        return bases
+
+    names = [tokenize(df.__dask_tokenize__(), canvas, glyph, summary,
+                      finalized)
+             for canvas, summary in zip(canvases, summaries)]
+    name = names[0] if len(names) == 1 else tokenize(*names)
+    keys = df.__dask_keys__()
+    partitions = set()
+    for canvas in canvases:
+        partitions.update(visible_partitions(df, canvas, glyph,
+                                             connected=connected, cuda=cuda))
+    partitions = sorted(partitions)
+    offsets = row_offsets(df, summaries, cuda)
+    dsk = {}
+    for i in partitions:
+        if connected and i > 0:
+            dsk[('chunk-' + name, i)] = (chunk, offsets[i], keys[i - 1],
+                                         keys[i])
+        else:
+            dsk[('chunk-' + name, i)] = (chunk, offsets[i], keys[i])
+    for j, (name_j, (combine, finalize, kwargs)) in enumerate(
+            zip(names, finalizes)):
+        keys2 = [(name_j, i) for i in partitions]
+        for i in partitions:
+            dsk[(name_j, i)] = (getitem, ('chunk-' + name, i), j)
+        combined = combine_tree(dsk, name_j, keys2, combine)
+        if finalized:
+            dsk[name_j] = (apply, finalize, [combined], kwargs)
+        else:
+            dsk[name_j] = combined
+    return dsk, names
@@ -1,9 +1,15 @@
 from __future__ import absolute_import
-from datashader.data_libraries.dask import dask_pipeline
-from datashader.core import bypixel
+from datashader.data_libraries.dask import dask_pipeline, dask_pipeline_many
+from datashader.core import bypixel, bypixel_many
 import dask_cudf
 
 
 @bypixel.pipeline.register(dask_cudf.DataFrame)
 def dask_cudf_pipeline(df, schema, canvas, glyph, summary):
     return dask_pipeline(df, schema, canvas, glyph, summary, cuda=True)
+
+
+@bypixel_many.pipeline.register(dask_cudf.DataFrame)
+def dask_cudf_pipeline_many(df, schema, canvases, glyph, summaries):
+    return dask_pipeline_many(df, schema, canvases, glyph, summaries,
+                              cuda=True)
@@ -1,35 +1,92 @@
 from __future__ import absolute_import, division
 
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
 import pandas as pd
 
-from datashader.core import bypixel
+from datashader import profiling
+from datashader.core import bypixel, bypixel_many
 from datashader.compiler import compile_components
+from datashader.kernel_cache import cache_kernels
 from datashader.glyphs.points import _PointLike
-from datashader.glyphs.area import _AreaToLineLike
-from datashader.utils import Dispatcher
-from collections import OrderedDict
+from datashader.glyphs.area import (_AreaToLineLike, AreaToZeroAxis0,
+                                    AreaToZeroAxis0Multi, AreaToLineAxis0,
+                                    AreaToLineAxis0Multi)
+from datashader.glyphs.line import LineAxis0, LineAxis0Multi
+from datashader.reductions import _uses_row_index
+from datashader.utils import Dispatcher, with_row_offset
+from collections import OrderedDict, namedtuple
 
 __all__ = ()
 
 
+#: Number of threads used to aggregate a pandas DataFrame. When greater than
+#: one, the rows are split into that many contiguous chunks which are
+#: aggregated concurrently and merged with the reduction's ``combine`` step.
+threads = 1
+
+#: Number of rows aggregated onto every canvas in turn by ``bypixel_many``,
+#: so each block of rows is read from memory once while aggregating onto
+#: several canvases.
+block_size = 2**16
+
+# Glyphs that connect consecutive rows, so each chunk after the first must
+# start from the last row of the previous chunk
+_connected_glyphs = (LineAxis0, LineAxis0Multi, AreaToZeroAxis0,
+                     AreaToZeroAxis0Multi, AreaToLineAxis0,
+                     AreaToLineAxis0Multi)
+
+
 @bypixel.pipeline.register(pd.DataFrame)
 def pandas_pipeline(df, schema, canvas, glyph, summary):
     return glyph_dispatch(glyph, df, schema, canvas, summary)
 
 
+@bypixel_many.pipeline.register(pd.DataFrame)
+def pandas_pipeline_many(df, schema, canvases, glyph, summaries):
+    if [s for s in summaries if _uses_row_index(s)]:
+        df = with_row_offset(df)
+    aggs = [_prepare(glyph, df, schema, canvas, summary)
+            for canvas, summary in zip(canvases, summaries)]
+    return [agg.finish(bases)
+            for agg, bases in zip(aggs, _aggregate(glyph, df, aggs))]
+
+
 glyph_dispatch = Dispatcher()
 
 
 @glyph_dispatch.register(_PointLike)
 @glyph_dispatch.register(_AreaToLineLike)
 def default(glyph, source, schema, canvas, summary, cuda=False):
-    create, info, append, _, finalize = compile_components(summary, schema, glyph, cuda)
+    if (_uses_row_index(summary) and not cuda and
+            isinstance(source, pd.DataFrame)):
+        # Chunks keep the row positions, as they are sliced with iloc
+        source = with_row_offset(source)
+    agg = _prepare(glyph, source, schema, canvas, summary, cuda)
+    bases, = _aggregate(glyph, source, [agg], cuda)
+    return agg.finish(bases)
+
+
+# The compiled aggregation of a source onto a canvas
+_Aggregation = namedtuple('_Aggregation', ['create', 'extend', 'combine',
+                                           'finish', 'shape', 'st', 'bounds'])
+
+
+def _prepare(glyph, source, schema, canvas, summary, cuda=False):
+    """Compile the functions aggregating ``source`` onto ``canvas``"""
+    create, info, append, combine, finalize = \
+        compile_components(summary, schema, glyph, cuda)
     x_mapper = canvas.x_axis.mapper
     y_mapper = canvas.y_axis.mapper
-    extend = glyph._build_extend(x_mapper, y_mapper, info, append)
+    extend = cache_kernels(
+        glyph._build_extend(x_mapper, y_mapper, info, append))
 
-    x_range = canvas.x_range or glyph.compute_x_bounds(source)
-    y_range = canvas.y_range or glyph.compute_y_bounds(source)
+    x_range, y_range = canvas.x_range, canvas.y_range
+    if x_range is None or y_range is None:
+        with profiling.stage('bounds', rows=len(source)):
+            x_range = x_range or glyph.compute_x_bounds(source)
+            y_range = y_range or glyph.compute_y_bounds(source)
 
     width = canvas.plot_width
     height = canvas.plot_height
@@ -40,11 +97,85 @@ def default(glyph, source, schema, canvas, summary, cuda=False):
     x_axis = canvas.x_axis.compute_index(x_st, width)
     y_axis = canvas.y_axis.compute_index(y_st, height)
 
-    bases = create((height, width))
-    extend(bases, source, x_st + y_st, x_range + y_range)
+    def finish(bases):
+        return finalize(bases,
+                        cuda=cuda,
+                        coords=OrderedDict([(glyph.x_label, x_axis),
+                                            (glyph.y_label, y_axis)]),
+                        dims=[glyph.y_label, glyph.x_label])
+
+    return _Aggregation(create, extend, combine, finish, (height, width),
+                        x_st + y_st, x_range + y_range)
+
+
+def _aggregate(glyph, source, aggs, cuda=False):
+    """Aggregate ``source`` for each of the compiled ``aggs``, returning
+    their bases"""
+    n_chunks = _n_chunks(glyph, source, cuda)
+    if n_chunks > 1:
+        return _threaded_extend(glyph, source, aggs, n_chunks)
+    with profiling.stage('create') as stage:
+        bases = [agg.create(agg.shape) for agg in aggs]
+        stage.nbytes = profiling.nbytes(bases)
+    with profiling.stage('extend', rows=len(source)):
+        _extend_rows(glyph, source, 0, len(source), aggs, bases)
+    return bases
+
+
+def _n_chunks(glyph, source, cuda):
+    """Number of row chunks to aggregate ``source`` in concurrently"""
+    if (cuda or threads is None or threads <= 1 or glyph.ndims != 1 or
+            not isinstance(source, pd.DataFrame)):
+        return 1
+    return int(min(threads, len(source)))
+
+
+def _threaded_extend(glyph, source, aggs, n_chunks):
+    """Aggregate ``source`` in ``n_chunks`` row chunks on a thread pool.
+
+    Each chunk is aggregated into its own set of base arrays by the compiled
+    (``nogil``) extend functions, and the per-chunk bases are then merged
+    with ``combine``.
+    """
+    edges = np.linspace(0, len(source), n_chunks + 1).astype('i8')
+
+    def chunk(i):
+        bases = [agg.create(agg.shape) for agg in aggs]
+        _extend_rows(glyph, source, edges[i], edges[i + 1], aggs, bases)
+        return bases
+
+    pool = ThreadPool(n_chunks)
+    try:
+        with profiling.stage('extend', rows=len(source)) as stage:
+            base_lists = pool.map(chunk, range(n_chunks))
+            stage.nbytes = profiling.nbytes(base_lists)
+    finally:
+        pool.close()
+    return [agg.combine([bases[j] for bases in base_lists])
+            for j, agg in enumerate(aggs)]
+
+
+def _extend_rows(glyph, source, start, stop, aggs, bases):
+    """Aggregate rows ``start:stop`` of ``source`` into the ``bases`` of each
+    of ``aggs``.
 
-    return finalize(bases,
-                    cuda=cuda,
-                    coords=OrderedDict([(glyph.x_label, x_axis),
-                                        (glyph.y_label, y_axis)]),
-                    dims=[glyph.y_label, glyph.x_label])
+    With several aggregations, the rows are traversed in blocks of
+    ``block_size`` rows, each aggregated by all of them in turn.
+    """
+    connected = isinstance(glyph, _connected_glyphs)
+    step = stop - start
+    if len(aggs) > 1 and glyph.ndims == 1 and block_size:
+        step = block_size
+    for block_start in range(start, stop, max(step, 1)):
+        block_stop = min(block_start + step, stop)
+        kwargs = {}
+        if connected:
+            kwargs['plot_start'] = block_start == 0
+            # Start from the last row of the previous block
+            block_start = max(block_start - 1, 0)
+        if block_start == 0 and block_stop == len(source):
+            block = source
+        else:
+            block = source.iloc[block_start:block_stop]
+        for agg, agg_bases in zip(aggs, bases):
+            agg.extend(agg_bases, block, agg.st, agg.bounds, **kwargs)
@@ -0,0 +1,240 @@
+"""Persistent on-disk cache of the numba kernels compiled for each aggregation.
+
+The ``extend`` kernels built by the glyphs close over the ``append`` function
+generated by ``datashader.compiler`` for each reduction and schema, so numba's
+own ``cache=True`` cannot be used for them. Instead, each compiled kernel is
+keyed by a token derived from its bytecode and, recursively, from the code of
+every function and constant it closes over or references (the reduction
+kernels, axis mappers, and glyph helpers). Two processes building the same
+aggregation therefore derive the same token and share the machine code stored
+in the cache directory.
+
+Caching is disabled by default. Enable it by setting the
+``DATASHADER_KERNEL_CACHE_DIR`` environment variable, or by assigning a
+directory to ``datashader.kernel_cache.cache_dir``.
+"""
+from __future__ import absolute_import, division
+
+import hashlib
+import os
+import sys
+import types
+import warnings
+
+import numpy as np
+import numba
+from six import integer_types, string_types
+
+try:
+    from numba.core.dispatcher import Dispatcher
+    from numba.core.caching import (FunctionCache, CompileResultCacheImpl,
+                                    IndexDataCacheFile, _CacheLocator)
+except ImportError:
+    from numba.dispatcher import Dispatcher
+    from numba.caching import (FunctionCache, CompileResultCacheImpl,
+                               IndexDataCacheFile, _CacheLocator)
+
+
+#: Directory in which compiled kernels are persisted, or ``None`` to disable
+#: the kernel cache.
+cache_dir = os.environ.get('DATASHADER_KERNEL_CACHE_DIR') or None
+
+__all__ = ['cache_kernels', 'kernel_token']
+
+
+def cache_kernels(func):
+    """Attach the on-disk kernel cache to the numba kernels called by ``func``.
+
+    ``func`` is typically the ``extend`` function returned by a glyph's
+    ``_build_extend``: a Python function whose closure holds the jitted
+    kernels it dispatches to. Every CPU dispatcher reachable through Python
+    closures is given a cache keyed by ``kernel_token``, so that compiled
+    machine code is reloaded instead of recompiled in later processes.
+    Dispatchers that cannot be tokenized are left uncached, with a warning.
+
+    Returns ``func`` unchanged, so calls can be chained.
+    """
+    if not cache_dir:
+        return func
+    for dispatcher in _find_dispatchers(func):
+        cache = getattr(dispatcher, '_cache', None)
+        if (isinstance(cache, _KernelCache) and
+                cache.cache_path == os.path.abspath(cache_dir)):
+            continue
+        try:
+            dispatcher._cache = _KernelCache(
+                dispatcher.py_func, kernel_token(dispatcher), cache_dir)
+        except Exception as e:
+            warnings.warn('Unable to cache kernel {0!r}: {1}'
+                          .format(dispatcher.py_func.__name__, e))
+    return func
+
+
+def kernel_token(func):
+    """Deterministic token identifying the code compiled for ``func``.
+
+    Combines the bytecode of ``func`` with the tokens of everything it closes
+    over or references as a global, recursing into other (jitted) functions.
+    Constants are tokenized by value, since numba freezes them into the
+    compiled code. Raises ``TypeError`` for objects of other types, which
+    cannot be tokenized reliably.
+    """
+    return hashlib.sha256(_tokenize(func, set())).hexdigest()
+
+
+def _find_dispatchers(func, seen=None):
+    """Yield the CPU dispatchers reachable from ``func``'s closure"""
+    seen = set() if seen is None else seen
+    if id(func) in seen:
+        return
+    seen.add(id(func))
+    if _is_cpu_dispatcher(func):
+        yield func
+    elif isinstance(func, types.FunctionType):
+        for cell in func.__closure__ or ():
+            try:
+                contents = cell.cell_contents
+            except ValueError:
+                # Empty cell
+                continue
+            for d in _find_dispatchers(contents, seen):
+                yield d
+
+
+def _is_cpu_dispatcher(obj):
+    """Whether ``obj`` dispatches to CPU kernels, excluding the ``numba.cuda``
+    dispatchers, which subclass ``Dispatcher`` in recent numba versions"""
+    return (isinstance(obj, Dispatcher) and
+            not type(obj).__module__.startswith('numba.cuda'))
+
+
+def _code_names(code):
+    """Global names referenced by ``code`` and its nested code objects"""
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names.update(_code_names(const))
+    return names
+
+
+def _code_token(code):
+    """Token of a code object, built from its fields, since the output of
+    ``marshal`` differs between equal code objects depending on string
+    interning and reference counts"""
+    fields = (code.co_argcount, getattr(code, 'co_kwonlyargcount', 0),
+              code.co_nlocals, code.co_flags, code.co_names,
+              code.co_varnames, code.co_freevars, code.co_cellvars)
+    return (b'code(' + code.co_code + repr(fields).encode() +
+            b','.join(_const_token(c) for c in code.co_consts) + b')')
+
+
+def _const_token(const):
+    if isinstance(const, types.CodeType):
+        return _code_token(const)
+    if isinstance(const, tuple):
+        return b'(' + b','.join(_const_token(c) for c in const) + b')'
+    if isinstance(const, frozenset):
+        # Ordered by value, as iteration order depends on string hashing
+        return b'{' + b','.join(sorted(_const_token(c) for c in const)) + b'}'
+    return repr(const).encode()
+
+
+def _tokenize(obj, seen):
+    if isinstance(obj, Dispatcher):
+        return b'jit:' + _tokenize(obj.py_func, seen)
+    if isinstance(obj, types.FunctionType):
+        if id(obj) in seen:
+            # Recursive reference, already accounted for
+            return b'fn:' + obj.__name__.encode()
+        seen.add(id(obj))
+        parts = [_code_token(obj.__code__)]
+        for cell in obj.__closure__ or ():
+            try:
+                parts.append(_tokenize(cell.cell_contents, seen))
+            except ValueError:
+                parts.append(b'<empty>')
+        for default in obj.__defaults__ or ():
+            parts.append(_tokenize(default, seen))
+        glbls = obj.__globals__
+        for name in sorted(_code_names(obj.__code__)):
+            if name in glbls:
+                parts.append(name.encode() + b'=' + _tokenize(glbls[name], seen))
+        return b'fn(' + b','.join(parts) + b')'
+    if isinstance(obj, np.generic):
+        # Before Python scalars, which np.float64 and np.bool_ may subclass
+        return (b'scalar:' + obj.dtype.str.encode() + b':' +
+                np.asarray(obj).tobytes())
+    if isinstance(obj, np.dtype):
+        return b'dtype:' + repr(obj).encode()
+    if isinstance(obj, (bool, float, complex, bytes, type(None)) +
+                  integer_types + string_types):
+        return repr(obj).encode()
+    if isinstance(obj, (tuple, list)):
+        return b'(' + b','.join(_tokenize(o, seen) for o in obj) + b')'
+    if isinstance(obj, np.ndarray):
+        return (b'array:' + str(obj.dtype).encode() + str(obj.shape).encode() +
+                hashlib.sha256(np.ascontiguousarray(obj).tobytes()).digest())
+    if isinstance(obj, types.ModuleType):
+        return b'module:' + obj.__name__.encode()
+    if isinstance(obj, (types.BuiltinFunctionType, np.ufunc)):
+        # e.g. math.log10 or np.isnan, identified by their qualified name
+        module = getattr(obj, '__module__', None) or 'numpy'
+        return 'builtin:{0}.{1}'.format(module, obj.__name__).encode()
+    raise TypeError("Cannot tokenize object of type {0}.{1}".format(
+        type(obj).__module__, type(obj).__name__))
+
+
+class _KernelCacheLocator(_CacheLocator):
+    """Locates kernels in a flat, user-provided cache directory"""
+    def __init__(self, py_func, path):
+        self._py_file = py_func.__code__.co_filename
+        self._cache_path = os.path.abspath(path)
+
+    def get_cache_path(self):
+        return self._cache_path
+
+    def get_source_stamp(self):
+        # Freshness is fully captured by the token in the index key
+        return numba.__version__
+
+    def get_disambiguator(self):
+        return ''
+
+
+class _KernelCacheImpl(CompileResultCacheImpl):
+    """Serializes compile results, including those of closures"""
+    def __init__(self, py_func, token, path):
+        self._is_closure = bool(py_func.__closure__)
+        self._lineno = py_func.__code__.co_firstlineno
+        self._locator = _KernelCacheLocator(py_func, path)
+        qualname = getattr(py_func, '__qualname__', py_func.__name__)
+        modname = (py_func.__module__ or 'datashader').split('.')[-1]
+        fullname = '{0}.{1}'.format(modname, qualname)
+        fullname = fullname.replace('<', '').replace('>', '')
+        self._filename_base = '{0}-{1}.py{2}{3}{4}'.format(
+            fullname, token[:16], sys.version_info[0], sys.version_info[1],
+            getattr(sys, 'abiflags', ''))
+
+    def check_cachable(self, cres):
+        # Closures are safe to cache here, since the token keying the cache
+        # accounts for the contents of the closure
+        if cres.lifted or cres.library.has_dynamic_globals:
+            return False
+        return True
+
+
+class _KernelCache(FunctionCache):
+    """Numba function cache keyed by a ``kernel_token``"""
+    def __init__(self, py_func, token, path):
+        self._name = repr(py_func)
+        self._token = token
+        self._impl = _KernelCacheImpl(py_func, token, path)
+        self._cache_path = self._impl.locator.get_cache_path()
+        self._cache_file = IndexDataCacheFile(
+            cache_path=self._cache_path,
+            filename_base=self._impl.filename_base,
+            source_stamp=self._impl.locator.get_source_stamp())
+        self.enable()
+
+    def _index_key(self, sig, codegen):
+        return (sig, codegen.magic_tuple(), self._token)
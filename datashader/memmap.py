@@ -0,0 +1,136 @@
+from __future__ import absolute_import, division
+
+import json
+import os
+from collections import OrderedDict
+
+import datashape
+import numpy as np
+import pandas as pd
+from six import string_types
+
+from .utils import dshape_from_pandas_helper
+
+
+class MemmapFrame(object):
+    """Columns of equal length in memory-mapped numpy arrays, for data
+    larger than memory.
+
+    Canvas methods aggregate a ``MemmapFrame`` by streaming slices of
+    ``chunk_size`` rows of its columns through the compiled aggregation
+    functions, leaving it to the OS page cache to read them from disk, so
+    memory use does not grow with the number of rows.
+
+    Parameters
+    ----------
+    columns : dict
+        Mapping of column name to a one dimensional array, usually an
+        ``np.memmap``, or to the path of a ``.npy`` file, which is opened
+        memory-mapped.
+    categories : dict, optional
+        Mapping of the names of categorical columns, whose arrays hold the
+        integer category codes, to their list of categories.
+    chunk_size : int, optional
+        Number of rows aggregated at a time.
+
+    Examples
+    --------
+    >>> import datashader as ds  # doctest: +SKIP
+    >>> source = ds.MemmapFrame.from_dataframe(df, 'data_dir')  # doctest: +SKIP
+    >>> source = ds.MemmapFrame.open('data_dir')  # doctest: +SKIP
+    >>> agg = ds.Canvas().points(source, 'x', 'y',  # doctest: +SKIP
+    ...                          ds.count_cat('cat'))
+    """
+    def __init__(self, columns, categories=None, chunk_size=2**20):
+        self.arrays = OrderedDict()
+        for name, array in columns.items():
+            if isinstance(array, string_types):
+                array = np.load(array, mmap_mode='r')
+            if array.ndim != 1:
+                raise ValueError("Column {0!r} is not one dimensional"
+                                 .format(name))
+            self.arrays[name] = array
+        lengths = set(len(a) for a in self.arrays.values())
+        if len(lengths) > 1:
+            raise ValueError("Columns have different lengths: {0}".format(
+                sorted(lengths)))
+        self._length = lengths.pop() if lengths else 0
+
+        self.categories = OrderedDict()
+        for name, cats in (categories or {}).items():
+            if name not in self.arrays:
+                raise ValueError("Categorical column {0!r} not found"
+                                 .format(name))
+            if self.arrays[name].dtype.kind not in 'iu':
+                raise ValueError("Categorical column {0!r} must hold integer "
+                                 "category codes".format(name))
+            self.categories[name] = list(cats)
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be positive")
+        self.chunk_size = int(chunk_size)
+
+    @property
+    def columns(self):
+        return list(self.arrays)
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, key):
+        """``MemmapFrame`` of the columns in the list ``key``"""
+        return MemmapFrame(
+            OrderedDict((k, self.arrays[k]) for k in key),
+            OrderedDict((k, v) for k, v in self.categories.items()
+                        if k in key),
+            self.chunk_size)
+
+    @property
+    def dshape(self):
+        """The datashape of the columns, as for the equivalent DataFrame"""
+        return datashape.var * datashape.Record([
+            (k, dshape_from_pandas_helper(pd.Series([], dtype=(
+                pd.api.types.CategoricalDtype(self.categories[k])
+                if k in self.categories else a.dtype))))
+            for k, a in self.arrays.items()])
+
+    @classmethod
+    def from_dataframe(cls, df, directory, chunk_size=2**20):
+        """Write the columns of the DataFrame ``df`` to ``.npy`` files in
+        ``directory``, and open them as a ``MemmapFrame``.
+
+        Categorical columns are written as their codes, and object (e.g.
+        string) columns, which cannot be memory-mapped, are rejected. The
+        files are named by the position of their column, and the column
+        names, file names and categories are written to ``metadata.json``.
+        """
+        for name in df.columns:
+            if df[name].dtype == object:
+                raise ValueError("Column {0!r} has dtype object, which cannot "
+                                 "be memory-mapped; convert it to a "
+                                 "categorical or numeric dtype".format(name))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        categories = OrderedDict()
+        files = []
+        for i, name in enumerate(df.columns):
+            values = df[name]
+            if isinstance(values.dtype, pd.api.types.CategoricalDtype):
+                categories[name] = values.cat.categories.tolist()
+                values = values.cat.codes
+            files.append('column{0}.npy'.format(i))
+            np.save(os.path.join(directory, files[-1]), values.values)
+        with open(os.path.join(directory, 'metadata.json'), 'w') as f:
+            json.dump({'columns': list(df.columns), 'files': files,
+                       'categories': categories}, f)
+        return cls.open(directory, chunk_size)
+
+    @classmethod
+    def open(cls, directory, chunk_size=2**20):
+        """Open the ``.npy`` files in ``directory`` written by
+        ``from_dataframe``"""
+        with open(os.path.join(directory, 'metadata.json')) as f:
+            meta = json.load(f, object_pairs_hook=OrderedDict)
+        columns = OrderedDict(
+            (name, os.path.join(directory, filename))
+            for name, filename in zip(meta['columns'], meta['files']))
+        return cls(columns, meta['categories'], chunk_size)
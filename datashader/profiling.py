@@ -0,0 +1,161 @@
+"""Instrumentation of the stages of the rendering pipeline.
+
+Each stage of an aggregation or shading is timed and reported as a
+``StageRecord`` to every function in ``callbacks``:
+
+``bypixel``, ``bypixel_many``
+    A whole aggregation, a cache hit if served from ``bypixel.cache``.
+``schema``
+    Selecting the needed columns of the source and inferring their types.
+``compile``
+    Generating the aggregation functions, a cache hit if already generated
+    for the same reduction, schema and glyph.
+``bounds``
+    Computing the bounds of the data, for canvases without ranges.
+``create``, ``extend``
+    Allocating the aggregate arrays and aggregating rows into them. The
+    numba kernels are compiled by the first ``extend`` of each aggregation.
+``combine``, ``finalize``
+    Merging the aggregates of chunks or partitions, and converting them to
+    an ``xarray`` object.
+``compute``
+    Running the graph of a dask aggregation, which includes the ``extend``,
+    ``combine`` and ``finalize`` stages of its partitions.
+``shade``
+    Converting an aggregate to an image with ``tf.shade``.
+
+Instrumentation is disabled while ``callbacks`` is empty, which is the
+default, and stages then cost a single function call.
+
+Record the stages of a block of code with ``Profile``:
+
+>>> import datashader as ds                          # doctest: +SKIP
+>>> with ds.profiling.Profile() as profile:  # doctest: +SKIP
+...     img = tf.shade(cvs.points(df, 'x', 'y', ds.mean('v')))
+>>> profile.to_dataframe()  # doctest: +SKIP
+
+or forward every record to a metrics system with a callback:
+
+>>> ds.profiling.callbacks.append(  # doctest: +SKIP
+...     lambda r: statsd.timing('datashader.' + r.stage, r.seconds * 1000))
+"""
+from __future__ import absolute_import, division
+
+import time
+from collections import namedtuple
+
+import pandas as pd
+
+#: Functions called with the ``StageRecord`` of each stage as it completes,
+#: possibly from several threads at once.
+callbacks = []
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+#: Timing of one stage of the pipeline.
+#:
+#: ``stage`` is the name of the stage, ``seconds`` its wall time, ``rows``
+#: the number of rows it processed, ``nbytes`` the bytes allocated for the
+#: aggregate or image it produced, and ``cache_hit`` whether it was served
+#: from a cache (compiled aggregation functions or aggregates). Fields that
+#: do not apply to a stage are None.
+StageRecord = namedtuple('StageRecord',
+                         ['stage', 'seconds', 'rows', 'nbytes', 'cache_hit'])
+
+
+class _Stage(object):
+    """Times a stage, for use as a context manager.
+
+    Attributes ``rows``, ``nbytes`` and ``cache_hit`` can be set within the
+    block to be reported with the stage.
+    """
+    __slots__ = ('name', 'rows', 'nbytes', 'cache_hit', '_start')
+
+    def __init__(self, name, rows):
+        self.name = name
+        self.rows = rows
+        self.nbytes = None
+        self.cache_hit = None
+
+    def __enter__(self):
+        self._start = _clock()
+        return self
+
+    def __exit__(self, *exc_info):
+        record = StageRecord(self.name, _clock() - self._start,
+                             self.rows, self.nbytes, self.cache_hit)
+        for callback in list(callbacks):
+            callback(record)
+
+
+class _NullStage(object):
+    """Stand-in for ``_Stage`` while instrumentation is disabled"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_null_stage = _NullStage()
+
+
+def stage(name, rows=None):
+    """Context manager timing the stage ``name`` of the pipeline, which
+    processes ``rows`` rows"""
+    if not callbacks:
+        return _null_stage
+    return _Stage(name, rows)
+
+
+def nbytes(obj):
+    """Total bytes of the arrays in ``obj``, an array or a (nested) list or
+    tuple of arrays"""
+    if isinstance(obj, (list, tuple)):
+        return sum(nbytes(o) for o in obj)
+    return obj.nbytes
+
+
+class Profile(object):
+    """Records the stages run while used as a context manager.
+
+    Attributes
+    ----------
+    records : list of StageRecord
+        The records of the completed stages, in order of completion.
+    """
+    def __init__(self):
+        self.records = []
+        self._callback = self.records.append
+
+    def __enter__(self):
+        callbacks.append(self._callback)
+        return self
+
+    def __exit__(self, *exc_info):
+        # Removed by identity rather than equality, so a profile never
+        # removes the callback of another one
+        for i in reversed(range(len(callbacks))):
+            if callbacks[i] is self._callback:
+                del callbacks[i]
+                break
+
+    def to_dataframe(self):
+        """The records as a DataFrame, with one row per stage run"""
+        return pd.DataFrame(self.records, columns=StageRecord._fields)
+
+    def totals(self):
+        """Total seconds, rows and bytes per stage, with the number of runs
+        and cache hits, ordered by the total time"""
+        df = self.to_dataframe()
+        df['cache_hit'] = df.cache_hit.fillna(False).astype(bool)
+        totals = df.groupby('stage').agg({'seconds': 'sum', 'rows': 'sum',
+                                          'nbytes': 'sum',
+                                          'cache_hit': 'sum'})
+        totals['runs'] = df.groupby('stage').size()
+        return totals.sort_values('seconds', ascending=False)
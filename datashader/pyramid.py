@@ -0,0 +1,163 @@
+from __future__ import absolute_import, division
+
+from collections import OrderedDict
+
+import dask.dataframe as dd
+
+from .core import Canvas, _bypixel_sanitise
+from .data_libraries.dask import _compute, compute_bounds, glyph_dispatch
+from .streaming import StreamingAggregator
+
+
+class AggregatePyramid(object):
+    """Multi-resolution pyramid of aggregates, computed in a single pass.
+
+    The source is aggregated once at the base resolution. Each coarser
+    level halves the resolution of the previous one by merging the base
+    arrays of every 2x2 block of bins with the reduction's ``combine`` step
+    (summing counts and sums, taking the min or max, merging the ``m2`` of
+    ``var`` and ``std``), so zoomed-out views are served without rescanning
+    the data.
+
+    Coarser levels of connected glyphs (``LineAxis0`` and the area glyphs)
+    are likewise the 2x2 sums of the finer level, not renders at their
+    resolution: a line crossing several fine bins of a coarse bin counts
+    once per fine bin, where drawing it at the coarse resolution would
+    count it once.
+
+    Parameters
+    ----------
+    source : pandas.DataFrame or dask.DataFrame
+        The input datasource. Dask partitions are aggregated in parallel,
+        by the same graph as ``Canvas`` aggregations, computed once.
+    glyph : Glyph
+        The glyph to bin by, e.g. ``Point('x', 'y')``.
+    agg : Reduction, optional
+        Reduction to compute. Default is ``count()``.
+    plot_width, plot_height : int, optional
+        Size of the base (finest) level. Levels are added while both
+        dimensions can be halved.
+    x_range, y_range : tuple, optional
+        Bounds of the pyramid. Default is the bounds of the data.
+    x_axis_type, y_axis_type : str, optional
+        The type of the axes, ``'linear'`` [default] or ``'log'``.
+    """
+    def __init__(self, source, glyph, agg=None, plot_width=4096,
+                 plot_height=4096, x_range=None, y_range=None,
+                 x_axis_type='linear', y_axis_type='linear'):
+        if isinstance(source, dd.DataFrame):
+            if x_range is None or y_range is None:
+                x_extents, y_extents = compute_bounds(source, glyph)
+                x_range = x_range or x_extents
+                y_range = y_range or y_extents
+        else:
+            x_range = x_range or glyph.compute_x_bounds(source)
+            y_range = y_range or glyph.compute_y_bounds(source)
+
+        self.glyph = glyph
+        self.x_axis_type = x_axis_type
+        self.y_axis_type = y_axis_type
+        stream = StreamingAggregator(
+            Canvas(plot_width=plot_width, plot_height=plot_height,
+                   x_range=x_range, y_range=y_range,
+                   x_axis_type=x_axis_type, y_axis_type=y_axis_type),
+            glyph, agg)
+        if isinstance(source, dd.DataFrame):
+            _append_dask(stream, source)
+        else:
+            stream.append(source)
+        if stream.nrows == 0:
+            raise ValueError("Cannot build a pyramid from an empty source")
+        self.agg = stream.agg
+        self._stream = stream
+
+        combine = stream._combine
+        self._levels = [stream._bases]
+        while plot_width % 2 == 0 and plot_height % 2 == 0:
+            bases = self._levels[-1]
+            quadrants = [tuple(b[i::2, j::2] for b in bases)
+                         for i in (0, 1) for j in (0, 1)]
+            self._levels.append(combine(quadrants))
+            plot_width, plot_height = plot_width // 2, plot_height // 2
+        self._finalized = {}
+
+    @property
+    def nlevels(self):
+        """Number of levels, the finest being level 0."""
+        return len(self._levels)
+
+    def canvas(self, level):
+        """The Canvas the aggregate at ``level`` corresponds to."""
+        base = self._stream.canvas
+        return Canvas(plot_width=base.plot_width >> level,
+                      plot_height=base.plot_height >> level,
+                      x_range=base.x_range, y_range=base.y_range,
+                      x_axis_type=self.x_axis_type,
+                      y_axis_type=self.y_axis_type)
+
+    def level(self, level):
+        """The finalized aggregate at ``level``, over the full extent."""
+        if level not in self._finalized:
+            canvas = self.canvas(level)
+            stream = self._stream
+            x_st = canvas.x_axis.compute_scale_and_translate(
+                canvas.x_range, canvas.plot_width)
+            y_st = canvas.y_axis.compute_scale_and_translate(
+                canvas.y_range, canvas.plot_height)
+            coords = OrderedDict([
+                (self.glyph.x_label, canvas.x_axis.compute_index(
+                    x_st, canvas.plot_width)),
+                (self.glyph.y_label, canvas.y_axis.compute_index(
+                    y_st, canvas.plot_height))])
+            self._finalized[level] = stream._finalize(
+                self._levels[level], cuda=False, coords=coords,
+                dims=[self.glyph.y_label, self.glyph.x_label])
+        return self._finalized[level]
+
+    def aggregate(self, canvas):
+        """Aggregate for the viewport of ``canvas``, served from the pyramid.
+
+        Returns the bins within the ranges of ``canvas`` from the coarsest
+        level whose resolution is at least that of ``canvas``, so the result
+        has at least ``canvas.plot_width`` by ``canvas.plot_height`` bins
+        (unless the finest level is coarser than requested).
+        """
+        if (canvas.x_axis is not self._stream.canvas.x_axis or
+                canvas.y_axis is not self._stream.canvas.y_axis):
+            raise ValueError("Canvas axis types differ from the pyramid's")
+        base = self._stream.canvas
+        x_range = canvas.x_range or base.x_range
+        y_range = canvas.y_range or base.y_range
+
+        def bin_size(axis, rng, n):
+            start, end = map(axis.mapper, rng)
+            return abs(end - start) / n
+
+        requested = (bin_size(canvas.x_axis, x_range, canvas.plot_width),
+                     bin_size(canvas.y_axis, y_range, canvas.plot_height))
+        base_size = (bin_size(base.x_axis, base.x_range, base.plot_width),
+                     bin_size(base.y_axis, base.y_range, base.plot_height))
+        level = 0
+        while (level + 1 < self.nlevels and
+               base_size[0] * 2**(level + 1) <= requested[0] and
+               base_size[1] * 2**(level + 1) <= requested[1]):
+            level += 1
+
+        agg = self.level(level)
+        return agg.sel({self.glyph.x_label: slice(*sorted(x_range)),
+                        self.glyph.y_label: slice(*sorted(y_range))})
+
+
+def _append_dask(stream, df):
+    """Aggregate the dask DataFrame ``df`` into the empty ``stream`` with a
+    single graph, aggregating each partition in a task and combining their
+    base arrays in a tree"""
+    df, schema = _bypixel_sanitise(df, stream.glyph, [stream.agg])
+    stream._initialize(schema)
+    dsk, (name,) = glyph_dispatch(stream.glyph, df, schema, [stream.canvas],
+                                  [stream.agg], finalized=False)
+    nrows = 'nrows-' + name
+    dsk[nrows] = (sum, [(len, key) for key in df.__dask_keys__()])
+    bases, stream.nrows = _compute(df, dsk, [name, nrows])
+    stream._bases = tuple(bases)
+    stream._row_offset = stream.nrows
@@ -1,12 +1,16 @@
 from __future__ import absolute_import, division, print_function
 
 import numpy as np
+import pandas as pd
 from datashape import dshape, isnumeric, Record, Option
 from datashape import coretypes as ct
-from toolz import concat, unique
+from collections import OrderedDict
+
+from toolz import concat, unique, memoize
 import xarray as xr
 
 from datashader.glyphs.glyph import isnull
+from .compatibility import _exec
 from .utils import Expr, ngjit
 from numba import cuda as nb_cuda
 
@@ -49,11 +53,80 @@ class category_codes(Preprocess):
             return df[self.column].cat.codes.values
 
 
+class hll_codes(Preprocess):
+    """Hash the values of a column into HyperLogLog register updates.
+
+    Each value is hashed to 64 bits, the first ``precision`` of which select
+    a register, and is encoded as ``rank * 2**precision + register``, where
+    ``rank`` is one more than the number of leading zeros in the remaining
+    bits. Missing values are encoded as -1.
+    """
+    def __init__(self, column, precision):
+        super(hll_codes, self).__init__(column)
+        self.precision = precision
+
+    def _hashable_inputs(self):
+        return super(hll_codes, self)._hashable_inputs() + (self.precision,)
+
+    def apply(self, df):
+        if cudf and isinstance(df, cudf.DataFrame):
+            raise ValueError("count_distinct is not yet supported on the GPU")
+        values = df[self.column].values
+        codes = _hll_encode(pd.util.hash_array(values), self.precision)
+        codes[np.asarray(pd.isnull(values))] = -1
+        return codes
+
+
+@ngjit
+def _hll_encode(hashes, precision):
+    codes = np.empty(len(hashes), dtype=np.int32)
+    shift = np.uint64(64 - precision)
+    top = np.uint64(1) << np.uint64(63 - precision)
+    for i in range(len(hashes)):
+        h = hashes[i]
+        rank = 1
+        bit = top
+        while bit != np.uint64(0) and (h & bit) == np.uint64(0):
+            rank += 1
+            bit = bit >> np.uint64(1)
+        codes[i] = (rank << precision) + np.int32(h >> shift)
+    return codes
+
+
+class row_index(Preprocess):
+    """Positions of the rows of a dataframe in the aggregated source.
+
+    Pipelines aggregating a source in chunks number the rows of each chunk
+    from its offset in the source, by giving it a ``RangeIndex`` starting at
+    that offset (see ``datashader.utils.with_row_offset``). The rows of
+    other dataframes are numbered from zero.
+    """
+    def __init__(self):
+        super(row_index, self).__init__(None)
+
+    def apply(self, df):
+        if cudf and isinstance(df, cudf.DataFrame):
+            raise ValueError("Row index reductions are not yet supported on "
+                             "the GPU")
+        index = df.index
+        if isinstance(index, pd.RangeIndex) and index.step == 1:
+            start = index.start
+        else:
+            start = 0
+        return np.arange(start, start + len(df), dtype='i8')
+
+
 class Reduction(Expr):
     """Base class for per-bin reductions."""
     def __init__(self, column=None):
         self.column = column
 
+    # Reductions with a selectable accumulator dtype store its name here
+    dtype = None
+
+    def _hashable_inputs(self):
+        return super(Reduction, self)._hashable_inputs() + (self.dtype,)
+
     def validate(self, in_dshape):
         if not self.column in in_dshape.dict:
             raise ValueError("specified column not found")
@@ -91,9 +164,36 @@ class Reduction(Expr):
     def _build_combine(self, dshape):
         return self._combine
 
+    def _build_retract(self, dshape):
+        return self._retract
+
+    def _build_merge(self, dshape):
+        return self._merge
+
     def _build_finalize(self, dshape):
         return self._finalize
 
+    # Reductions whose contribution can be subtracted back out of an aggregate
+    # define a ``_retract`` staticmethod, taking the same stacked arguments as
+    # ``_combine`` with the aggregate first and the part to remove second.
+    _retract = None
+
+    # Reductions may define a ``_merge`` staticmethod accumulating one
+    # aggregate into another in place. It takes ``(accumulator, part)`` pairs
+    # in the order of the ``_combine`` arguments, and only writes to the
+    # accumulator of the reduction itself (the accumulators of any temps are
+    # read before they are merged). Otherwise pairs are merged by ``_combine``.
+    _merge = None
+
+
+def _accumulator_dtype(dtype, kinds, reduction):
+    """Validate the accumulator dtype of a reduction, returning its name"""
+    dtype = np.dtype(dtype)
+    if dtype.kind not in kinds:
+        raise ValueError("{0} does not support accumulating into {1} arrays"
+                         .format(reduction, dtype))
+    return dtype.name
+
 
 class OptionalFieldReduction(Reduction):
     """Base class for things like ``count`` or ``any``"""
@@ -120,8 +220,16 @@ class count(OptionalFieldReduction):
     column : str, optional
         If provided, only counts elements in ``column`` that are not ``NaN``.
         Otherwise, counts every element.
+    dtype : str or numpy.dtype, optional
+        Integer dtype of the counts, ``int32`` by default. Narrower types
+        such as ``uint16`` reduce memory, but wrap around on overflow.
     """
-    _dshape = dshape(ct.int32)
+    def __init__(self, column=None, dtype='int32'):
+        super(count, self).__init__(column)
+        self.dtype = _accumulator_dtype(dtype, 'iu', 'count')
+
+    def out_dshape(self, in_dshape):
+        return dshape(ct.CType.from_numpy_dtype(np.dtype(self.dtype)))
 
     # CPU append functions
     @staticmethod
@@ -148,13 +256,23 @@ class count(OptionalFieldReduction):
         if not isnull(field):
             nb_cuda.atomic.add(agg, (y, x), 1)
 
-    @staticmethod
-    def _create(shape, array_module):
-        return array_module.zeros(shape, dtype='i4')
+    def _build_create(self, out_dshape):
+        dtype = self.dtype
+        return lambda shape, array_module: array_module.zeros(
+            shape, dtype=dtype
+        )
 
     @staticmethod
     def _combine(aggs):
-        return aggs.sum(axis=0, dtype='i4')
+        return aggs.sum(axis=0, dtype=aggs.dtype)
+
+    @staticmethod
+    def _merge(aggs):
+        np.add(aggs[0], aggs[1], out=aggs[0])
+
+    @staticmethod
+    def _retract(aggs):
+        return aggs[0] - aggs[1]
 
 
 class any(OptionalFieldReduction):
@@ -188,14 +306,33 @@ class any(OptionalFieldReduction):
     def _combine(aggs):
         return aggs.sum(axis=0, dtype='bool')
 
+    @staticmethod
+    def _merge(aggs):
+        np.logical_or(aggs[0], aggs[1], out=aggs[0])
+
 
 class FloatingReduction(Reduction):
-    """Base classes for reductions that always have floating-point dtype."""
+    """Base classes for reductions that always have floating-point dtype.
+
+    The floating-point ``dtype`` of the aggregate is ``float64`` by default,
+    or ``float32`` to halve its memory at the cost of precision.
+    """
     _dshape = dshape(Option(ct.float64))
+    # Initial value of the bins
+    _fill = np.nan
 
-    @staticmethod
-    def _create(shape, array_module):
-        return array_module.full(shape, np.nan, dtype='f8')
+    def __init__(self, column=None, dtype='float64'):
+        super(FloatingReduction, self).__init__(column)
+        self.dtype = _accumulator_dtype(dtype, 'f', type(self).__name__)
+
+    def out_dshape(self, in_dshape):
+        return dshape(Option(ct.CType.from_numpy_dtype(np.dtype(self.dtype))))
+
+    def _build_create(self, out_dshape):
+        fill, dtype = self._fill, self.dtype
+        return lambda shape, array_module: array_module.full(
+            shape, fill, dtype=dtype
+        )
 
     @staticmethod
     def _finalize(bases, cuda=False, **kwargs):
@@ -211,10 +348,7 @@ class _sum_zero(FloatingReduction):
         Name of the column to aggregate over. Column data type must be numeric.
         ``NaN`` values in the column are skipped.
     """
-
-    @staticmethod
-    def _create(shape, array_module):
-        return array_module.full(shape, 0.0, dtype='f8')
+    _fill = 0.0
 
     @staticmethod
     @ngjit
@@ -230,7 +364,16 @@ class _sum_zero(FloatingReduction):
 
     @staticmethod
     def _combine(aggs):
-        return aggs.sum(axis=0, dtype='f8')
+        return aggs.sum(axis=0, dtype=aggs.dtype)
+
+    @staticmethod
+    def _merge(aggs):
+        np.add(aggs[0], aggs[1], out=aggs[0])
+
+    @staticmethod
+    def _retract(aggs):
+        return aggs[0] - aggs[1]
+
 
 class sum(FloatingReduction):
     """Sum of all elements in ``column``.
@@ -242,13 +385,16 @@ class sum(FloatingReduction):
     column : str
         Name of the column to aggregate over. Column data type must be numeric.
         ``NaN`` values in the column are skipped.
+    dtype : str or numpy.dtype, optional
+        Floating-point dtype of the accumulated arrays, ``float64`` by
+        default. ``float32`` halves their memory at the cost of precision.
     """
     _dshape = dshape(Option(ct.float64))
 
     # Cuda implementation
     def _build_bases(self, cuda=False):
         if cuda:
-            return (_sum_zero(self.column), any(self.column))
+            return (_sum_zero(self.column, self.dtype), any(self.column))
         else:
             return (self,)
 
@@ -279,6 +425,14 @@ class sum(FloatingReduction):
         set_to_zero = missing_vals & ~all_empty
         return np.where(set_to_zero, 0, aggs).sum(axis=0)
 
+    @staticmethod
+    def _merge(aggs):
+        acc, part = aggs
+        acc_missing = np.isnan(acc)
+        np.add(acc, part, out=acc, where=~(acc_missing | np.isnan(part)))
+        np.copyto(acc, part, where=acc_missing)
+
+
 class m2(FloatingReduction):
     """Sum of square differences from the mean of all elements in ``column``.
 
@@ -292,12 +446,10 @@ class m2(FloatingReduction):
         ``NaN`` values in the column are skipped.
     """
 
-    @staticmethod
-    def _create(shape, array_module):
-        return array_module.full(shape, 0.0, dtype='f8')
+    _fill = 0.0
 
     def _build_temps(self, cuda=False):
-        return (_sum_zero(self.column), count(self.column))
+        return (_sum_zero(self.column, self.dtype), count(self.column))
 
     def _build_append(self, dshape, schema, cuda=False):
         if cuda:
@@ -322,6 +474,27 @@ The 'std' and 'var' reduction operations are not yet supported on the GPU""")
             mu = np.nansum(sums, axis=0) / ns.sum(axis=0)
             return np.nansum(Ms + ns*(sums/ns - mu)**2, axis=0)
 
+    @staticmethod
+    def _merge(Ms, sums, ns):
+        # Pairwise form of ``_combine``, given the sums and counts of the
+        # accumulator before they are merged
+        (M, M_b), (s, s_b), (n, n_b) = Ms, sums, ns
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta = s_b/n_b - s/n
+            update = delta**2 * n * (n_b / (n + n_b))
+        M += M_b
+        M += np.where((n > 0) & (n_b > 0), update, 0)
+
+    @staticmethod
+    def _retract(Ms, sums, ns):
+        # Inverse of the pairwise update in ``_combine``
+        (M, M_b), (s, s_b), (n, n_b) = Ms, sums, ns
+        n_a = n - n_b
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta = (s - s_b)/n_a - s_b/n_b
+            M_a = np.maximum(M - M_b - delta**2 * n_a * n_b / n, 0)
+        return np.where(n_b == 0, M, np.where(n_a == 0, 0, M_a))
+
 
 class min(FloatingReduction):
     """Minimum value of all elements in ``column``.
@@ -331,6 +504,9 @@ class min(FloatingReduction):
     column : str
         Name of the column to aggregate over. Column data type must be numeric.
         ``NaN`` values in the column are skipped.
+    dtype : str or numpy.dtype, optional
+        Floating-point dtype of the accumulated arrays, ``float64`` by
+        default. ``float32`` halves their memory at the cost of precision.
     """
     @staticmethod
     @ngjit
@@ -349,6 +525,10 @@ class min(FloatingReduction):
     def _combine(aggs):
         return np.nanmin(aggs, axis=0)
 
+    @staticmethod
+    def _merge(aggs):
+        np.fmin(aggs[0], aggs[1], out=aggs[0])
+
 
 class max(FloatingReduction):
     """Maximum value of all elements in ``column``.
@@ -358,6 +538,9 @@ class max(FloatingReduction):
     column : str
         Name of the column to aggregate over. Column data type must be numeric.
         ``NaN`` values in the column are skipped.
+    dtype : str or numpy.dtype, optional
+        Floating-point dtype of the accumulated arrays, ``float64`` by
+        default. ``float32`` halves their memory at the cost of precision.
     """
     @staticmethod
     @ngjit
@@ -376,6 +559,10 @@ class max(FloatingReduction):
     def _combine(aggs):
         return np.nanmax(aggs, axis=0)
 
+    @staticmethod
+    def _merge(aggs):
+        np.fmax(aggs[0], aggs[1], out=aggs[0])
+
 
 class count_cat(Reduction):
     """Count of all elements in ``column``, grouped by category.
@@ -386,14 +573,22 @@ class count_cat(Reduction):
         Name of the column to aggregate over. Column data type must be
         categorical. Resulting aggregate has a outer dimension axis along the
         categories present.
+    dtype : str or numpy.dtype, optional
+        Integer dtype of the counts, ``int32`` by default. Narrower types
+        such as ``uint16`` reduce memory, but wrap around on overflow.
     """
+    def __init__(self, column, dtype='int32'):
+        super(count_cat, self).__init__(column)
+        self.dtype = _accumulator_dtype(dtype, 'iu', 'count_cat')
+
     def validate(self, in_dshape):
         if not isinstance(in_dshape.measure[self.column], ct.Categorical):
             raise ValueError("input must be categorical")
 
     def out_dshape(self, input_dshape):
         cats = input_dshape.measure[self.column].categories
-        return dshape(Record([(c, ct.int32) for c in cats]))
+        measure = ct.CType.from_numpy_dtype(np.dtype(self.dtype))
+        return dshape(Record([(c, measure) for c in cats]))
 
     @property
     def inputs(self):
@@ -401,8 +596,9 @@ class count_cat(Reduction):
 
     def _build_create(self, out_dshape):
         n_cats = len(out_dshape.measure.fields)
+        dtype = self.dtype
         return lambda shape, array_module: array_module.zeros(
-            shape + (n_cats,), dtype='i4'
+            shape + (n_cats,), dtype=dtype
         )
 
     @staticmethod
@@ -417,7 +613,15 @@ class count_cat(Reduction):
 
     @staticmethod
     def _combine(aggs):
-        return aggs.sum(axis=0, dtype='i4')
+        return aggs.sum(axis=0, dtype=aggs.dtype)
+
+    @staticmethod
+    def _merge(aggs):
+        np.add(aggs[0], aggs[1], out=aggs[0])
+
+    @staticmethod
+    def _retract(aggs):
+        return aggs[0] - aggs[1]
 
     def _build_finalize(self, dshape):
         cats = list(dshape[self.column].categories)
@@ -425,13 +629,307 @@ class count_cat(Reduction):
         def finalize(bases, cuda=False, **kwargs):
             dims = kwargs['dims'] + [self.column]
 
-            coords = kwargs['coords']
+            coords = OrderedDict(kwargs['coords'])
             coords[self.column] = cats
             return xr.DataArray(bases[0], dims=dims, coords=coords)
         return finalize
 
 
-class mean(Reduction):
+class count_cat_topk(Reduction):
+    """Approximate counts of the most common categories in ``column``.
+
+    A sparse alternative to ``count_cat`` for columns with many categories.
+    Each bin keeps at most ``k`` (category, count) pairs plus an "other"
+    count, so memory scales with ``k`` rather than with the number of
+    categories. Counts are maintained with the Misra-Gries algorithm, which
+    is mergeable across chunks and partitions: every category with more
+    than ``1 / (k + 1)`` of the rows in a bin is kept, the count of each
+    kept category is underestimated by at most that fraction of the rows,
+    and the rest of the rows are counted as "other", so the total count of
+    each bin is exact.
+
+    The aggregate has dimensions ``(y, x, <column>_top<k>)``. Along the last
+    dimension, the first ``k`` entries are the counts of the kept categories
+    in decreasing order, and the last one is the "other" count. The codes of
+    the categories are given by the ``<column>_top<k>_codes`` coordinate
+    (``-1`` for the "other" and unused entries), named by the ``codes``
+    attribute, and the categories themselves by the ``categories``
+    attribute. ``transfer_functions.shade`` colors it like a
+    ``count_cat`` aggregate, with "other" rows mixed in as gray.
+
+    Parameters
+    ----------
+    column : str
+        Name of the column to aggregate over. Column data type must be
+        categorical. Missing values are skipped.
+    k : int, optional
+        Number of categories to keep per bin.
+    """
+    def __init__(self, column, k=8):
+        super(count_cat_topk, self).__init__(column)
+        if k < 1:
+            raise ValueError("k must be at least 1")
+        self.k = k
+
+    def _hashable_inputs(self):
+        return super(count_cat_topk, self)._hashable_inputs() + (self.k,)
+
+    def validate(self, in_dshape):
+        if not isinstance(in_dshape.measure[self.column], ct.Categorical):
+            raise ValueError("input must be categorical")
+
+    def out_dshape(self, input_dshape):
+        return dshape(ct.int32)
+
+    @property
+    def inputs(self):
+        return (category_codes(self.column),)
+
+    def _build_create(self, out_dshape):
+        k = self.k
+
+        def create(shape, array_module):
+            # Pairs of (category code, count) for k categories and "other"
+            agg = array_module.zeros(shape + (k + 1, 2), dtype='i4')
+            agg[..., 0] = -1
+            return agg
+        return create
+
+    def _build_append(self, dshape, schema, cuda=False):
+        if cuda:
+            raise ValueError("count_cat_topk is not yet supported on the GPU")
+        return self._append
+
+    @staticmethod
+    @ngjit
+    def _append(x, y, agg, field):
+        if field < 0:
+            return
+        k = agg.shape[2] - 1
+        free = -1
+        for i in range(k):
+            if agg[y, x, i, 0] == field:
+                agg[y, x, i, 1] += 1
+                return
+            if free < 0 and agg[y, x, i, 1] == 0:
+                free = i
+        if free >= 0:
+            agg[y, x, free, 0] = field
+            agg[y, x, free, 1] = 1
+        else:
+            # Discard the row along with one row of each kept category
+            for i in range(k):
+                agg[y, x, i, 1] -= 1
+            agg[y, x, k, 1] += k + 1
+
+    @staticmethod
+    def _combine(aggs):
+        acc = aggs[0].copy()
+        for agg in aggs[1:]:
+            _merge_topk(acc, agg)
+        return acc
+
+    @staticmethod
+    def _merge(aggs):
+        _merge_topk(aggs[0], aggs[1])
+
+    def _build_finalize(self, dshape):
+        cats = list(dshape[self.column].categories)
+        # Named by k too, so aggregates of different k can share a summary
+        rank = '{0}_top{1}'.format(self.column, self.k)
+        codes_name = rank + '_codes'
+
+        def finalize(bases, cuda=False, **kwargs):
+            agg = bases[0]
+            k = agg.shape[2] - 1
+            # Sort the kept categories by decreasing count
+            order = np.argsort(-agg[:, :, :k, 1], axis=2, kind='mergesort')
+            codes = np.take_along_axis(agg[:, :, :k, 0], order, axis=2)
+            counts = np.take_along_axis(agg[:, :, :k, 1], order, axis=2)
+            codes = np.where(counts > 0, codes, -1)
+            codes = np.concatenate([codes, agg[:, :, k:, 0]], axis=2)
+            counts = np.concatenate([counts, agg[:, :, k:, 1]], axis=2)
+
+            dims = kwargs['dims'] + [rank]
+            # Copied, as the coordinates are shared with any other reductions
+            # of a summary
+            coords = OrderedDict(kwargs['coords'])
+            coords[codes_name] = (dims, codes)
+            return xr.DataArray(counts, dims=dims, coords=coords,
+                                attrs=dict(categories=cats, codes=codes_name))
+        return finalize
+
+
+@ngjit
+def _merge_topk(acc, part):
+    """Merge the Misra-Gries summaries of ``part`` into ``acc`` in place"""
+    height, width, k = acc.shape[0], acc.shape[1], acc.shape[2] - 1
+    codes = np.empty(2 * k, dtype=np.int32)
+    counts = np.empty(2 * k, dtype=np.int32)
+    for y in range(height):
+        for x in range(width):
+            n = 0
+            for i in range(k):
+                if acc[y, x, i, 1] > 0:
+                    codes[n] = acc[y, x, i, 0]
+                    counts[n] = acc[y, x, i, 1]
+                    n += 1
+            for i in range(k):
+                count = part[y, x, i, 1]
+                if count > 0:
+                    code = part[y, x, i, 0]
+                    j = 0
+                    while j < n and codes[j] != code:
+                        j += 1
+                    if j == n:
+                        codes[n] = code
+                        counts[n] = 0
+                        n += 1
+                    counts[j] += count
+            other = acc[y, x, k, 1] + part[y, x, k, 1]
+            if n > k:
+                # Subtract the (k + 1)th largest count from all counts
+                cut = np.sort(counts[:n])[n - k - 1]
+                for j in range(n):
+                    removed = counts[j] if counts[j] < cut else cut
+                    counts[j] -= removed
+                    other += removed
+            m = 0
+            for j in range(n):
+                if counts[j] > 0:
+                    acc[y, x, m, 0] = codes[j]
+                    acc[y, x, m, 1] = counts[j]
+                    m += 1
+            for i in range(m, k):
+                acc[y, x, i, 0] = -1
+                acc[y, x, i, 1] = 0
+            acc[y, x, k, 1] = other
+
+
+class by(Reduction):
+    """Apply ``reduction`` separately to the elements of each category.
+
+    Generalizes ``count_cat`` to any reduction: the resulting aggregate has
+    an outer dimension along the categories of ``column``, holding the
+    result of ``reduction`` over the elements of each category. All
+    categories are aggregated in a single pass over the data.
+
+    Parameters
+    ----------
+    column : str
+        Name of the categorical column to group by. Elements with missing
+        categories are skipped.
+    reduction : Reduction
+        The reduction to apply per category, e.g. ``sum('revenue')`` or
+        ``mean('latency')``. Categorical reductions cannot be nested.
+
+    Examples
+    --------
+    >>> import datashader as ds                          # doctest: +SKIP
+    >>> agg = cvs.points(df, 'x', 'y', ds.by('region', ds.sum('revenue')))  # doctest: +SKIP
+    """
+    def __init__(self, column, reduction):
+        if isinstance(reduction, (count_cat, count_cat_topk, by)):
+            raise ValueError("{0} cannot be applied by category"
+                             .format(type(reduction).__name__))
+        self.column = column
+        self.reduction = reduction
+
+    def _hashable_inputs(self):
+        return (self.column, self.reduction)
+
+    @property
+    def inputs(self):
+        return (category_codes(self.column),) + tuple(self.reduction.inputs)
+
+    def validate(self, in_dshape):
+        if not isinstance(in_dshape.measure[self.column], ct.Categorical):
+            raise ValueError("input must be categorical")
+        self.reduction.validate(in_dshape)
+
+    def out_dshape(self, input_dshape):
+        cats = input_dshape.measure[self.column].categories
+        measure = self.reduction.out_dshape(input_dshape).measure
+        return dshape(Record([(c, measure) for c in cats]))
+
+    @staticmethod
+    def _reduction_dshape(out_dshape):
+        """The output datashape of the reduction for a single category"""
+        return dshape(out_dshape.measure.types[0])
+
+    def _build_bases(self, cuda=False):
+        return tuple(by(self.column, b)
+                     for b in self.reduction._build_bases(cuda))
+
+    def _build_temps(self, cuda=False):
+        return tuple(by(self.column, t)
+                     for t in self.reduction._build_temps(cuda))
+
+    def _build_create(self, out_dshape):
+        n_cats = len(out_dshape.measure.fields)
+        create = self.reduction._build_create(
+            self._reduction_dshape(out_dshape))
+        return lambda shape, array_module: create(
+            shape + (n_cats,), array_module
+        )
+
+    def _build_append(self, dshape, schema, cuda=False):
+        if cuda:
+            raise ValueError("by is not yet supported on the GPU")
+        append = self.reduction._build_append(
+            self._reduction_dshape(dshape), schema, cuda)
+        return _by_append(append, len(self.reduction.inputs),
+                          len(self.reduction._build_temps(cuda)))
+
+    def _build_combine(self, dshape):
+        return self.reduction._build_combine(self._reduction_dshape(dshape))
+
+    def _build_merge(self, dshape):
+        return self.reduction._build_merge(self._reduction_dshape(dshape))
+
+    def _build_retract(self, dshape):
+        return self.reduction._build_retract(self._reduction_dshape(dshape))
+
+    def _build_finalize(self, dshape):
+        cats = list(dshape[self.column].categories)
+        finalize = self.reduction._build_finalize(dshape)
+        column = self.column
+
+        def by_finalize(bases, cuda=False, **kwargs):
+            kwargs['dims'] = kwargs['dims'] + [column]
+            kwargs['coords'] = OrderedDict(kwargs['coords'])
+            kwargs['coords'][column] = cats
+            return finalize(bases, cuda, **kwargs)
+        return by_finalize
+
+
+@memoize
+def _by_append(append, n_fields, n_temps):
+    """Build an append function applying ``append`` to the slice of the
+    aggregate (and of any temps) for the category of each element"""
+    fields = ['field{0}'.format(i) for i in range(n_fields)]
+    temps = ['temp{0}'.format(i) for i in range(n_temps)]
+    signature = ['x', 'y', 'agg', 'cat'] + fields + temps
+    args = ['x', 'y', 'agg[:, :, cat]'] + fields + [t + '[cat]' for t in temps]
+    code = ('def by_append({0}):\n'
+            '    if cat >= 0:\n'
+            '        append({1})\n').format(', '.join(signature),
+                                           ', '.join(args))
+    namespace = {'append': append}
+    _exec(code, namespace)
+    return ngjit(namespace['by_append'])
+
+
+class _FloatingStatistic(Reduction):
+    """Base class for statistics computed from floating-point bases."""
+    _dshape = dshape(Option(ct.float64))
+
+    def __init__(self, column=None, dtype='float64'):
+        super(_FloatingStatistic, self).__init__(column)
+        self.dtype = _accumulator_dtype(dtype, 'f', type(self).__name__)
+
+
+class mean(_FloatingStatistic):
     """Mean of all elements in ``column``.
 
     Parameters
@@ -439,21 +937,23 @@ class mean(Reduction):
     column : str
         Name of the column to aggregate over. Column data type must be numeric.
         ``NaN`` values in the column are skipped.
+    dtype : str or numpy.dtype, optional
+        Floating-point dtype of the accumulated arrays, ``float64`` by
+        default. ``float32`` halves their memory at the cost of precision.
     """
-    _dshape = dshape(Option(ct.float64))
-
     def _build_bases(self, cuda=False):
-        return (_sum_zero(self.column), count(self.column))
+        return (_sum_zero(self.column, self.dtype), count(self.column))
 
     @staticmethod
     def _finalize(bases, cuda=False, **kwargs):
         sums, counts = bases
         with np.errstate(divide='ignore', invalid='ignore'):
-            x = np.where(counts > 0, sums/counts, np.nan)
+            x = np.where(counts > 0, sums/counts, np.nan).astype(
+                sums.dtype, copy=False)
         return xr.DataArray(x, **kwargs)
 
 
-class var(Reduction):
+class var(_FloatingStatistic):
     """Variance of all elements in ``column``.
 
     Parameters
@@ -461,21 +961,24 @@ class var(Reduction):
     column : str
         Name of the column to aggregate over. Column data type must be numeric.
         ``NaN`` values in the column are skipped.
+    dtype : str or numpy.dtype, optional
+        Floating-point dtype of the accumulated arrays, ``float64`` by
+        default. ``float32`` halves their memory at the cost of precision.
     """
-    _dshape = dshape(Option(ct.float64))
-
     def _build_bases(self, cuda=False):
-        return (_sum_zero(self.column), count(self.column), m2(self.column))
+        return (_sum_zero(self.column, self.dtype), count(self.column),
+                m2(self.column, self.dtype))
 
     @staticmethod
     def _finalize(bases, cuda=False, **kwargs):
         sums, counts, m2s = bases
         with np.errstate(divide='ignore', invalid='ignore'):
-            x = np.where(counts > 0, m2s / counts, np.nan)
+            x = np.where(counts > 0, m2s / counts, np.nan).astype(
+                m2s.dtype, copy=False)
         return xr.DataArray(x, **kwargs)
 
 
-class std(Reduction):
+class std(_FloatingStatistic):
     """Standard Deviation of all elements in ``column``.
 
     Parameters
@@ -483,61 +986,494 @@ class std(Reduction):
     column : str
         Name of the column to aggregate over. Column data type must be numeric.
         ``NaN`` values in the column are skipped.
+    dtype : str or numpy.dtype, optional
+        Floating-point dtype of the accumulated arrays, ``float64`` by
+        default. ``float32`` halves their memory at the cost of precision.
     """
-    _dshape = dshape(Option(ct.float64))
-
     def _build_bases(self, cuda=False):
-        return (_sum_zero(self.column), count(self.column), m2(self.column))
+        return (_sum_zero(self.column, self.dtype), count(self.column),
+                m2(self.column, self.dtype))
 
     @staticmethod
     def _finalize(bases, cuda=False, **kwargs):
         sums, counts, m2s = bases
         with np.errstate(divide='ignore', invalid='ignore'):
-            x = np.where(counts > 0, np.sqrt(m2s / counts), np.nan)
+            x = np.where(counts > 0, np.sqrt(m2s / counts), np.nan).astype(
+                m2s.dtype, copy=False)
         return xr.DataArray(x, **kwargs)
 
 
-class first(Reduction):
-    """First value encountered in ``column``.
+class _histogram(Reduction):
+    """Per-bin histogram of the elements in ``column``, with ``bins`` equal
+    width bins spanning ``range``. Elements outside ``range`` are counted
+    in the outermost bins, and ``NaN`` elements are skipped."""
+    def __init__(self, column, bins, range):
+        super(_histogram, self).__init__(column)
+        self.bins = bins
+        self.range = range
 
-    Useful for categorical data where an actual value must always be returned,
-    not an average or other numerical calculation.
+    def _hashable_inputs(self):
+        return super(_histogram, self)._hashable_inputs() + (self.bins,
+                                                             self.range)
 
-    Currently only supported for rasters, externally to this class.
+    def out_dshape(self, in_dshape):
+        return dshape(ct.int32)
+
+    def _build_create(self, out_dshape):
+        bins = self.bins
+        return lambda shape, array_module: array_module.zeros(
+            shape + (bins,), dtype='i4'
+        )
+
+    def _build_append(self, dshape, schema, cuda=False):
+        if cuda:
+            raise ValueError("quantile is not yet supported on the GPU")
+        return _histogram_append(self.bins, *self.range)
+
+    @staticmethod
+    def _combine(aggs):
+        return aggs.sum(axis=0, dtype=aggs.dtype)
+
+    @staticmethod
+    def _merge(aggs):
+        np.add(aggs[0], aggs[1], out=aggs[0])
+
+    @staticmethod
+    def _retract(aggs):
+        return aggs[0] - aggs[1]
+
+
+@memoize
+def _histogram_append(bins, lo, hi):
+    """Build an append function counting elements into ``bins`` equal width
+    bins spanning ``(lo, hi)``"""
+    scale = bins / (hi - lo)
+    last = bins - 1
+
+    @ngjit
+    def append(x, y, agg, field):
+        if not isnull(field):
+            # Compare before converting to an integer, to handle infinities
+            i = (field - lo) * scale
+            if i < 0:
+                agg[y, x, 0] += 1
+            elif i >= last:
+                agg[y, x, last] += 1
+            else:
+                agg[y, x, int(i)] += 1
+    return append
+
+
+class quantile(Reduction):
+    """Approximate ``q``-th quantile of all elements in ``column``.
+
+    Elements are counted into a histogram per bin, with ``bins`` equal width
+    bins spanning ``range``, so memory is fixed regardless of the number of
+    elements, and histograms are merged exactly across chunks and
+    partitions. The quantile is interpolated linearly within the histogram
+    bin containing it, so it is accurate to within
+    ``(range[1] - range[0]) / bins``, provided that the elements are within
+    ``range``: elements outside of it are counted in the outermost bins.
+
+    Quantiles of the same ``column``, ``range`` and ``bins`` in a
+    ``summary`` share a single histogram.
 
     Parameters
     ----------
     column : str
-        Name of the column to aggregate over. If the data type is floating point,
+        Name of the column to aggregate over. Column data type must be numeric.
         ``NaN`` values in the column are skipped.
+    q : float
+        Quantile to compute, between 0 and 1.
+    range : tuple of float
+        The ``(lower, upper)`` range of the histograms.
+    bins : int, optional
+        Number of histogram bins, trading memory for accuracy.
+
+    Examples
+    --------
+    >>> import datashader as ds                          # doctest: +SKIP
+    >>> agg = cvs.points(df, 'x', 'y', ds.summary(  # doctest: +SKIP
+    ...     p50=ds.quantile('latency', 0.5, range=(0, 2000)),
+    ...     p99=ds.quantile('latency', 0.99, range=(0, 2000))))
     """
     _dshape = dshape(Option(ct.float64))
 
+    def __init__(self, column, q, range, bins=256):
+        super(quantile, self).__init__(column)
+        if not 0 <= q <= 1:
+            raise ValueError("q must be between 0 and 1, got {0}".format(q))
+        if bins < 1:
+            raise ValueError("bins must be at least 1")
+        lo, hi = map(float, range)
+        if not (np.isfinite(lo) and np.isfinite(hi) and lo < hi):
+            raise ValueError("range must be a finite, increasing pair of "
+                             "values, got {0}".format(range))
+        self.q = q
+        self.range = (lo, hi)
+        self.bins = bins
+
+    def _hashable_inputs(self):
+        return super(quantile, self)._hashable_inputs() + (self.q, self.range,
+                                                           self.bins)
+
+    def _build_bases(self, cuda=False):
+        return (_histogram(self.column, self.bins, self.range),)
+
+    def _build_finalize(self, dshape):
+        q, (lo, hi) = self.q, self.range
+        width = (hi - lo) / self.bins
+
+        def finalize(bases, cuda=False, **kwargs):
+            counts = bases[0]
+            cumulative = counts.cumsum(axis=-1)
+            n = cumulative[..., -1:]
+            # Rank of the quantile, of at least half an element so q = 0
+            # falls within the first nonempty bin
+            rank = np.maximum(q * n, 0.5)
+            i = np.minimum((cumulative < rank).sum(axis=-1, keepdims=True),
+                           counts.shape[-1] - 1)
+            count_i = np.take_along_axis(counts, i, axis=-1)
+            below = np.take_along_axis(cumulative, i, axis=-1) - count_i
+            with np.errstate(divide='ignore', invalid='ignore'):
+                frac = np.clip((rank - below) / count_i, 0, 1)
+                x = np.where(n > 0, lo + (i + frac) * width, np.nan)
+            return xr.DataArray(x[..., 0], **kwargs)
+        return finalize
+
+
+class median(quantile):
+    """Approximate median of all elements in ``column``.
+
+    Shorthand for ``quantile(column, 0.5, range, bins)``; see ``quantile``
+    for the accuracy of the approximation.
+
+    Parameters
+    ----------
+    column : str
+        Name of the column to aggregate over. Column data type must be numeric.
+        ``NaN`` values in the column are skipped.
+    range : tuple of float
+        The ``(lower, upper)`` range of the histograms.
+    bins : int, optional
+        Number of histogram bins, trading memory for accuracy.
+    """
+    def __init__(self, column, range, bins=256):
+        super(median, self).__init__(column, 0.5, range, bins)
+
+
+class count_distinct(Reduction):
+    """Approximate number of distinct values in ``column``.
+
+    Values are counted with a HyperLogLog sketch per bin, holding
+    ``2**precision`` one-byte registers, so memory is fixed regardless of the
+    number of values. Sketches are merged exactly (by taking the maximum of
+    each register) across chunks and partitions. The relative standard
+    error of the counts is about ``1.04 / sqrt(2**precision)``, and small
+    counts are estimated by linear counting, which is nearly exact.
+
+    Values are identified by their hash, so equal values in different
+    partitions are counted once.
+
+    Parameters
+    ----------
+    column : str
+        Name of the column to aggregate over, of any data type. Missing
+        values are skipped.
+    precision : int, optional
+        Base 2 logarithm of the number of registers per bin, between 4 and
+        16, trading memory for accuracy.
+    """
+    _dshape = dshape(ct.float64)
+
+    def __init__(self, column, precision=8):
+        super(count_distinct, self).__init__(column)
+        if not 4 <= precision <= 16:
+            raise ValueError("precision must be between 4 and 16, got {0}"
+                             .format(precision))
+        self.precision = precision
+
+    def _hashable_inputs(self):
+        return super(count_distinct, self)._hashable_inputs() + (
+            self.precision,)
+
+    def validate(self, in_dshape):
+        if not self.column in in_dshape.dict:
+            raise ValueError("specified column not found")
+
+    @property
+    def inputs(self):
+        return (hll_codes(self.column, self.precision),)
+
+    def _build_create(self, out_dshape):
+        m = 2**self.precision
+        return lambda shape, array_module: array_module.zeros(
+            shape + (m,), dtype='u1'
+        )
+
+    def _build_append(self, dshape, schema, cuda=False):
+        if cuda:
+            raise ValueError("count_distinct is not yet supported on the GPU")
+        return self._append
+
     @staticmethod
-    def _append(x, y, agg):
-        raise NotImplementedError("first is currently implemented only for rasters")
+    @ngjit
+    def _append(x, y, agg, field):
+        if field >= 0:
+            m = agg.shape[2]
+            register, rank = field % m, field // m
+            if agg[y, x, register] < rank:
+                agg[y, x, register] = rank
+
+    @staticmethod
+    def _combine(aggs):
+        return aggs.max(axis=0)
+
+    @staticmethod
+    def _merge(aggs):
+        np.maximum(aggs[0], aggs[1], out=aggs[0])
+
+    @staticmethod
+    def _finalize(bases, cuda=False, **kwargs):
+        registers = bases[0]
+        m = registers.shape[-1]
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213/(1 + 1.079/m))
+        sums = np.empty(registers.shape[:-1], dtype='f8')
+        zeros = np.empty(registers.shape[:-1], dtype='i8')
+        _hll_sums(registers, _hll_powers, sums, zeros)
+        estimate = alpha * m**2 / sums
+        # Linear counting for small cardinalities
+        with np.errstate(divide='ignore'):
+            linear = m * np.log(m / zeros)
+        x = np.where((estimate <= 2.5 * m) & (zeros > 0), linear, estimate)
+        return xr.DataArray(x, **kwargs)
+
+
+
+#: ``2**-r`` for every value ``r`` of a one-byte register
+_hll_powers = np.ldexp(1.0, -np.arange(256))
+
+
+@ngjit
+def _hll_sums(registers, powers, sums, zeros):
+    """Sum ``2**-r`` over the registers ``r`` of each bin into ``sums``, and
+    count the zero registers into ``zeros``, without any temporary of the
+    size of ``registers``"""
+    height, width, m = registers.shape
+    for y in range(height):
+        for x in range(width):
+            total = 0.0
+            n = 0
+            for i in range(m):
+                r = registers[y, x, i]
+                total += powers[r]
+                if r == 0:
+                    n += 1
+            sums[y, x] = total
+            zeros[y, x] = n
+
+
+class _row_select(Reduction):
+    """Value of ``column`` and index of the row selected in each bin.
+
+    Depending on ``mode``, the row with the ``'min'`` or ``'max'`` value of
+    ``column`` (ties going to the first such row), or the ``'first'`` or
+    ``'last'`` row (with a non-null value of ``column``, if given). Bins
+    hold ``(value, row)`` pairs, both ``NaN`` in empty bins, so rows are
+    numbered exactly up to ``2**53``.
+    """
+    _dshape = dshape(Option(ct.float64))
+
+    def __init__(self, column, mode):
+        super(_row_select, self).__init__(column)
+        self.mode = mode
+
+    def _hashable_inputs(self):
+        return super(_row_select, self)._hashable_inputs() + (self.mode,)
+
+    @property
+    def inputs(self):
+        if self.column is None:
+            # The row index stands in for the value
+            return (row_index(), row_index())
+        return (extract(self.column), row_index())
 
     @staticmethod
     def _create(shape, array_module):
-        raise NotImplementedError("first is currently implemented only for rasters")
+        return array_module.full(shape + (2,), np.nan, dtype='f8')
+
+    def _build_append(self, dshape, schema, cuda=False):
+        if cuda:
+            raise ValueError("Row index reductions are not yet supported on "
+                             "the GPU")
+        return getattr(self, '_append_' + self.mode)
 
     @staticmethod
-    def _combine(aggs):
-        raise NotImplementedError("first is currently implemented only for rasters")
+    @ngjit
+    def _append_min(x, y, agg, field, row):
+        if not isnull(field) and (isnull(agg[y, x, 1]) or
+                                  field < agg[y, x, 0] or
+                                  (field == agg[y, x, 0] and row < agg[y, x, 1])):
+            agg[y, x, 0] = field
+            agg[y, x, 1] = row
 
     @staticmethod
-    def _finalize(bases, **kwargs):
-        raise NotImplementedError("first is currently implemented only for rasters")
+    @ngjit
+    def _append_max(x, y, agg, field, row):
+        if not isnull(field) and (isnull(agg[y, x, 1]) or
+                                  field > agg[y, x, 0] or
+                                  (field == agg[y, x, 0] and row < agg[y, x, 1])):
+            agg[y, x, 0] = field
+            agg[y, x, 1] = row
 
+    @staticmethod
+    @ngjit
+    def _append_first(x, y, agg, field, row):
+        if not isnull(field) and (isnull(agg[y, x, 1]) or row < agg[y, x, 1]):
+            agg[y, x, 0] = field
+            agg[y, x, 1] = row
 
+    @staticmethod
+    @ngjit
+    def _append_last(x, y, agg, field, row):
+        if not isnull(field) and (isnull(agg[y, x, 1]) or row > agg[y, x, 1]):
+            agg[y, x, 0] = field
+            agg[y, x, 1] = row
+
+    def _build_merge(self, dshape):
+        mode = self.mode
+
+        def merge(aggs):
+            acc, part = aggs
+            value, row = part[..., 0], part[..., 1]
+            acc_value, acc_row = acc[..., 0], acc[..., 1]
+            with np.errstate(invalid='ignore'):
+                if mode == 'min':
+                    take = (value < acc_value) | ((value == acc_value) &
+                                                  (row < acc_row))
+                elif mode == 'max':
+                    take = (value > acc_value) | ((value == acc_value) &
+                                                  (row < acc_row))
+                elif mode == 'first':
+                    take = row < acc_row
+                else:
+                    take = row > acc_row
+            take |= np.isnan(acc_row) & ~np.isnan(row)
+            acc[take] = part[take]
+        return merge
+
+    def _build_combine(self, dshape):
+        merge = self._build_merge(dshape)
+
+        def combine(aggs):
+            acc = aggs[0].copy()
+            for agg in aggs[1:]:
+                merge((acc, agg))
+            return acc
+        return combine
+
+
+class _RowSelection(Reduction):
+    """Base class for reductions of the row selected in each bin."""
+    # Mode of the ``_row_select`` base
+    _mode = None
+
+    def validate(self, in_dshape):
+        if self.column is not None:
+            super(_RowSelection, self).validate(in_dshape)
+
+    @property
+    def inputs(self):
+        return self._build_bases()[0].inputs
+
+    def _build_bases(self, cuda=False):
+        return (_row_select(self.column, self._mode),)
 
-class last(Reduction):
-    """Last value encountered in ``column``.
+
+class _RowIndexReduction(_RowSelection):
+    """Base class for reductions returning the index of a row in each bin."""
+    _dshape = dshape(ct.int64)
+
+    @staticmethod
+    def _finalize(bases, cuda=False, **kwargs):
+        rows = bases[0][..., 1]
+        return xr.DataArray(np.where(np.isnan(rows), -1, rows).astype('i8'),
+                            **kwargs)
+
+
+class argmin(_RowIndexReduction):
+    """Index of the row with the minimum value of ``column`` in each bin.
+
+    Rows are numbered by their position in the source, across the
+    partitions of dask DataFrames, so the rows can be looked up in the
+    source (e.g. with ``df.iloc``). Ties go to the first row. Empty bins
+    are ``-1``.
+
+    Parameters
+    ----------
+    column : str
+        Name of the column to aggregate over. Column data type must be numeric.
+        ``NaN`` values in the column are skipped.
+    """
+    _mode = 'min'
+
+
+class argmax(_RowIndexReduction):
+    """Index of the row with the maximum value of ``column`` in each bin.
+
+    Rows are numbered by their position in the source, across the
+    partitions of dask DataFrames, so the rows can be looked up in the
+    source (e.g. with ``df.iloc``). Ties go to the first row. Empty bins
+    are ``-1``.
+
+    Parameters
+    ----------
+    column : str
+        Name of the column to aggregate over. Column data type must be numeric.
+        ``NaN`` values in the column are skipped.
+    """
+    _mode = 'max'
+
+
+class first_index(_RowIndexReduction):
+    """Index of the first row in each bin.
+
+    Rows are numbered by their position in the source, across the
+    partitions of dask DataFrames. Empty bins are ``-1``.
+
+    Parameters
+    ----------
+    column : str, optional
+        Name of a numeric column. If given, only the rows with non-``NaN``
+        values in the column are considered.
+    """
+    _mode = 'first'
+
+
+class last_index(_RowIndexReduction):
+    """Index of the last row in each bin.
+
+    Rows are numbered by their position in the source, across the
+    partitions of dask DataFrames. Empty bins are ``-1``.
+
+    Parameters
+    ----------
+    column : str, optional
+        Name of a numeric column. If given, only the rows with non-``NaN``
+        values in the column are considered.
+    """
+    _mode = 'last'
+
+
+class first(_RowSelection):
+    """First value encountered in ``column``.
 
     Useful for categorical data where an actual value must always be returned,
     not an average or other numerical calculation.
 
-    Currently only supported for rasters, externally to this class.
+    For rasters, the first value in each block of resampled cells. Otherwise
+    the value in the first row of the source (across the partitions of dask
+    DataFrames) in each bin, or ``NaN`` for empty bins.
 
     Parameters
     ----------
@@ -546,23 +1482,40 @@ class last(Reduction):
         ``NaN`` values in the column are skipped.
     """
     _dshape = dshape(Option(ct.float64))
+    _mode = 'first'
 
     @staticmethod
-    def _append(x, y, agg):
-        raise NotImplementedError("last is currently implemented only for rasters")
+    def _finalize(bases, cuda=False, **kwargs):
+        return xr.DataArray(bases[0][..., 0], **kwargs)
 
-    @staticmethod
-    def _create(shape, array_module):
-        raise NotImplementedError("last is currently implemented only for rasters")
 
-    @staticmethod
-    def _combine(aggs):
-        raise NotImplementedError("last is currently implemented only for rasters")
+class last(first):
+    """Last value encountered in ``column``.
 
-    @staticmethod
-    def _finalize(bases, **kwargs):
-        raise NotImplementedError("last is currently implemented only for rasters")
+    Useful for categorical data where an actual value must always be returned,
+    not an average or other numerical calculation.
 
+    For rasters, the last value in each block of resampled cells. Otherwise
+    the value in the last row of the source (across the partitions of dask
+    DataFrames) in each bin, or ``NaN`` for empty bins.
+
+    Parameters
+    ----------
+    column : str
+        Name of the column to aggregate over. If the data type is floating point,
+        ``NaN`` values in the column are skipped.
+    """
+    _mode = 'last'
+
+
+def _uses_row_index(agg):
+    """Whether the reduction(s) ``agg`` number the rows of the source"""
+    # (``any`` is shadowed by the reduction of that name)
+    for r in getattr(agg, 'values', (agg,)):
+        for b in r._build_bases():
+            if [i for i in b.inputs if isinstance(i, row_index)]:
+                return True
+    return False
 
 
 class mode(Reduction):
@@ -601,7 +1554,6 @@ class mode(Reduction):
         raise NotImplementedError("mode is currently implemented only for rasters")
 
 
-
 class summary(Expr):
     """A collection of named reductions.
 
@@ -637,9 +1589,10 @@ class summary(Expr):
         return tuple(unique(concat(v.inputs for v in self.values)))
 
 
-
 __all__ = list(set([_k for _k,_v in locals().items()
                     if isinstance(_v,type) and (issubclass(_v,Reduction) or _v is summary)
                     and _v not in [Reduction, OptionalFieldReduction,
-                                   FloatingReduction, m2]]))
+                                   FloatingReduction, _FloatingStatistic, m2,
+                                   _histogram, _row_select, _RowSelection,
+                                   _RowIndexReduction]]))
 
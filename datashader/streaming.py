@@ -0,0 +1,263 @@
+from __future__ import absolute_import, division
+
+import time
+from collections import OrderedDict, deque
+
+import pandas as pd
+
+from .compiler import compile_components, compile_retract
+from .core import _cols_to_keep
+from .data_libraries.pandas import _connected_glyphs
+from .kernel_cache import cache_kernels
+from .utils import dshape_from_pandas, with_row_offset
+from . import reductions as rd
+
+
+class StreamingAggregator(object):
+    """Incrementally aggregate batches of rows onto a fixed canvas.
+
+    Keeps the un-finalized base arrays of the aggregation between batches,
+    so appending a batch costs time proportional to the batch rather than
+    to all the rows seen so far. The finalized aggregate is produced on
+    demand by ``finalize``. Row index reductions like ``argmin`` number the
+    rows in the order they were appended since the last ``reset``.
+
+    Parameters
+    ----------
+    canvas : Canvas
+        Canvas to aggregate onto. Both ``x_range`` and ``y_range`` must be
+        set, since the bin edges cannot change between batches.
+    glyph : Glyph
+        The glyph to bin by, e.g. ``Point('x', 'y')`` or
+        ``LineAxis0('x', 'y')``. Lines along axis 0 are connected across
+        consecutive batches.
+    agg : Reduction, optional
+        The reduction to compute per-pixel. Default is ``count()``.
+
+    Examples
+    --------
+    >>> import datashader as ds                          # doctest: +SKIP
+    >>> cvs = ds.Canvas(x_range=(0, 1), y_range=(0, 1))  # doctest: +SKIP
+    >>> stream = ds.StreamingAggregator(cvs, ds.Point('x', 'y'), ds.mean('v'))  # doctest: +SKIP
+    >>> for batch in batches:  # doctest: +SKIP
+    ...     stream.append(batch)
+    ...     agg = stream.finalize()
+    """
+    def __init__(self, canvas, glyph, agg=None):
+        if canvas.x_range is None or canvas.y_range is None:
+            raise ValueError("StreamingAggregator requires a Canvas with "
+                             "both x_range and y_range set")
+        canvas.validate()
+        self.canvas = canvas
+        self.glyph = glyph
+        self.agg = rd.count() if agg is None else agg
+
+        width, height = canvas.plot_width, canvas.plot_height
+        x_st = canvas.x_axis.compute_scale_and_translate(canvas.x_range, width)
+        y_st = canvas.y_axis.compute_scale_and_translate(canvas.y_range, height)
+        self._shape = (height, width)
+        self._st = x_st + y_st
+        self._bounds = canvas.x_range + canvas.y_range
+        self._coords = OrderedDict([
+            (glyph.x_label, canvas.x_axis.compute_index(x_st, width)),
+            (glyph.y_label, canvas.y_axis.compute_index(y_st, height))])
+        self.reset()
+
+    def reset(self):
+        """Discard all the rows aggregated so far."""
+        self._schema = None
+        self._bases = None
+        self._last_row = None
+        self.nrows = 0
+        # Position of the next row, for row index reductions
+        self._row_offset = 0
+
+    def append(self, df):
+        """Aggregate the rows of the pandas DataFrame ``df``."""
+        df = self._prepare(df)
+        if len(df) == 0:
+            return
+        self._extend_batch(self._bases, df)
+
+    def _prepare(self, df):
+        """Validate a batch and trim it to the needed columns"""
+        if not isinstance(df, pd.DataFrame):
+            raise TypeError("{0} only supports pandas DataFrame batches"
+                            .format(type(self).__name__))
+        if len(df) == 0:
+            return df
+        df = df[_cols_to_keep(df.columns, self.glyph, self.agg)]
+        schema = dshape_from_pandas(df).measure
+        if self._schema is None:
+            self._initialize(schema)
+        elif schema != self._schema:
+            raise ValueError("Batch schema differs from the schema of the "
+                             "first batch:\n{0}\n!=\n{1}".format(
+                                 schema, self._schema))
+        return df
+
+    def _extend_batch(self, bases, df):
+        if self._row_index:
+            df = with_row_offset(df, self._row_offset)
+        if self._connected:
+            if self._last_row is None:
+                self._extend(bases, df, self._st, self._bounds)
+            else:
+                batch = pd.concat([self._last_row, df])
+                if self._row_index:
+                    batch = with_row_offset(batch, self._row_offset - 1)
+                self._extend(bases, batch, self._st, self._bounds,
+                             plot_start=False)
+            self._last_row = df.iloc[-1:]
+        else:
+            self._extend(bases, df, self._st, self._bounds)
+        self.nrows += len(df)
+        self._row_offset += len(df)
+
+    def finalize(self):
+        """Return the aggregate of all the rows appended so far."""
+        if self._bases is None:
+            raise ValueError("No rows have been appended yet")
+        # Copy, since finalized aggregates may be views of the bases, which
+        # are updated in place by subsequent appends
+        return self._finalize_bases(tuple(b.copy() for b in self._bases))
+
+    def _finalize_bases(self, bases):
+        return self._finalize(bases, cuda=False,
+                              coords=OrderedDict(self._coords),
+                              dims=[self.glyph.y_label, self.glyph.x_label])
+
+    def _initialize(self, schema):
+        self.glyph.validate(schema)
+        self.agg.validate(schema)
+        self._create, info, append, self._combine, self._finalize = \
+            compile_components(self.agg, schema, self.glyph)
+        self._extend = cache_kernels(self.glyph._build_extend(
+            self.canvas.x_axis.mapper, self.canvas.y_axis.mapper,
+            info, append))
+        self._connected = isinstance(self.glyph, _connected_glyphs)
+        self._row_index = rd._uses_row_index(self.agg)
+        self._schema = schema
+        self._bases = self._create(self._shape)
+
+
+class _Bucket(object):
+    """Base arrays of the batches appended within one time bucket"""
+    def __init__(self, key, bases):
+        self.key = key
+        self.bases = bases
+        self.latest = None
+        self.nrows = 0
+
+
+class WindowedAggregator(StreamingAggregator):
+    """Aggregate of the rows appended within a sliding time window.
+
+    Each appended batch is stamped with a time, and its rows fall out of the
+    aggregate once they are older than ``window``. Batches are grouped into
+    time buckets, each holding the base arrays of its rows.
+
+    If every base reduction can be retracted (``count``, ``count_cat``,
+    ``mean``, ``var`` and ``std``), a running aggregate of the window is
+    kept and expired buckets are subtracted from it, so each update costs
+    a constant number of aggregate-sized operations. Otherwise (e.g. for
+    ``min``, ``max``, ``any`` or ``sum``, whose empty bins are ``NaN``)
+    ``finalize`` merges the buckets in the window with ``combine``.
+
+    Parameters
+    ----------
+    canvas : Canvas
+        Canvas to aggregate onto. Both ``x_range`` and ``y_range`` must be
+        set, since the bin edges cannot change between batches.
+    glyph : Glyph
+        The glyph to bin by.
+    agg : Reduction, optional
+        The reduction to compute per-pixel. Default is ``count()``.
+    window : float
+        Length of the window, in the units of the timestamps passed to
+        ``append`` (seconds by default).
+    resolution : float, optional
+        Width of the time buckets. Batches with timestamps in the same
+        bucket share their base arrays, bounding memory to
+        ``window / resolution`` aggregates, and expire together once the
+        latest of them is older than ``window``. By default every batch is
+        its own bucket, so rows expire exactly.
+    """
+    def __init__(self, canvas, glyph, agg=None, window=60, resolution=None):
+        self.window = window
+        self.resolution = resolution
+        super(WindowedAggregator, self).__init__(canvas, glyph, agg)
+
+    def reset(self):
+        """Discard all the rows aggregated so far."""
+        super(WindowedAggregator, self).reset()
+        self._buckets = deque()
+        # Running aggregate of all buckets but the last, when retractable
+        self._total = None
+
+    def append(self, df, timestamp=None):
+        """Aggregate the rows of the pandas DataFrame ``df``.
+
+        ``timestamp`` defaults to the current time, and must not decrease
+        between calls.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        df = self._prepare(df)
+        if len(df) > 0:
+            bucket = self._bucket(timestamp)
+            self._extend_batch(bucket.bases, df)
+            bucket.latest = timestamp
+            bucket.nrows += len(df)
+        self.expire(timestamp)
+
+    def expire(self, now=None):
+        """Remove the rows older than ``window`` relative to ``now``."""
+        now = time.time() if now is None else now
+        cutoff = now - self.window
+        buckets = self._buckets
+        while buckets and buckets[0].latest <= cutoff:
+            bucket = buckets.popleft()
+            self.nrows -= bucket.nrows
+            if self._retract is not None and buckets:
+                self._total = self._retract((self._total, bucket.bases))
+        if not buckets:
+            self._total = None
+
+    def finalize(self, now=None):
+        """Return the aggregate of the rows within the window.
+
+        If ``now`` is given, rows older than ``window`` relative to it are
+        expired first.
+        """
+        if self._schema is None:
+            raise ValueError("No rows have been appended yet")
+        if now is not None:
+            self.expire(now)
+        buckets = self._buckets
+        if not buckets:
+            bases = self._create(self._shape)
+        elif self._retract is not None and self._total is not None:
+            bases = self._combine([self._total, buckets[-1].bases])
+        else:
+            bases = self._combine([b.bases for b in buckets])
+        return self._finalize_bases(bases)
+
+    def _bucket(self, timestamp):
+        """The bucket to aggregate rows stamped ``timestamp`` into"""
+        buckets = self._buckets
+        key = None if self.resolution is None else timestamp // self.resolution
+        if buckets and key is not None and buckets[-1].key == key:
+            return buckets[-1]
+        if buckets and self._retract is not None:
+            last = buckets[-1].bases
+            self._total = (last if self._total is None else
+                           self._combine([self._total, last]))
+        bucket = _Bucket(key, self._create(self._shape))
+        buckets.append(bucket)
+        return bucket
+
+    def _initialize(self, schema):
+        super(WindowedAggregator, self)._initialize(schema)
+        # Rows are only aggregated into the bases of the buckets
+        self._bases = None
+        self._retract = compile_retract(self.agg, schema)
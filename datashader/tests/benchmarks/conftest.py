@@ -0,0 +1,232 @@
+"""Data and configuration of the benchmarks.
+
+The numbers of rows and the canvas sizes benchmarked are set by environment
+variables, and default to sizes small enough to run with the unit tests:
+
+``DATASHADER_BENCHMARK_ROWS``
+    Comma separated numbers of rows, e.g. ``1e5,1e6,1e7,1e8``.
+``DATASHADER_BENCHMARK_CANVAS``
+    Comma separated canvas sizes, e.g. ``300x300,1000x1000,3000x3000``.
+
+Benchmarks using the ``benchmark_memory`` fixture also record the peak
+memory allocated by a call, which is checked against a baseline with:
+
+``DATASHADER_BENCHMARK_MEMORY_BASELINE``
+    Path of a JSON file saved by ``--benchmark-save`` or
+    ``--benchmark-autosave``. Benchmarks fail if their peak memory exceeds
+    that recorded in the file by more than
+    ``DATASHADER_BENCHMARK_MEMORY_TOLERANCE`` (default ``0.1``, i.e. 10%).
+"""
+from __future__ import division
+
+import json
+import os
+from multiprocessing import cpu_count
+
+import numpy as np
+import pandas as pd
+import dask.dataframe as dd
+import pytest
+import xarray as xr
+
+import datashader.utils as du
+from datashader.datatypes import RaggedArray
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+def _env_list(name, default):
+    return [s.strip() for s in os.environ.get(name, default).split(',')
+            if s.strip()]
+
+
+rows_list = [int(float(s)) for s in
+             _env_list('DATASHADER_BENCHMARK_ROWS', '1e5')]
+canvas_sizes = [tuple(int(n) for n in s.lower().split('x')) for s in
+                _env_list('DATASHADER_BENCHMARK_CANVAS', '300x300,1000x1000')]
+
+#: Number of partitions of dask DataFrames
+npartitions = cpu_count()
+
+#: Number of vertices of each line of the wide (axis=1) DataFrames
+line_length = 10
+
+n_categories = 10
+
+
+@pytest.fixture(scope='module', params=rows_list,
+                ids=['rows={0:.0e}'.format(n) for n in rows_list])
+def rows(request):
+    return request.param
+
+
+@pytest.fixture(scope='module', params=canvas_sizes,
+                ids=['canvas={0}x{1}'.format(*s) for s in canvas_sizes])
+def canvas_size(request):
+    return request.param
+
+
+@pytest.fixture(scope='module', params=['pandas', 'dask'])
+def backend(request):
+    return request.param
+
+
+@pytest.fixture(scope='module', params=['numpy', 'dask'])
+def array_backend(request):
+    return request.param
+
+
+def to_backend(df, backend):
+    if backend == 'dask':
+        return dd.from_pandas(df, npartitions=npartitions)
+    return df
+
+
+@pytest.fixture(scope='module')
+def long_df(rows):
+    """Points and time series, one per row"""
+    rng = np.random.RandomState(0)
+    return pd.DataFrame({
+        'x': rng.normal(size=rows),
+        'y': rng.normal(size=rows),
+        't': np.arange(rows, dtype='f8'),
+        'y0': rng.normal(size=rows).cumsum(),
+        'y1': rng.normal(size=rows).cumsum(),
+        'z': rng.uniform(size=rows),
+        'i': rng.randint(0, 1000, rows),
+        'cat': pd.Categorical.from_codes(
+            rng.randint(0, n_categories, rows),
+            ['c{0}'.format(i) for i in range(n_categories)])})
+
+
+@pytest.fixture(scope='module')
+def long_source(long_df, backend):
+    return to_backend(long_df, backend)
+
+
+@pytest.fixture(scope='module')
+def wide_df(rows):
+    """Lines of ``line_length`` vertices, one per row, ``rows`` vertices
+    in total"""
+    rng = np.random.RandomState(0)
+    n = max(rows // line_length, 1)
+    xs = np.arange(line_length) + rng.uniform(size=(n, line_length))
+    ys = rng.normal(size=(n, line_length)).cumsum(axis=1)
+    return pd.DataFrame(
+        np.column_stack([xs, ys]),
+        columns=(['x{0}'.format(i) for i in range(line_length)] +
+                 ['y{0}'.format(i) for i in range(line_length)]))
+
+
+@pytest.fixture(scope='module')
+def wide_source(wide_df, backend):
+    return to_backend(wide_df, backend)
+
+
+@pytest.fixture(scope='module')
+def ragged_source(wide_df, backend):
+    """The lines of ``wide_df`` as ragged arrays ``x`` and ``y``, with
+    ``y_stack`` holding their ``y`` coordinates in reverse"""
+    starts = np.arange(len(wide_df), dtype='u8') * line_length
+    xs = ['x{0}'.format(i) for i in range(line_length)]
+    ys = ['y{0}'.format(i) for i in range(line_length)]
+    df = pd.DataFrame({
+        k: RaggedArray({'start_indices': starts,
+                        'flat_array': wide_df[columns].values.ravel()})
+        for k, columns in [('x', xs), ('y', ys), ('y_stack', ys[::-1])]})
+    return to_backend(df, backend)
+
+
+@pytest.fixture(scope='module')
+def trimesh_source(rows, backend):
+    """Vertices, triangles and mesh of a regular grid of about ``rows``
+    triangles"""
+    side = int(np.sqrt(rows / 2)) + 1
+    x, y = np.meshgrid(np.arange(side, dtype='f8'),
+                       np.arange(side, dtype='f8'))
+    verts = pd.DataFrame({'x': x.ravel(), 'y': y.ravel(),
+                          'z': np.random.RandomState(0).uniform(
+                              size=side * side)},
+                         columns=['x', 'y', 'z'])
+    index = np.arange(side * side).reshape(side, side)
+    a, b = index[:-1, :-1].ravel(), index[:-1, 1:].ravel()
+    c, d = index[1:, :-1].ravel(), index[1:, 1:].ravel()
+    tris = pd.DataFrame({'v0': np.r_[a, b], 'v1': np.r_[b, d],
+                         'v2': np.r_[c, c]}, columns=['v0', 'v1', 'v2'])
+    verts, tris = to_backend(verts, backend), to_backend(tris, backend)
+    return verts, tris, du.mesh(verts, tris)
+
+
+@pytest.fixture(scope='module')
+def grid(rows):
+    """Square grid of about ``rows`` values, with rectilinear coordinates
+    ``x`` and ``y`` and curvilinear coordinates ``qx`` and ``qy``"""
+    side = int(np.sqrt(rows))
+    y, x = np.meshgrid(np.arange(side, dtype='f8'),
+                       np.arange(side, dtype='f8'), indexing='ij')
+    return xr.DataArray(np.random.RandomState(0).uniform(size=(side, side)),
+                        dims=['y', 'x'],
+                        coords={'x': x[0], 'y': y[:, 0],
+                                'qx': (['y', 'x'], x + 0.1 * y),
+                                'qy': (['y', 'x'], y + 0.1 * x)},
+                        name='z')
+
+
+@pytest.fixture(scope='module')
+def grid_source(grid, array_backend):
+    if array_backend == 'dask':
+        return grid.chunk(max(len(grid) // int(np.sqrt(npartitions)), 1))
+    return grid
+
+
+def peak_memory(func, *args, **kwargs):
+    """Peak number of bytes allocated by a call to ``func``, or None if
+    ``tracemalloc`` is unavailable or already in use"""
+    if tracemalloc is None or tracemalloc.is_tracing():
+        return None
+    tracemalloc.start()
+    try:
+        func(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.fixture(scope='session')
+def memory_baseline():
+    """Mapping of benchmark names to the peak memory saved in the baseline"""
+    path = os.environ.get('DATASHADER_BENCHMARK_MEMORY_BASELINE')
+    if not path:
+        return {}
+    with open(path) as f:
+        saved = json.load(f)
+    return {b['fullname']: b['extra_info']['peak_memory']
+            for b in saved['benchmarks']
+            if 'peak_memory' in b.get('extra_info', {})}
+
+
+@pytest.fixture
+def benchmark_memory(benchmark, memory_baseline):
+    """Like ``benchmark``, also recording the peak memory allocated by a
+    call in ``extra_info['peak_memory']``, and failing if it exceeds that of
+    the baseline"""
+    tolerance = float(os.environ.get('DATASHADER_BENCHMARK_MEMORY_TOLERANCE',
+                                     0.1))
+
+    def run(func, *args, **kwargs):
+        result = benchmark(func, *args, **kwargs)
+        peak = peak_memory(func, *args, **kwargs)
+        if peak is None:
+            return result
+        benchmark.extra_info['peak_memory'] = peak
+        baseline = memory_baseline.get(benchmark.fullname)
+        if baseline and peak > baseline * (1 + tolerance):
+            pytest.fail("Peak memory of {0} increased by {1:.0%}, from {2} "
+                        "to {3} bytes".format(benchmark.fullname,
+                                              peak / baseline - 1,
+                                              baseline, peak))
+        return result
+    return run
@@ -28,3 +28,12 @@ def test_line(benchmark, time_series):
 def test_points(benchmark, time_series):
     cvs = ds.Canvas(plot_height=300, plot_width=900)
     benchmark(cvs.points, time_series, 'x', 'y')
+
+
+@pytest.mark.parametrize('glyph', ['points', 'line'])
+@pytest.mark.benchmark(group="canvas_size")
+def test_canvas_size(benchmark_memory, long_source, canvas_size, glyph):
+    width, height = canvas_size
+    cvs = ds.Canvas(plot_width=width, plot_height=height)
+    x, y = ('x', 'y') if glyph == 'points' else ('t', 'y0')
+    benchmark_memory(getattr(cvs, glyph), long_source, x, y, ds.count())
@@ -0,0 +1,83 @@
+import pytest
+
+import numpy as np
+
+import datashader as ds
+
+cvs = ds.Canvas(plot_width=900, plot_height=300)
+
+# Glyphs of DataFrames with a vertex per row
+axis0_glyphs = {
+    'Point': lambda df: cvs.points(df, 'x', 'y'),
+    'LineAxis0': lambda df: cvs.line(df, 't', 'y0'),
+    'LineAxis0Multi': lambda df: cvs.line(df, 't', ['y0', 'y1']),
+    'AreaToZeroAxis0': lambda df: cvs.area(df, 't', 'y0'),
+    'AreaToLineAxis0': lambda df: cvs.area(df, 't', 'y0', y_stack='y1'),
+    'AreaToZeroAxis0Multi': lambda df: cvs.area(df, 't', ['y0', 'y1']),
+    'AreaToLineAxis0Multi': lambda df: cvs.area(df, 't', ['y0', 'y1'],
+                                                y_stack=['y1', 'y0']),
+}
+
+# Glyphs of DataFrames with a line per row, given the x and y columns and
+# the constant coordinates of the vertices
+axis1_glyphs = {
+    'LinesAxis1': lambda df, xs, ys, v: cvs.line(df, xs, ys, axis=1),
+    'LinesAxis1XConstant': lambda df, xs, ys, v: cvs.line(df, v, ys, axis=1),
+    'LinesAxis1YConstant': lambda df, xs, ys, v: cvs.line(df, xs, v, axis=1),
+    'AreaToZeroAxis1': lambda df, xs, ys, v: cvs.area(df, xs, ys, axis=1),
+    'AreaToLineAxis1': lambda df, xs, ys, v: cvs.area(df, xs, ys,
+                                                      y_stack=ys[::-1],
+                                                      axis=1),
+    'AreaToZeroAxis1XConstant': lambda df, xs, ys, v: cvs.area(df, v, ys,
+                                                               axis=1),
+    'AreaToLineAxis1XConstant': lambda df, xs, ys, v: cvs.area(
+        df, v, ys, y_stack=ys[::-1], axis=1),
+    'AreaToZeroAxis1YConstant': lambda df, xs, ys, v: cvs.area(df, xs, v,
+                                                               axis=1),
+}
+
+ragged_glyphs = {
+    'LinesAxis1Ragged': lambda df: cvs.line(df, 'x', 'y', axis=1),
+    'AreaToZeroAxis1Ragged': lambda df: cvs.area(df, 'x', 'y', axis=1),
+    'AreaToLineAxis1Ragged': lambda df: cvs.area(df, 'x', 'y',
+                                                 y_stack='y_stack', axis=1),
+}
+
+grid_glyphs = {
+    'QuadMeshRectilinear': lambda da: cvs.quadmesh(da, 'x', 'y'),
+    'QuadMeshCurvialinear': lambda da: cvs.quadmesh(da, 'qx', 'qy'),
+    'raster': lambda da: cvs.raster(da),
+}
+
+
+@pytest.mark.parametrize('glyph', sorted(axis0_glyphs))
+@pytest.mark.benchmark(group="glyphs")
+def test_axis0(benchmark_memory, long_source, glyph):
+    benchmark_memory(axis0_glyphs[glyph], long_source)
+
+
+@pytest.mark.parametrize('glyph', sorted(axis1_glyphs))
+@pytest.mark.benchmark(group="glyphs")
+def test_axis1(benchmark_memory, wide_source, glyph):
+    xs = [c for c in wide_source.columns if c.startswith('x')]
+    ys = [c for c in wide_source.columns if c.startswith('y')]
+    vertices = np.arange(len(xs), dtype='f8')
+    benchmark_memory(axis1_glyphs[glyph], wide_source, xs, ys, vertices)
+
+
+@pytest.mark.parametrize('glyph', sorted(ragged_glyphs))
+@pytest.mark.benchmark(group="glyphs")
+def test_ragged(benchmark_memory, ragged_source, glyph):
+    benchmark_memory(ragged_glyphs[glyph], ragged_source)
+
+
+@pytest.mark.benchmark(group="glyphs")
+def test_trimesh(benchmark_memory, trimesh_source):
+    verts, tris, mesh = trimesh_source
+    benchmark_memory(cvs.trimesh, verts, tris, mesh=mesh)
+
+
+@pytest.mark.parametrize('glyph', sorted(grid_glyphs))
+@pytest.mark.benchmark(group="glyphs")
+def test_grid(benchmark_memory, grid_source, glyph):
+    benchmark_memory(grid_glyphs[glyph], grid_source)
@@ -0,0 +1,54 @@
+import pytest
+
+import datashader as ds
+
+cvs = ds.Canvas(plot_width=900, plot_height=300)
+
+reductions = {
+    'count': ds.count(),
+    'count_field': ds.count('z'),
+    'any': ds.any(),
+    'sum': ds.sum('z'),
+    'min': ds.min('z'),
+    'max': ds.max('z'),
+    'mean': ds.mean('z'),
+    'var': ds.var('z'),
+    'std': ds.std('z'),
+    'count_cat': ds.count_cat('cat'),
+    'count_cat_topk': ds.count_cat_topk('cat', 3),
+    'by': ds.by('cat', ds.mean('z')),
+    'quantile': ds.quantile('z', 0.9, range=(0, 1)),
+    'median': ds.median('z', range=(0, 1)),
+    'count_distinct': ds.count_distinct('i'),
+    'argmin': ds.argmin('z'),
+    'argmax': ds.argmax('z'),
+    'first_index': ds.first_index(),
+    'last_index': ds.last_index(),
+    'first': ds.first('z'),
+    'last': ds.last('z'),
+    'summary': ds.summary(count=ds.count(), mean=ds.mean('z'),
+                          std=ds.std('z'), max=ds.max('z')),
+}
+
+
+@pytest.mark.parametrize('reduction', sorted(reductions))
+@pytest.mark.benchmark(group="reductions")
+def test_points(benchmark_memory, long_source, reduction):
+    benchmark_memory(cvs.points, long_source, 'x', 'y',
+                     reductions[reduction])
+
+
+@pytest.mark.parametrize('reduction', ['count', 'max', 'count_cat',
+                                       'summary'])
+@pytest.mark.benchmark(group="reductions")
+def test_line(benchmark_memory, long_source, reduction):
+    benchmark_memory(cvs.line, long_source, 't', 'y0',
+                     reductions[reduction])
+
+
+@pytest.mark.parametrize('reduction', ['mean', 'max', 'mode'])
+@pytest.mark.benchmark(group="reductions")
+def test_raster(benchmark_memory, grid_source, reduction):
+    # mode is only supported for rasters
+    benchmark_memory(cvs.raster, (grid_source * 10).astype('i8'),
+                     agg=reduction)
@@ -0,0 +1,50 @@
+import pytest
+
+import numpy as np
+import pandas as pd
+
+import datashader as ds
+import datashader.transfer_functions as tf
+
+
+@pytest.fixture(scope='module')
+def aggs(rows, canvas_size):
+    """Count and categorical count aggregates of ``rows`` normally
+    distributed points, with the shape of ``canvas_size``"""
+    rng = np.random.RandomState(0)
+    df = pd.DataFrame({'x': rng.normal(size=rows), 'y': rng.normal(size=rows),
+                       'cat': pd.Categorical.from_codes(
+                           rng.randint(0, 3, rows), ['a', 'b', 'c'])})
+    width, height = canvas_size
+    cvs = ds.Canvas(plot_width=width, plot_height=height)
+    return cvs.points(df, 'x', 'y'), cvs.points(df, 'x', 'y',
+                                               ds.count_cat('cat'))
+
+
+@pytest.mark.parametrize('how', ['eq_hist', 'linear', 'log', 'cbrt'])
+@pytest.mark.benchmark(group="transfer_functions")
+def test_shade(benchmark_memory, aggs, how):
+    benchmark_memory(tf.shade, aggs[0], how=how)
+
+
+@pytest.mark.parametrize('how', ['eq_hist', 'linear'])
+@pytest.mark.benchmark(group="transfer_functions")
+def test_shade_categorical(benchmark_memory, aggs, how):
+    benchmark_memory(tf.shade, aggs[1], how=how)
+
+
+@pytest.mark.parametrize('px', [1, 3])
+@pytest.mark.benchmark(group="transfer_functions")
+def test_spread(benchmark_memory, aggs, px):
+    benchmark_memory(tf.spread, tf.shade(aggs[0]), px=px)
+
+
+@pytest.mark.benchmark(group="transfer_functions")
+def test_dynspread(benchmark_memory, aggs):
+    benchmark_memory(tf.dynspread, tf.shade(aggs[0]))
+
+
+@pytest.mark.benchmark(group="transfer_functions")
+def test_stack(benchmark_memory, aggs):
+    img = tf.shade(aggs[0])
+    benchmark_memory(tf.stack, img, tf.shade(aggs[1]), tf.set_background(img))
@@ -0,0 +1,124 @@
+from __future__ import absolute_import
+import numpy as np
+import pandas as pd
+import pytest
+
+import datashader as ds
+
+pa = pytest.importorskip('pyarrow')
+
+from datashader.data_libraries.arrow import ArrowBatches  # noqa (after importorskip)
+
+
+n = 1000
+rng = np.random.RandomState(0)
+x = rng.rand(n)
+y = rng.rand(n)
+v = rng.rand(n)
+v[::7] = np.nan
+cats = np.array(['b', 'a', 'c'])[rng.randint(0, 3, n)]
+
+# Categories in order of first appearance, as in the Arrow dictionaries
+df_pd = pd.DataFrame({'x': x, 'y': y, 'v': v, 'i': np.arange(n),
+                      'cat': pd.Categorical(cats,
+                                            categories=pd.unique(cats))})
+
+
+def record_batch(rows):
+    return pa.RecordBatch.from_arrays(
+        [pa.array(x[rows]), pa.array(y[rows]), pa.array(v[rows]),
+         pa.array(np.arange(n)[rows]),
+         pa.array(cats[rows]).dictionary_encode()],
+        ['x', 'y', 'v', 'i', 'cat'])
+
+
+table = pa.Table.from_batches([record_batch(slice(None))])
+# Batches with their own dictionaries, including a single row batch
+chunked_table = pa.Table.from_batches([record_batch(slice(0, 300)),
+                                       record_batch(slice(300, 301)),
+                                       record_batch(slice(301, 700)),
+                                       record_batch(slice(700, None))])
+tables = [table, chunked_table]
+
+cvs = ds.Canvas(plot_width=20, plot_height=20)
+cvs_ranged = ds.Canvas(plot_width=20, plot_height=20,
+                       x_range=(0, 1), y_range=(0, 1))
+
+
+@pytest.mark.parametrize('source', tables)
+@pytest.mark.parametrize('agg', [ds.count(), ds.mean('v'), ds.sum('i'),
+                                 ds.count_cat('cat'), ds.argmax('v'),
+                                 ds.first('v'), ds.count_distinct('i'),
+                                 ds.by('cat', ds.max('v'))])
+def test_points(source, agg):
+    out = cvs.points(source, 'x', 'y', agg)
+    assert out.equals(cvs.points(df_pd, 'x', 'y', agg))
+
+
+@pytest.mark.parametrize('source', tables)
+@pytest.mark.parametrize('glyph', ['line', 'area'])
+def test_connected_glyphs(source, glyph):
+    method = getattr(cvs, glyph)
+    for agg in [ds.count(), ds.max('v')]:
+        out = method(source, 'x', 'y', agg)
+        assert out.equals(method(df_pd, 'x', 'y', agg))
+    out = cvs.line(source, ['x', 'v'], ['y', 'y'], ds.count())
+    assert out.equals(cvs.line(df_pd, ['x', 'v'], ['y', 'y'], ds.count()))
+
+
+def test_record_batch():
+    batch = chunked_table.to_batches()[2]
+    out = cvs.points(batch, 'x', 'y', ds.count_cat('cat'))
+    expected = cvs.points(df_pd.iloc[301:700], 'x', 'y', ds.count_cat('cat'))
+    # The categories are in the order of the batch's dictionary
+    categories = batch.column(4).dictionary.to_pylist()
+    assert out.equals(expected.sel(cat=categories))
+
+
+@pytest.mark.parametrize('canvas', [cvs, cvs_ranged])
+def test_record_batch_reader(canvas):
+    reader = pa.RecordBatchReader.from_batches(chunked_table.schema,
+                                               chunked_table.to_batches())
+    out = canvas.line(reader, 'x', 'y', ds.count_cat('cat'))
+    assert out.equals(canvas.line(df_pd, 'x', 'y', ds.count_cat('cat')))
+
+
+def test_reader_unknown_category():
+    batches = [record_batch(slice(0, 10)),
+               pa.RecordBatch.from_arrays(
+                   [pa.array([0.5]), pa.array([0.5]), pa.array([0.5]),
+                    pa.array([0]), pa.array(['d']).dictionary_encode()],
+                   ['x', 'y', 'v', 'i', 'cat'])]
+    reader = pa.RecordBatchReader.from_batches(batches[0].schema, batches)
+    with pytest.raises(ValueError, match="not in the dictionary"):
+        cvs_ranged.points(reader, 'x', 'y', ds.count_cat('cat'))
+
+
+def test_bypixel_many():
+    canvases = [cvs, ds.Canvas(plot_width=7, plot_height=5,
+                               x_range=(0.2, 0.6), y_range=(0.1, 0.9))]
+    aggs = [ds.count(), ds.count_cat('cat')]
+    glyph = ds.glyphs.LineAxis0('x', 'y')
+    out = ds.bypixel_many(chunked_table, canvases, glyph, aggs)
+    expected = ds.bypixel_many(df_pd, canvases, glyph, aggs)
+    for a, b in zip(out, expected):
+        assert a.equals(b)
+
+
+def test_zero_copy():
+    values = np.arange(4.)
+    codes = np.array([0, 1, 1, 0], dtype='i1')
+    source = pa.table({'x': values,
+                       'cat': pa.DictionaryArray.from_arrays(
+                           codes, pa.array(['a', 'b']))})
+    frame, = ArrowBatches(source, ['x', 'cat']).frames()
+    assert np.shares_memory(frame['x'].values, values)
+    assert np.shares_memory(frame['cat'].cat.codes.values, codes)
+
+
+def test_invalid():
+    source = pa.table({'x': pa.array([0., 1.]), 'y': pa.array([0, None])})
+    with pytest.raises(ValueError, match="missing values"):
+        cvs_ranged.points(source, 'x', 'y')
+    with pytest.raises(KeyError):
+        cvs_ranged.points(source, 'x', 'z')
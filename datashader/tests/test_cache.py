@@ -0,0 +1,89 @@
+import gc
+
+import numpy as np
+import pandas as pd
+import dask.dataframe as dd
+import pytest
+import xarray as xr
+
+import datashader as ds
+from datashader import core
+
+
+df = pd.DataFrame({'x': np.arange(20, dtype='f8'),
+                   'y': np.arange(20, dtype='f8') % 5,
+                   'v': np.arange(20, dtype='i8')})
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ds.AggregateCache()
+    monkeypatch.setattr(core.bypixel, 'cache', cache)
+    return cache
+
+
+@pytest.mark.parametrize('source', [df, dd.from_pandas(df, npartitions=2)])
+def test_cache_hit(cache, source):
+    cvs = ds.Canvas(plot_width=4, plot_height=3)
+    agg = cvs.points(source, 'x', 'y', ds.sum('v'))
+    assert (cache.hits, cache.misses, len(cache)) == (0, 1, 1)
+    assert cvs.points(source, 'x', 'y', ds.sum('v')) is agg
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.nbytes == agg.nbytes
+
+    # Different viewports, reductions and glyphs miss
+    cvs2 = ds.Canvas(plot_width=4, plot_height=3, x_range=(0, 10))
+    agg2 = cvs2.points(source, 'x', 'y', ds.sum('v'))
+    assert not agg2.equals(agg)
+    cvs.points(source, 'x', 'y', ds.count())
+    cvs.points(source, 'y', 'x', ds.sum('v'))
+    assert (cache.hits, cache.misses, len(cache)) == (1, 4, 4)
+
+
+def test_cache_modified_source(cache):
+    source = df.copy()
+    cvs = ds.Canvas(plot_width=4, plot_height=3)
+    agg = cvs.points(source, 'x', 'y', ds.sum('v'))
+    source.loc[len(source) - 1, 'v'] = 100
+    agg2 = cvs.points(source, 'x', 'y', ds.sum('v'))
+    assert cache.hits == 0
+    assert agg2.sum() == agg.sum() + 100 - 19
+
+
+def test_cache_freed_source(cache):
+    cvs = ds.Canvas(plot_width=4, plot_height=3)
+    source = df.copy()
+    cvs.points(source, 'x', 'y', ds.sum('v'))
+    assert len(cache) == 1
+    del source
+    gc.collect()
+
+    # The aggregates of a freed DataFrame are evicted before its id can be
+    # reused by a new one
+    agg = cvs.points(df.copy(), 'x', 'y', ds.sum('v'))
+    assert (cache.hits, len(cache), cache.nbytes) == (0, 1, agg.nbytes)
+    assert len(cache._sources) == 1
+
+
+def test_cache_eviction():
+    agg = xr.DataArray(np.zeros((10, 10)))
+    cache = ds.AggregateCache(max_bytes=2 * agg.nbytes)
+    cache.put('a', agg)
+    cache.put('b', agg)
+    assert cache.get('a') is agg
+    cache.put('c', agg)
+    assert 'b' not in cache
+    assert 'a' in cache and 'c' in cache
+    assert cache.evictions == 1
+    assert cache.nbytes == 2 * agg.nbytes
+
+    # Aggregates larger than the budget are not cached
+    cache.put('d', xr.DataArray(np.zeros((20, 20))))
+    assert 'd' not in cache
+    cache.clear()
+    assert len(cache) == cache.nbytes == cache.hits == 0
+
+
+def test_cache_unsupported_source(cache):
+    source = xr.Dataset({'v': ('x', np.arange(3.))}, coords={'x': np.arange(3.)})
+    assert cache.key(source, ds.Canvas(), ds.Point('x', 'v'), ds.count()) is None
@@ -1016,3 +1016,196 @@ def test_trimesh_dask_partitions(npartitions):
     ], dtype='i4')
     np.testing.assert_array_equal(
         np.flipud(agg.fillna(0).astype('i4').values)[:5], sol)
+
+
+def test_bounds_cached_by_token(monkeypatch):
+    from datashader.data_libraries import dask as ds_dask
+    monkeypatch.setattr(ds_dask, '_bounds_cache', ds_dask.OrderedDict())
+    pdf = pd.DataFrame({'x': [0., 1., 4.], 'y': [2., 3., 5.]})
+    ddf = dd.from_pandas(pdf, npartitions=2)
+    cvs = ds.Canvas(plot_width=2, plot_height=2)
+    agg = cvs.points(ddf, 'x', 'y')
+
+    calls = []
+    original = ds.Point.compute_bounds_dask
+
+    def compute_bounds_dask(self, df):
+        calls.append(df)
+        return original(self, df)
+
+    monkeypatch.setattr(ds.Point, 'compute_bounds_dask', compute_bounds_dask)
+    # An equivalent DataFrame has the same token, and reuses the bounds
+    assert_eq(cvs.points(dd.from_pandas(pdf, npartitions=2), 'x', 'y'), agg)
+    assert calls == []
+
+    # Different glyph columns or data recompute them
+    cvs.points(ddf, 'y', 'x')
+    cvs.points(dd.from_pandas(pdf * 2, npartitions=2), 'x', 'y')
+    assert len(calls) == 2
+
+
+@pytest.mark.parametrize('split_every', [None, 2, 3])
+@pytest.mark.parametrize('reduction', [ds.count(), ds.sum('f64'),
+                                       ds.min('f64'), ds.std('f64'),
+                                       ds.count_cat('cat')])
+def test_combine_tree(monkeypatch, split_every, reduction):
+    from datashader.data_libraries import dask as ds_dask
+    monkeypatch.setattr(ds_dask, 'split_every', split_every)
+    cvs = ds.Canvas(plot_width=3, plot_height=3, x_range=(0, 1),
+                    y_range=(0, 1))
+    ddf = dd.from_pandas(df_pd, npartitions=7)
+    expected = cvs.points(df_pd, 'x', 'y', reduction)
+    xr.testing.assert_allclose(cvs.points(ddf, 'x', 'y', reduction), expected)
+    xr.testing.assert_allclose(cvs.line(ddf, 'x', 'y', reduction),
+                               cvs.line(df_pd, 'x', 'y', reduction))
+
+
+def test_combine_tree_invalid(monkeypatch):
+    from datashader.data_libraries import dask as ds_dask
+    monkeypatch.setattr(ds_dask, 'split_every', 1)
+    with pytest.raises(ValueError):
+        c.points(_ddf, 'x', 'y')
+
+
+def test_column_projection(monkeypatch):
+    columns = []
+    dshape_from_dask = ds.core.dshape_from_dask
+
+    def record_columns(df):
+        columns.append(list(df.columns))
+        return dshape_from_dask(df)
+
+    monkeypatch.setattr(ds.core, 'dshape_from_dask', record_columns)
+    assert_eq(c.points(_ddf, 'x', 'y', ds.mean('f64')),
+              c.points(df_pd, 'x', 'y', ds.mean('f64')))
+    c.points(_ddf, 'x', 'y', ds.count_cat('cat'))
+    assert columns == [['x', 'y', 'f64'], ['x', 'y', 'cat']]
+
+
+@pytest.mark.parametrize('glyph', ['points', 'line'])
+def test_prune_partitions(monkeypatch, glyph):
+    from datashader.data_libraries import dask as ds_dask
+    monkeypatch.setattr(ds_dask, 'prune_partitions', True)
+    monkeypatch.setattr(ds_dask, '_partition_bounds_cache',
+                        ds_dask.OrderedDict())
+    # Each partition spans a distinct x interval
+    x = np.arange(40, dtype='f8')
+    pdf = pd.DataFrame({'x': x, 'y': np.sin(x)})
+    ddf = dd.from_pandas(pdf, npartitions=4)
+    cvs = ds.Canvas(plot_width=10, plot_height=5, x_range=(12, 18.5),
+                    y_range=(-1, 1))
+
+    expected = getattr(cvs, glyph)(pdf, 'x', 'y')
+    assert_eq(getattr(cvs, glyph)(ddf, 'x', 'y'), expected)
+    point = ds.Point('x', 'y')
+    assert ds_dask.visible_partitions(ddf, cvs, point) == [1]
+    # Lines are joined to the last point of the previous partition
+    assert ds_dask.visible_partitions(ddf, cvs, point, connected=True) == [1, 2]
+
+    # Partitions outside the viewport are not computed
+    def no_compute(part):
+        raise AssertionError("pruned partition computed")
+
+    parts = [ddf.get_partition(i) for i in range(4)]
+    parts[3] = parts[3].map_partitions(no_compute, meta=parts[3]._meta)
+    pruned = dd.concat(parts, interleave_partitions=False)
+    cvs2 = ds.Canvas(plot_width=10, plot_height=5, x_range=(0, 5),
+                     y_range=(-1, 1))
+    # Provide the partition bounds, which would otherwise compute them all
+    bounds_glyph = ds_dask.LineAxis0('x', 'y') if glyph == 'line' else point
+    monkeypatch.setitem(ds_dask._partition_bounds_cache,
+                        (pruned.__dask_tokenize__(), bounds_glyph),
+                        ds_dask.partition_bounds(ddf, point))
+    assert_eq(getattr(cvs2, glyph)(pruned, 'x', 'y'),
+              getattr(cvs2, glyph)(pdf, 'x', 'y'))
+
+
+def test_prune_partitions_empty_viewport(monkeypatch):
+    from datashader.data_libraries import dask as ds_dask
+    monkeypatch.setattr(ds_dask, 'prune_partitions', True)
+    cvs = ds.Canvas(plot_width=2, plot_height=2, x_range=(10, 11),
+                    y_range=(10, 11))
+    assert_eq(cvs.points(_ddf, 'x', 'y'), cvs.points(df_pd, 'x', 'y'))
+
+
+@pytest.mark.parametrize('npartitions', [1, 3, 7])
+def test_count_cat_topk(npartitions):
+    n = 5000
+    rng = np.random.RandomState(2)
+    pdf = pd.DataFrame({'x': rng.uniform(0, 1, n), 'y': rng.uniform(0, 1, n),
+                        'cat': pd.Categorical(rng.zipf(1.5, n) % 20)})
+    ddf = dd.from_pandas(pdf, npartitions=npartitions)
+    agg = c.points(ddf, 'x', 'y', ds.count_cat_topk('cat', k=3))
+    expected = c.points(pdf, 'x', 'y', ds.count_cat('cat')).values
+    totals = expected.sum(axis=2)
+    np.testing.assert_array_equal(agg.sum(dim='cat_top3'), totals)
+    # Merged summaries keep every category above the error bound
+    codes = agg['cat_top3_codes'].values
+    for y, x in np.ndindex(*totals.shape):
+        heavy = np.flatnonzero(expected[y, x] > totals[y, x] / 4)
+        assert set(heavy) <= set(codes[y, x])
+
+
+@pytest.mark.parametrize('npartitions', [1, 3])
+@pytest.mark.parametrize('reduction', [ds.count(), ds.mean('f64'),
+                                       ds.var('f64'), ds.max('f64')])
+def test_by(npartitions, reduction):
+    ddf = dd.from_pandas(df_pd, npartitions=npartitions)
+    agg = c.points(ddf, 'x', 'y', ds.by('cat', reduction))
+    expected = c.points(df_pd, 'x', 'y', ds.by('cat', reduction))
+    xr.testing.assert_allclose(agg, expected)
+
+
+@pytest.mark.parametrize('npartitions', [1, 3])
+def test_quantile(npartitions):
+    ddf = dd.from_pandas(df_pd, npartitions=npartitions)
+    agg = ds.summary(p50=ds.median('f64', (0, 20)),
+                     p90=ds.quantile('f64', 0.9, (0, 20)))
+    xr.testing.assert_equal(c.points(ddf, 'x', 'y', agg),
+                            c.points(df_pd, 'x', 'y', agg))
+
+
+@pytest.mark.parametrize('npartitions', [1, 3])
+def test_count_distinct(npartitions):
+    # Sketches are merged exactly across partitions
+    ddf = dd.from_pandas(df_pd, npartitions=npartitions)
+    for column in ['i64', 'f64', 'cat']:
+        agg = ds.count_distinct(column)
+        xr.testing.assert_equal(c.points(ddf, 'x', 'y', agg),
+                                c.points(df_pd, 'x', 'y', agg))
+
+
+@pytest.mark.parametrize('npartitions', [1, 3])
+@pytest.mark.parametrize('glyph', ['points', 'line'])
+def test_row_index_reductions(npartitions, glyph):
+    # Rows are numbered across partitions, even if their indexes restart
+    ddf = dd.from_pandas(df_pd, npartitions=npartitions)
+    ddf = ddf.map_partitions(lambda df: df.reset_index(drop=True))
+    agg = ds.summary(argmin=ds.argmin('f64'), argmax=ds.argmax('f64'),
+                     first=ds.first_index(), last=ds.last_index(),
+                     last_v=ds.last('f64'))
+    xr.testing.assert_equal(getattr(c, glyph)(ddf, 'x', 'y', agg),
+                            getattr(c, glyph)(df_pd, 'x', 'y', agg))
+
+
+@pytest.mark.parametrize('glyph', [ds.Point('x', 'y'),
+                                   ds.glyphs.LineAxis0('x', 'y')])
+def test_bypixel_many(glyph):
+    reads = []
+
+    def record_reads(df):
+        reads.append(len(df))
+        return df
+
+    ddf = dd.from_pandas(df_pd, npartitions=3)
+    ddf = ddf.map_partitions(record_reads, meta=ddf._meta)
+    canvases = [c, ds.Canvas(plot_width=5, plot_height=3, x_range=(0, 0.5),
+                             y_range=(0, 1))]
+    aggs = [ds.mean('f64'), ds.summary(c=ds.count(), m=ds.max('f64'))]
+    with config.set(scheduler='sync'):
+        results = ds.bypixel_many(ddf, canvases, glyph, aggs)
+    # Each partition is read once (lines also read the previous partition
+    # of each partition, from the same task output)
+    assert sum(reads) == len(df_pd)
+    for result, canvas, agg in zip(results, canvases, aggs):
+        assert_eq(result, ds.core.bypixel(df_pd, canvas, glyph, agg))
@@ -0,0 +1,124 @@
+from __future__ import absolute_import
+import numpy as np
+import pandas as pd
+
+import datashader as ds
+from datashader import kernel_cache
+from datashader.compiler import compile_components
+from datashader.glyphs import Point
+from datashader.kernel_cache import cache_kernels, kernel_token
+
+import pytest
+
+
+df = pd.DataFrame({'x': np.linspace(0, 1, 20),
+                   'y': np.linspace(0, 1, 20)[::-1],
+                   'a': np.linspace(0, 1, 20),
+                   'b': np.linspace(0, 1, 20)[::-1],
+                   'v': np.arange(20, dtype='f8')})
+cvs = ds.Canvas(plot_width=4, plot_height=4)
+
+
+def _extend(glyph, agg):
+    schema = ds.utils.dshape_from_pandas(df).measure
+    create, info, append, _, _ = compile_components(agg, schema, glyph)
+    return glyph._build_extend(cvs.x_axis.mapper, cvs.y_axis.mapper,
+                               info, append)
+
+
+def _dispatchers(extend):
+    """The CPU dispatchers of ``extend``, which may also hold CUDA ones"""
+    return [d for d in kernel_cache._find_dispatchers(extend)
+            if kernel_cache._is_cpu_dispatcher(d)]
+
+
+def _tokens(extend):
+    return [kernel_token(d) for d in _dispatchers(extend)]
+
+
+def test_kernel_token_deterministic():
+    tokens_xy = _tokens(_extend(Point('x', 'y'), ds.sum('v')))
+    tokens_ab = _tokens(_extend(Point('a', 'b'), ds.sum('v')))
+    tokens_count = _tokens(_extend(Point('x', 'y'), ds.count()))
+
+    # Column names are not part of the compiled code, reductions are
+    assert tokens_xy
+    assert tokens_xy == tokens_ab
+    assert tokens_xy != tokens_count
+
+
+def _closure(value):
+    @ds.utils.ngjit
+    def kernel(x):
+        return x + value
+    return kernel
+
+
+@pytest.mark.parametrize('a,b', [
+    (np.int64(5), np.int64(6)),
+    (np.int64(5), np.int32(5)),
+    (np.float32(0.5), np.float32(0.25)),
+    (np.dtype('f4'), np.dtype('f8')),
+    (5, 6),
+])
+def test_kernel_token_constants(a, b):
+    # Constants are frozen into the compiled code
+    assert kernel_token(_closure(a)) == kernel_token(_closure(a))
+    assert kernel_token(_closure(a)) != kernel_token(_closure(b))
+
+
+def test_cache_kernels_untokenizable(tmpdir, monkeypatch):
+    monkeypatch.setattr(kernel_cache, 'cache_dir', str(tmpdir))
+    kernel = _closure(object())
+    with pytest.raises(TypeError):
+        kernel_token(kernel)
+
+    def extend(x):
+        return kernel(x)
+    with pytest.warns(UserWarning, match="Unable to cache kernel"):
+        cache_kernels(extend)
+    assert not isinstance(kernel._cache, kernel_cache._KernelCache)
+
+
+def test_find_dispatchers_skips_cuda():
+    cuda_dispatcher = type('CUDADispatcher', (kernel_cache.Dispatcher,),
+                           {'__module__': 'numba.cuda.dispatcher'})
+    kernel = _closure(1)
+    cuda_kernel = cuda_dispatcher.__new__(cuda_dispatcher)
+
+    def extend(x, cuda=False):
+        return (cuda_kernel if cuda else kernel)(x)
+    assert list(kernel_cache._find_dispatchers(extend)) == [kernel]
+
+
+def test_cache_kernels_disabled(monkeypatch):
+    monkeypatch.setattr(kernel_cache, 'cache_dir', None)
+    extend = _extend(Point('x', 'y'), ds.max('v'))
+    assert cache_kernels(extend) is extend
+    for d in _dispatchers(extend):
+        assert not isinstance(d._cache, kernel_cache._KernelCache)
+
+
+@pytest.mark.skipif(ds.utils.nb.config.DISABLE_JIT,
+                    reason="requires numba jit")
+def test_cache_kernels_roundtrip(tmpdir, monkeypatch):
+    monkeypatch.setattr(kernel_cache, 'cache_dir', str(tmpdir))
+    schema = ds.utils.dshape_from_pandas(df).measure
+    agg = ds.min('v')
+    vt, bounds = (4., 0., 4., 0.), (0., 1., 0., 1.)
+
+    results = []
+    for glyph in [Point('x', 'y'), Point('a', 'b')]:
+        create = compile_components(agg, schema, glyph)[0]
+        extend = cache_kernels(_extend(glyph, agg))
+        bases = create((4, 4))
+        extend(bases, df, vt, bounds)
+        results.append(bases[0])
+    assert tmpdir.listdir()
+
+    # The second, equivalent kernels are loaded from disk rather than compiled
+    called = [d for d in _dispatchers(extend) if d.signatures]
+    assert called
+    for dispatcher in called:
+        assert sum(dispatcher.stats.cache_hits.values()) == 1
+    np.testing.assert_equal(results[0], results[1])
@@ -0,0 +1,95 @@
+from __future__ import absolute_import
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import datashader as ds
+
+
+n = 1000
+rng = np.random.RandomState(0)
+df_pd = pd.DataFrame(OrderedDict([
+    ('x', rng.rand(n)),
+    ('y', rng.rand(n)),
+    ('v', np.where(np.arange(n) % 7, rng.rand(n), np.nan)),
+    ('i', np.arange(n, dtype='i4')),
+    ('cat', pd.Categorical(rng.choice(['a', 'b', 'c'], n)))]))
+
+cvs = ds.Canvas(plot_width=20, plot_height=20)
+cvs_ranged = ds.Canvas(plot_width=20, plot_height=20,
+                       x_range=(0, 1), y_range=(0, 1))
+
+
+@pytest.fixture
+def source(tmpdir):
+    return ds.MemmapFrame.from_dataframe(df_pd, str(tmpdir), chunk_size=97)
+
+
+@pytest.mark.parametrize('agg', [ds.count(), ds.mean('v'), ds.sum('i'),
+                                 ds.count_cat('cat'), ds.argmax('v'),
+                                 ds.last('v'), ds.by('cat', ds.max('v'))])
+@pytest.mark.parametrize('canvas', [cvs, cvs_ranged])
+def test_points(source, canvas, agg):
+    out = canvas.points(source, 'x', 'y', agg)
+    assert out.equals(canvas.points(df_pd, 'x', 'y', agg))
+
+
+@pytest.mark.parametrize('glyph', ['line', 'area'])
+def test_connected_glyphs(source, glyph):
+    method = getattr(cvs, glyph)
+    for agg in [ds.count(), ds.max('v')]:
+        out = method(source, 'x', 'y', agg)
+        assert out.equals(method(df_pd, 'x', 'y', agg))
+
+
+def test_bypixel_many(source):
+    canvases = [cvs, ds.Canvas(plot_width=7, plot_height=5,
+                               x_range=(0.2, 0.6), y_range=(0.1, 0.9))]
+    glyph = ds.glyphs.Point('x', 'y')
+    out = ds.bypixel_many(source, canvases, glyph, ds.count_cat('cat'))
+    expected = ds.bypixel_many(df_pd, canvases, glyph, ds.count_cat('cat'))
+    for a, b in zip(out, expected):
+        assert a.equals(b)
+
+
+def test_memmap_columns(tmpdir):
+    path = str(tmpdir.join('x.npy'))
+    np.save(path, df_pd.x.values)
+    y = np.memmap(str(tmpdir.join('y.dat')), dtype='f8', mode='w+', shape=n)
+    y[:] = df_pd.y.values
+    codes = df_pd.cat.cat.codes.values
+    source = ds.MemmapFrame(OrderedDict([('x', path), ('y', y),
+                                         ('cat', codes)]),
+                            categories={'cat': ['a', 'b', 'c']})
+    assert source.columns == ['x', 'y', 'cat']
+    assert len(source) == n
+    assert isinstance(source.arrays['x'], np.memmap)
+    out = cvs.points(source, 'x', 'y', ds.count_cat('cat'))
+    assert out.equals(cvs.points(df_pd, 'x', 'y', ds.count_cat('cat')))
+
+
+def test_from_dataframe_names(tmpdir):
+    # Column names are not used as file names
+    df = pd.DataFrame(OrderedDict([('x/0', df_pd.x), ('../y', df_pd.y)]))
+    source = ds.MemmapFrame.from_dataframe(df, str(tmpdir.join('data')))
+    assert source.columns == ['x/0', '../y']
+    assert sorted(tmpdir.join('data').listdir()) == [
+        tmpdir.join('data', name)
+        for name in ['column0.npy', 'column1.npy', 'metadata.json']]
+    out = cvs.points(source, 'x/0', '../y')
+    assert out.equals(cvs.points(df, 'x/0', '../y'))
+
+
+def test_invalid(tmpdir):
+    with pytest.raises(ValueError, match="different lengths"):
+        ds.MemmapFrame({'x': np.zeros(3), 'y': np.zeros(4)})
+    with pytest.raises(ValueError, match="integer category codes"):
+        ds.MemmapFrame({'c': np.zeros(3)}, categories={'c': ['a']})
+    with pytest.raises(ValueError, match="not found"):
+        ds.MemmapFrame({'x': np.zeros(3)}, categories={'c': ['a']})
+    with pytest.raises(ValueError, match="dtype object"):
+        ds.MemmapFrame.from_dataframe(df_pd.assign(s=df_pd.cat.astype(str)),
+                                      str(tmpdir))
+    assert tmpdir.listdir() == []
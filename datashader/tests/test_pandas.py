@@ -53,6 +53,24 @@ lincoords = axis.compute_index(axis.compute_scale_and_translate((0, 1), 2), 2)
 coords = OrderedDict([('x', lincoords), ('y', lincoords)])
 dims = ['y', 'x']
 
+# Random points, sorted by x so they also draw lines and areas
+n_random = 10000
+rng = np.random.RandomState(42)
+df_random = pd.DataFrame({'x': np.sort(rng.uniform(0, 1, n_random)),
+                          'y': rng.uniform(0, 1, n_random),
+                          'f32': rng.normal(size=n_random).astype('f4'),
+                          'f64': rng.normal(size=n_random),
+                          'cat': pd.Categorical(rng.choice(list('abcd'),
+                                                           n_random)),
+                          # Skewed categories
+                          'zipf': pd.Categorical(
+                              rng.zipf(1.5, n_random) % 20),
+                          'gamma': rng.gamma(2, 2, n_random),
+                          'user': rng.randint(0, 10**9, n_random),
+                          # Values with many ties
+                          'i': rng.randint(0, 50, n_random).astype('f8')})
+df_random.loc[::17, 'f64'] = np.nan
+
 
 def assert_eq_xr(agg, b):
     """Assert that two xarray DataArrays are equal, handling the possibility
@@ -72,6 +90,24 @@ def assert_eq_ndarray(data, b):
     np.testing.assert_equal(data, b)
 
 
+def points_bases(agg, df, shape):
+    """Base arrays of the reduction ``agg`` of the points ``x`` and ``y`` of
+    ``df`` over the unit square, binned into ``(height, width)`` bins"""
+    from datashader.compiler import compile_components
+    from datashader.glyphs import Point
+
+    glyph = Point('x', 'y')
+    schema = ds.utils.dshape_from_pandas(df).measure
+    create, info, append, _, _ = compile_components(agg, schema, glyph)
+    extend = glyph._build_extend(ds.core.LinearAxis.mapper,
+                                 ds.core.LinearAxis.mapper, info, append)
+    height, width = shape
+    bases = create(shape)
+    extend(bases, df, (float(width), 0., float(height), 0.),
+           (0., 1., 0., 1.))
+    return bases
+
+
 def floats(n):
     """Returns contiguous list of floats from initial point"""
     while True:
@@ -1245,3 +1281,375 @@ def test_area_to_line_autorange_gap():
     out = xr.DataArray(sol, coords=[lincoords_y, lincoords_x],
                        dims=['y0', 'x'])
     assert_eq_xr(agg, out)
+
+
+@pytest.mark.parametrize('glyph,agg', [
+    ('points', ds.count()),
+    ('points', ds.sum('f64')),
+    ('points', ds.min('f64')),
+    ('points', ds.std('f64')),
+    ('points', ds.count_cat('cat')),
+    ('points', ds.summary(mean=ds.mean('f64'), max=ds.max('f32'))),
+    ('line', ds.count()),
+    ('area', ds.count()),
+])
+@pytest.mark.parametrize('n_threads', [2, 3, 7])
+def test_threaded_aggregation(monkeypatch, glyph, agg, n_threads):
+    from datashader.data_libraries import pandas as ds_pandas
+
+    cvs = ds.Canvas(plot_width=13, plot_height=11,
+                    x_range=(0, 1), y_range=(0, 1))
+    expected = getattr(cvs, glyph)(df_random, 'x', 'y', agg)
+    monkeypatch.setattr(ds_pandas, 'threads', n_threads)
+    result = getattr(cvs, glyph)(df_random, 'x', 'y', agg)
+    xr.testing.assert_allclose(result, expected)
+
+
+@pytest.mark.parametrize('agg', [
+    ds.count(), ds.any(), ds.sum('f64'), ds.min('f64'), ds.max('f64'),
+    ds.mean('f64'), ds.var('f64'), ds.std('f64'), ds.count_cat('cat'),
+])
+def test_pairwise_combine(agg):
+    from datashader.compiler import compile_components
+    from datashader.glyphs import Point
+
+    df = df_random[['x', 'y', 'f64', 'cat']]
+    schema = ds.utils.dshape_from_pandas(df).measure
+    combine = compile_components(agg, schema, Point('x', 'y'))[3]
+
+    chunks = [points_bases(agg, part, (11, 13))
+              for part in np.array_split(df, 5)]
+    copies = [tuple(b.copy() for b in bases) for bases in chunks]
+    for result, expected in zip(combine(chunks),
+                                points_bases(agg, df, (11, 13))):
+        assert result.dtype == expected.dtype
+        np.testing.assert_allclose(result, expected, atol=1e-10)
+    # The inputs are left untouched
+    for bases, bases_copy in zip(chunks, copies):
+        for b, b_copy in zip(bases, bases_copy):
+            np.testing.assert_array_equal(b, b_copy)
+
+
+@pytest.mark.parametrize('reduction,dtype', [
+    (ds.count, 'uint16'), (ds.count, 'int64'), (ds.sum, 'float32'),
+    (ds.min, 'float32'), (ds.max, 'float32'), (ds.mean, 'float32'),
+    (ds.var, 'float32'), (ds.std, 'float32'),
+])
+def test_accumulator_dtype(reduction, dtype):
+    expected = c.points(df_pd, 'x', 'y', reduction('f64'))
+    agg = c.points(df_pd, 'x', 'y', reduction('f64', dtype=dtype))
+    assert agg.dtype == dtype
+    xr.testing.assert_allclose(agg.astype(expected.dtype), expected,
+                               rtol=1e-6)
+    assert reduction('f64', dtype=dtype) != reduction('f64')
+
+
+def test_accumulator_dtype_count_cat():
+    agg = c.points(df_pd, 'x', 'y', ds.count_cat('cat', dtype='uint16'))
+    assert agg.dtype == 'uint16'
+    assert_eq_xr(agg.astype('i4'), c.points(df_pd, 'x', 'y',
+                                            ds.count_cat('cat')))
+
+
+def test_accumulator_dtype_invalid():
+    with pytest.raises(ValueError):
+        ds.count(dtype='float32')
+    with pytest.raises(ValueError):
+        ds.mean('f64', dtype='int32')
+
+
+def _densify_topk(agg):
+    dense = np.zeros(agg.shape[:2] + (len(agg.attrs['categories']),), 'i4')
+    codes = agg[agg.attrs['codes']].values
+    for (y, x, i), code in np.ndenumerate(codes):
+        if code >= 0:
+            dense[y, x, code] += agg.values[y, x, i]
+    return dense
+
+
+@pytest.mark.parametrize('k', [1, 3, 8])
+@pytest.mark.parametrize('n_threads', [1, 4])
+def test_count_cat_topk(monkeypatch, k, n_threads):
+    from datashader.data_libraries import pandas as ds_pandas
+    monkeypatch.setattr(ds_pandas, 'threads', n_threads)
+
+    cvs = ds.Canvas(plot_width=3, plot_height=2, x_range=(0, 1),
+                    y_range=(0, 1))
+    agg = cvs.points(df_random, 'x', 'y', ds.count_cat_topk('zipf', k=k))
+    expected = cvs.points(df_random, 'x', 'y', ds.count_cat('zipf')).values
+    assert agg.dims == ('y', 'x', 'zipf_top{0}'.format(k))
+    assert agg.shape == (2, 3, k + 1)
+    assert agg.attrs['categories'] == list(df_random.zipf.cat.categories)
+
+    # Totals are exact, and kept counts within the Misra-Gries error bound
+    totals = expected.sum(axis=2)
+    np.testing.assert_array_equal(agg.sum(dim=agg.dims[2]), totals)
+    kept = _densify_topk(agg)
+    error = totals[:, :, None] / (k + 1)
+    assert (kept <= expected).all()
+    assert (kept >= expected - error).all()
+    assert (kept[expected > error] > 0).all()
+    # Kept categories come in decreasing order of count
+    assert (np.diff(agg.values[:, :, :k], axis=2) <= 0).all()
+
+
+def test_count_cat_topk_exact():
+    # Bins with at most k categories are counted exactly
+    agg = c.points(df_pd, 'x', 'y', ds.count_cat_topk('cat', k=2))
+    assert_eq_ndarray(_densify_topk(agg),
+                      c.points(df_pd, 'x', 'y', ds.count_cat('cat')).values)
+    np.testing.assert_array_equal(agg.values[:, :, -1], 0)
+
+
+def test_count_cat_topk_summary():
+    agg = c.points(df_pd, 'x', 'y', ds.summary(
+        top2=ds.count_cat_topk('cat', k=2), top3=ds.count_cat_topk('cat', k=3),
+        cats=ds.count_cat('cat'), n=ds.count()))
+    assert agg.top2.dims == ('y', 'x', 'cat_top2')
+    assert agg.top3.dims == ('y', 'x', 'cat_top3')
+    assert agg.n.dims == ('y', 'x')
+    for name in ['top2', 'top3']:
+        assert_eq_ndarray(_densify_topk(agg[name]), agg.cats.values)
+
+
+@pytest.mark.parametrize('reduction', [
+    ds.count(), ds.count('f64'), ds.any(), ds.sum('f64'), ds.min('f64'),
+    ds.max('f64'), ds.mean('f64'), ds.var('f64'), ds.std('f64')])
+def test_by(reduction):
+    agg = c.points(df_pd, 'x', 'y', ds.by('cat', reduction))
+    assert agg.dims[:2] == ('y', 'x')
+    assert list(agg.coords['cat'].values) == ['a', 'b', 'c', 'd']
+    for cat in agg.coords['cat'].values:
+        expected = c.points(df_pd[df_pd.cat == cat], 'x', 'y', reduction)
+        np.testing.assert_allclose(agg.sel(cat=cat).values, expected.values)
+
+
+def test_by_invalid():
+    with pytest.raises(ValueError):
+        c.points(df_pd, 'x', 'y', ds.by('f64', ds.count()))
+    with pytest.raises(ValueError):
+        ds.by('cat', ds.by('cat', ds.count()))
+    with pytest.raises(ValueError):
+        ds.by('cat', ds.count_cat('cat'))
+
+
+@pytest.mark.parametrize('q', [0, 0.25, 0.5, 0.9, 1])
+def test_quantile(q):
+    df = df_random
+    agg = c.points(df, 'x', 'y', ds.quantile('gamma', q, range=(0, 40),
+                                             bins=400))
+    assert agg.dims == ('y', 'x')
+    groups = df.gamma.groupby([(df.y >= 0.5).astype(int),
+                               (df.x >= 0.5).astype(int)])
+    # Accurate to within the width of a histogram bin
+    lower = groups.quantile(q, interpolation='lower').unstack().values
+    higher = groups.quantile(q, interpolation='higher').unstack().values
+    assert (agg.values >= lower - 0.1).all()
+    assert (agg.values <= higher + 0.1).all()
+
+
+def test_median():
+    agg = c.points(df_pd, 'x', 'y', ds.median('f64', range=(0, 20), bins=200))
+    expected = c.points(df_pd, 'x', 'y', ds.quantile('f64', 0.5, (0, 20), 200))
+    assert_eq_xr(agg, expected)
+    # Empty bins are NaN, and values outside the range are clamped
+    agg = c.points(df_pd, 'x', 'y', ds.median('empty_bin', range=(1, 2),
+                                              bins=10))
+    np.testing.assert_allclose(agg.values, [[1, 1], [1, np.nan]], atol=0.1)
+
+
+def test_quantile_shared_histogram():
+    from datashader.compiler import compile_components
+    from datashader.glyphs import Point
+    agg = ds.summary(p50=ds.median('f64', (0, 20)),
+                     p99=ds.quantile('f64', 0.99, (0, 20)))
+    schema = ds.utils.dshape_from_pandas(df_pd).measure
+    create = compile_components(agg, schema, Point('x', 'y'))[0]
+    assert len(create((2, 2))) == 1
+
+
+def test_quantile_invalid():
+    with pytest.raises(ValueError):
+        ds.quantile('f64', 1.5, range=(0, 1))
+    with pytest.raises(ValueError):
+        ds.quantile('f64', 0.5, range=(1, 0))
+    with pytest.raises(ValueError):
+        ds.median('f64', range=(0, 1), bins=0)
+
+
+def test_count_distinct():
+    # Small counts are estimated nearly exactly, skipping missing values
+    agg = c.points(df_pd, 'x', 'y', ds.count_distinct('f64', precision=12))
+    np.testing.assert_allclose(agg.values, [[4, 5], [5, 5]], rtol=0.01)
+    agg = c.points(df_pd, 'x', 'y', ds.count_distinct('cat'))
+    np.testing.assert_allclose(agg.values, [[1, 1], [1, 1]], rtol=0.02)
+    agg = c.points(df_pd[df_pd.x > 1], 'x', 'y', ds.count_distinct('f64'))
+    np.testing.assert_array_equal(agg.values, 0)
+
+    df = df_random
+    # Enough distinct values per bin for the raw estimate at precision 9
+    agg = c.points(df, 'x', 'y', ds.count_distinct('user', precision=9))
+    expected = df.user.groupby([(df.y >= 0.5).astype(int),
+                                (df.x >= 0.5).astype(int)]).nunique()
+    # Within 4 standard errors
+    np.testing.assert_allclose(agg.values, expected.unstack().values,
+                               rtol=4 * 1.04 / np.sqrt(2**9))
+
+
+def test_count_distinct_invalid():
+    with pytest.raises(ValueError):
+        ds.count_distinct('f64', precision=3)
+    with pytest.raises(ValueError):
+        ds.count_distinct('f64', precision=17)
+
+
+def test_row_index_reductions():
+    out = xr.DataArray([[0, 10], [5, 15]], coords=coords, dims=dims)
+    assert_eq_xr(c.points(df_pd, 'x', 'y', ds.first_index()), out)
+    assert_eq_xr(c.points(df_pd, 'x', 'y', ds.argmin('f64')), out)
+    out = xr.DataArray([[4, 14], [9, 19]], coords=coords, dims=dims)
+    assert_eq_xr(c.points(df_pd, 'x', 'y', ds.last_index()), out)
+    assert_eq_xr(c.points(df_pd, 'x', 'y', ds.argmax('f64')), out)
+    assert_eq_xr(c.points(df_pd, 'x', 'y', ds.last('f64')), out.astype('f8'))
+    # Null values are skipped, and empty bins are -1 (or NaN for values)
+    out = xr.DataArray([[0, 10], [5, -1]], coords=coords, dims=dims)
+    assert_eq_xr(c.points(df_pd, 'x', 'y', ds.first_index('empty_bin')), out)
+    out = xr.DataArray([[1, 10], [5, np.nan]], coords=coords, dims=dims)
+    assert_eq_xr(c.points(df_pd.iloc[1:15], 'x', 'y', ds.first('f64')), out)
+
+
+@pytest.mark.parametrize('threads', [1, 3])
+def test_row_index_positions(threads, monkeypatch):
+    monkeypatch.setattr(ds.data_libraries.pandas, 'threads', threads)
+    # Rows are numbered by position, not by index label
+    df = df_random.set_index(np.random.RandomState(5).permutation(n_random))
+    agg = c.points(df, 'x', 'y', ds.summary(
+        argmin=ds.argmin('i'), argmax=ds.argmax('i'),
+        first=ds.first_index(), last=ds.last_index(), first_v=ds.first('i')))
+    pixel = 2 * (df.y.values >= 0.5) + (df.x.values >= 0.5)
+    for y, x in np.ndindex(2, 2):
+        rows = np.flatnonzero(pixel == 2 * y + x)
+        values = df.i.values[rows]
+        cell = agg.isel(x=x, y=y)
+        assert cell['argmin'] == rows[np.argmin(values)]
+        assert cell['argmax'] == rows[np.argmax(values)]
+        assert cell['first'] == rows[0]
+        assert cell['last'] == rows[-1]
+        assert cell['first_v'] == values[0]
+
+
+@pytest.mark.parametrize('glyph', [ds.Point('x', 'y'),
+                                   ds.glyphs.LineAxis0('x', 'y'),
+                                   ds.glyphs.AreaToZeroAxis0('x', 'y')])
+@pytest.mark.parametrize('n_threads', [1, 3])
+def test_bypixel_many(monkeypatch, glyph, n_threads):
+    from datashader.data_libraries import pandas as ds_pandas
+    monkeypatch.setattr(ds_pandas, 'threads', n_threads)
+    # Several blocks per thread
+    monkeypatch.setattr(ds_pandas, 'block_size', 97)
+
+    df = df_random
+    canvases = [ds.Canvas(plot_width=13, plot_height=11),
+                ds.Canvas(plot_width=5, plot_height=4, x_range=(0.2, 0.6),
+                          y_range=(0.1, 0.9)),
+                ds.Canvas(plot_width=6, plot_height=7, x_axis_type='log',
+                          x_range=(0.01, 1), y_range=(0, 1))]
+    aggs = [ds.count(), ds.mean('f64'),
+            ds.summary(max=ds.max('f64'), last=ds.last_index())]
+    results = ds.bypixel_many(df, canvases, glyph, aggs)
+    for result, canvas, agg in zip(results, canvases, aggs):
+        xr.testing.assert_allclose(
+            result, ds.core.bypixel(df, canvas, glyph, agg))
+
+    # A single reduction applies to every canvas
+    results = ds.bypixel_many(df, canvases, glyph)
+    assert [r.sum() for r in results[:1]] == [
+        ds.core.bypixel(df, canvases[0], glyph, ds.count()).sum()]
+    assert len(results) == 3
+
+
+def test_bypixel_many_invalid():
+    with pytest.raises(ValueError):
+        ds.bypixel_many(df_pd, [c, c], ds.Point('x', 'y'), [ds.count()])
+    assert ds.bypixel_many(df_pd, [], ds.Point('x', 'y')) == []
+
+
+df_chunked = df_random.iloc[::50]
+
+
+@pytest.mark.parametrize('agg', [ds.count(), ds.mean('f64'),
+                                 ds.count_cat('cat'), ds.argmax('f64'),
+                                 ds.first('f64')])
+@pytest.mark.parametrize('glyph', ['points', 'line', 'area'])
+def test_dataframe_chunks(glyph, agg):
+    cvs = ds.Canvas(plot_width=10, plot_height=10)
+    # Chunks numbered from zero, with categories coded differently
+    chunks = [df_chunked.iloc[i:i + 23].reset_index(drop=True)
+              for i in range(0, len(df_chunked), 23)]
+    chunks[1] = chunks[1].assign(
+        cat=chunks[1].cat.cat.reorder_categories(['d', 'c', 'b', 'a']))
+    expected = getattr(cvs, glyph)(df_chunked, 'x', 'y', agg)
+    assert getattr(cvs, glyph)(chunks, 'x', 'y', agg).equals(expected)
+
+    cvs = ds.Canvas(plot_width=10, plot_height=10,
+                    x_range=(0, 1), y_range=(0, 1))
+    expected = getattr(cvs, glyph)(df_chunked, 'x', 'y', agg)
+    out = getattr(cvs, glyph)(iter(chunks), 'x', 'y', agg)
+    assert out.equals(expected)
+
+
+def test_dataframe_chunks_invalid():
+    chunks = [df_chunked.iloc[:100], df_chunked.iloc[100:]]
+    with pytest.raises(ValueError, match="only be read once"):
+        ds.Canvas().points(iter(chunks), 'x', 'y')
+    with pytest.raises(ValueError, match="not in the first DataFrame"):
+        c.points([chunks[0].assign(cat=pd.Categorical(['a'] * 100)),
+                  chunks[1]], 'x', 'y', ds.count_cat('cat'))
+    with pytest.raises(ValueError, match="iterable of pandas DataFrames"):
+        c.points([np.zeros(3)], 'x', 'y')
+    with pytest.raises(KeyError):
+        c.points(chunks, 'x', 'z')
+
+
+def test_warmup():
+    from datashader.glyphs import Point, LineAxis0, AreaToZeroAxis0
+    from datashader.compiler import compile_components
+    from datashader.kernel_cache import _find_dispatchers
+
+    # Columns no other test renders, so none of their kernels are compiled
+    df = pd.DataFrame({'wx': [0.2, 0.7], 'wy': [0.4, 0.9],
+                       'w': np.array([3, 5], dtype='i2'),
+                       'wcat': pd.Categorical(['a', 'b'])})
+    glyph, agg = Point('wx', 'wy'), ds.max('w')
+    schema = ds.utils.dshape_from_pandas(df[['wx', 'wy', 'w']]).measure
+    _, info, append, _, _ = compile_components(agg, schema, glyph)
+    extend = glyph._build_extend(c.x_axis.mapper, c.y_axis.mapper, info, append)
+    dispatchers = list(_find_dispatchers(extend))
+    assert dispatchers
+    assert not any(d.signatures for d in dispatchers)
+
+    ds.warmup(df.iloc[:0], [glyph, LineAxis0('wx', 'wy'),
+                            AreaToZeroAxis0('wx', 'wy')],
+              [ds.count(), agg, ds.count_cat('wcat')],
+              axis_types=[('linear', 'linear'), ('log', 'linear')])
+    signatures = [list(d.signatures) for d in dispatchers]
+    assert all(signatures)
+
+    # The first render reuses the kernels compiled by warmup
+    assert c.points(df, 'wx', 'wy', agg).notnull().any()
+    assert [list(d.signatures) for d in dispatchers] == signatures
+
+
+def test_warmup_cli():
+    from datashader.__main__ import main
+
+    main(['warmup', '--column', 'x:float64', '--column', 'y:float32',
+          '--column', 'cat:category:a,b,c', '--glyph', 'points:x:y',
+          '--glyph', 'line:x:y', '--agg', 'count', '--agg', 'max:y',
+          '--agg', 'count_cat:cat', '--axis', 'linear:log'])
+    with pytest.raises(SystemExit):
+        main(['warmup', '--column', 'x:float64', '--glyph', 'circle:x:y'])
+    # Reductions needing more arguments than a column
+    with pytest.raises(SystemExit):
+        main(['warmup', '--column', 'x:float64', '--glyph', 'points:x:x',
+              '--agg', 'quantile:x'])
@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+import dask.dataframe as dd
+import pytest
+
+import datashader as ds
+import datashader.transfer_functions as tf
+from datashader import core, profiling
+from datashader.data_libraries import pandas as ds_pandas
+
+
+df = pd.DataFrame({'x': np.arange(20, dtype='f8'),
+                   'y': np.arange(20, dtype='f8') % 5,
+                   'v': np.arange(20, dtype='i8')})
+ddf = dd.from_pandas(df, npartitions=2)
+
+
+def stages(profile, name):
+    return [r for r in profile.records if r.stage == name]
+
+
+def test_pandas_stages():
+    cvs = ds.Canvas(plot_width=4, plot_height=3)
+    with profiling.Profile() as profile:
+        img = tf.shade(cvs.points(df, 'x', 'y', ds.sum('v')))
+    names = [r.stage for r in profile.records]
+    assert names == ['schema', 'compile', 'bounds', 'create', 'extend',
+                     'finalize', 'bypixel', 'shade']
+    assert all(r.seconds >= 0 for r in profile.records)
+    extend, = stages(profile, 'extend')
+    assert extend.rows == len(df)
+    create, = stages(profile, 'create')
+    assert create.nbytes == 4 * 3 * 8
+    shade, = stages(profile, 'shade')
+    assert shade.nbytes == img.nbytes
+    assert profiling.callbacks == []
+
+
+def test_ranged_canvas_skips_bounds():
+    cvs = ds.Canvas(plot_width=4, plot_height=3, x_range=(0, 20),
+                    y_range=(0, 5))
+    with profiling.Profile() as profile:
+        cvs.points(df, 'x', 'y', ds.count())
+    assert not stages(profile, 'bounds')
+
+
+def test_threaded_extend(monkeypatch):
+    monkeypatch.setattr(ds_pandas, 'threads', 4)
+    cvs = ds.Canvas(plot_width=4, plot_height=3)
+    with profiling.Profile() as profile:
+        cvs.points(df, 'x', 'y', ds.count())
+    extend, = stages(profile, 'extend')
+    assert extend.rows == len(df)
+    assert extend.nbytes == 4 * 4 * 3 * 4
+    combine, = stages(profile, 'combine')
+
+
+def test_dask_stages():
+    cvs = ds.Canvas(plot_width=4, plot_height=3)
+    with profiling.Profile() as profile:
+        cvs.points(ddf, 'x', 'y', ds.mean('v'))
+    extends = stages(profile, 'extend')
+    assert [r.rows for r in extends] == [10, 10]
+    assert len(stages(profile, 'bounds')) == 1
+    assert len(stages(profile, 'compute')) == 1
+    assert len(stages(profile, 'finalize')) == 1
+
+
+def test_compile_cache_hit():
+    cvs = ds.Canvas(plot_width=4, plot_height=3)
+    agg = ds.max('v')
+    with profiling.Profile() as profile:
+        cvs.points(df, 'x', 'y', agg)
+        cvs.points(df, 'x', 'y', agg)
+    assert [r.cache_hit for r in stages(profile, 'compile')][1:] == [True]
+
+
+def test_aggregate_cache_hit(monkeypatch):
+    monkeypatch.setattr(core.bypixel, 'cache', ds.AggregateCache())
+    cvs = ds.Canvas(plot_width=4, plot_height=3)
+    with profiling.Profile() as profile:
+        cvs.points(df, 'x', 'y', ds.count())
+        cvs.points(df, 'x', 'y', ds.count())
+    assert [r.cache_hit for r in stages(profile, 'bypixel')] == [False, True]
+    assert len(stages(profile, 'extend')) == 1
+
+
+def test_callbacks():
+    records = []
+    profiling.callbacks.append(records.append)
+    try:
+        ds.Canvas(plot_width=4, plot_height=3).points(df, 'x', 'y')
+    finally:
+        profiling.callbacks.remove(records.append)
+    assert [r.stage for r in records][-1] == 'bypixel'
+
+    n = len(records)
+    ds.Canvas(plot_width=4, plot_height=3).points(df, 'x', 'y')
+    assert len(records) == n
+    assert profiling.stage('extend') is profiling._null_stage
+
+
+def test_nested_profiles():
+    cvs = ds.Canvas(plot_width=4, plot_height=3)
+    outer, inner = profiling.Profile(), profiling.Profile()
+    with outer:
+        with inner:
+            pass
+        # Exiting the inner profile leaves the outer one recording
+        cvs.points(df, 'x', 'y')
+        with inner:
+            cvs.points(df, 'x', 'y')
+    assert profiling.callbacks == []
+    assert len(outer.records) == 2 * len(inner.records) > 0
+
+
+def test_totals():
+    cvs = ds.Canvas(plot_width=4, plot_height=3)
+    with profiling.Profile() as profile:
+        for _ in range(3):
+            cvs.points(df, 'x', 'y', ds.count())
+    totals = profile.totals()
+    assert totals.loc['extend', 'runs'] == 3
+    assert totals.loc['extend', 'rows'] == 3 * len(df)
+    assert totals.loc['compile', 'cache_hit'] >= 2
+    assert list(profile.to_dataframe().columns) == list(
+        profiling.StageRecord._fields)
+
+
+def test_stage_records_exceptions():
+    with profiling.Profile() as profile:
+        with pytest.raises(TypeError):
+            tf.shade(df)
+        with pytest.raises(ValueError):
+            with profiling.stage('custom', rows=5):
+                raise ValueError()
+    record, = profile.records
+    assert (record.stage, record.rows) == ('custom', 5)
+
+
+def test_bypixel_many_disabled(monkeypatch):
+    monkeypatch.setattr(core.bypixel, 'cache', ds.AggregateCache())
+    canvases = [ds.Canvas(plot_width=4, plot_height=3)] * 2
+    glyph = ds.glyphs.Point('x', 'y')
+    first = ds.bypixel_many(df, canvases, glyph, [ds.count(), ds.max('v')])
+    second = ds.bypixel_many(df, canvases, glyph, [ds.count(), ds.max('v')])
+    assert [a is b for a, b in zip(first, second)] == [True, True]
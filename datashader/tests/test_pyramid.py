@@ -0,0 +1,82 @@
+from __future__ import absolute_import
+import dask.dataframe as dd
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+import datashader as ds
+from datashader import profiling
+from datashader.glyphs import Point, LineAxis0
+
+import pytest
+
+
+n = 2000
+rng = np.random.RandomState(1)
+df = pd.DataFrame({'x': rng.uniform(-1, 1, n),
+                   'y': rng.normal(size=n),
+                   'v': rng.normal(size=n),
+                   'cat': pd.Categorical(rng.choice(list('abc'), n))})
+df.loc[::11, 'v'] = np.nan
+
+
+@pytest.mark.parametrize('agg', [
+    ds.count(), ds.any(), ds.sum('v'), ds.min('v'), ds.max('v'),
+    ds.mean('v'), ds.var('v'), ds.std('v'), ds.count_cat('cat'),
+    ds.summary(c=ds.count(), s=ds.std('v')),
+])
+@pytest.mark.parametrize('source', [df, dd.from_pandas(df, npartitions=3)])
+def test_pyramid_levels(agg, source):
+    pyramid = ds.AggregatePyramid(source, Point('x', 'y'), agg,
+                                  plot_width=48, plot_height=16)
+    assert pyramid.nlevels == 5
+    for level in range(pyramid.nlevels):
+        canvas = pyramid.canvas(level)
+        assert canvas.plot_width == 48 // 2**level
+        xr.testing.assert_allclose(pyramid.level(level),
+                                   canvas.points(df, 'x', 'y', agg))
+
+
+def test_pyramid_line():
+    pyramid = ds.AggregatePyramid(df, LineAxis0('x', 'y'), ds.count(),
+                                  plot_width=32, plot_height=32,
+                                  x_range=(-1, 1), y_range=(-2, 2))
+    xr.testing.assert_equal(pyramid.level(0),
+                            pyramid.canvas(0).line(df, 'x', 'y', ds.count()))
+
+
+def test_pyramid_dask_single_compute():
+    ddf = dd.from_pandas(df, npartitions=3)
+    with profiling.Profile() as profile:
+        pyramid = ds.AggregatePyramid(ddf, LineAxis0('x', 'y'), ds.count(),
+                                      plot_width=32, plot_height=32,
+                                      x_range=(-1, 1), y_range=(-2, 2))
+    assert [r.stage for r in profile.records].count('compute') == 1
+    xr.testing.assert_equal(pyramid.level(0),
+                            pyramid.canvas(0).line(ddf, 'x', 'y', ds.count()))
+
+
+def test_pyramid_aggregate():
+    pyramid = ds.AggregatePyramid(df, Point('x', 'y'), plot_width=64,
+                                  plot_height=64, x_range=(-1, 1),
+                                  y_range=(-4, 4))
+
+    # Full extent at a quarter of the base resolution
+    cvs = ds.Canvas(plot_width=16, plot_height=16,
+                    x_range=(-1, 1), y_range=(-4, 4))
+    xr.testing.assert_equal(pyramid.aggregate(cvs), pyramid.level(2))
+
+    # Zoomed in to the left half, level 1 has 16 bins across it
+    cvs = ds.Canvas(plot_width=16, plot_height=8,
+                    x_range=(-1, 0), y_range=(-4, 4))
+    agg = pyramid.aggregate(cvs)
+    assert agg.shape == (32, 16)
+    xr.testing.assert_equal(agg, pyramid.level(1).isel(x=slice(0, 16)))
+
+    # Finer than the base level serves the base level
+    cvs = ds.Canvas(plot_width=600, plot_height=600)
+    xr.testing.assert_equal(pyramid.aggregate(cvs), pyramid.level(0))
+
+    with pytest.raises(ValueError):
+        pyramid.aggregate(ds.Canvas(x_range=(1, 10), y_range=(1, 10),
+                                    x_axis_type='log'))
@@ -0,0 +1,138 @@
+from __future__ import absolute_import
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+import datashader as ds
+from datashader.glyphs import Point, LineAxis0
+from datashader.tests.test_pandas import points_bases
+
+import pytest
+
+
+n = 1000
+rng = np.random.RandomState(0)
+df = pd.DataFrame({'x': rng.uniform(0, 1, n),
+                   'y': rng.uniform(0, 1, n),
+                   'v': rng.normal(size=n),
+                   'cat': pd.Categorical(rng.choice(list('abc'), n))})
+df.loc[::13, 'v'] = np.nan
+
+cvs = ds.Canvas(plot_width=9, plot_height=7, x_range=(0, 1), y_range=(0, 1))
+batches = [df.iloc[i:i + 150] for i in range(0, n, 150)]
+
+
+@pytest.mark.parametrize('agg', [
+    ds.count(), ds.any(), ds.sum('v'), ds.min('v'), ds.max('v'),
+    ds.mean('v'), ds.var('v'), ds.std('v'), ds.count_cat('cat'),
+    ds.summary(c=ds.count(), s=ds.std('v')),
+])
+def test_streaming_points(agg):
+    stream = ds.StreamingAggregator(cvs, Point('x', 'y'), agg)
+    for batch in batches:
+        stream.append(batch)
+    assert stream.nrows == n
+    xr.testing.assert_allclose(stream.finalize(),
+                               cvs.points(df, 'x', 'y', agg))
+
+
+def test_streaming_line_connects_batches():
+    stream = ds.StreamingAggregator(cvs, LineAxis0('x', 'y'), ds.count())
+    for batch in batches:
+        stream.append(batch)
+    xr.testing.assert_equal(stream.finalize(),
+                            cvs.line(df, 'x', 'y', ds.count()))
+
+
+@pytest.mark.parametrize('glyph', [Point('x', 'y'), LineAxis0('x', 'y')])
+def test_streaming_row_index(glyph):
+    # Rows are numbered in the order they are appended, whatever the index
+    agg = ds.summary(a=ds.argmin('v'), l=ds.last_index(), f=ds.first('v'))
+    stream = ds.StreamingAggregator(cvs, glyph, agg)
+    for batch in batches:
+        stream.append(batch.reset_index(drop=True))
+    xr.testing.assert_equal(stream.finalize(),
+                            ds.core.bypixel(df, cvs, glyph, agg))
+
+
+def test_streaming_finalize_is_snapshot():
+    stream = ds.StreamingAggregator(cvs, Point('x', 'y'))
+    stream.append(batches[0])
+    first = stream.finalize()
+    expected = first.copy()
+    stream.append(batches[1])
+    xr.testing.assert_equal(first, expected)
+    assert stream.finalize().sum() == len(batches[0]) + len(batches[1])
+
+    stream.reset()
+    assert stream.nrows == 0
+    with pytest.raises(ValueError):
+        stream.finalize()
+
+
+def test_streaming_validation():
+    with pytest.raises(ValueError):
+        ds.StreamingAggregator(ds.Canvas(), Point('x', 'y'))
+
+    stream = ds.StreamingAggregator(cvs, Point('x', 'y'), ds.count_cat('cat'))
+    stream.append(batches[0])
+    other = batches[1].copy()
+    other['cat'] = other['cat'].cat.add_categories(['d'])
+    with pytest.raises(ValueError):
+        stream.append(other)
+    with pytest.raises(TypeError):
+        stream.append(batches[1].values)
+
+
+@pytest.mark.parametrize('agg,retractable', [
+    (ds.count(), True), (ds.count('v'), True), (ds.count_cat('cat'), True),
+    (ds.mean('v'), True), (ds.var('v'), True), (ds.std('v'), True),
+    (ds.summary(c=ds.count(), s=ds.std('v')), True),
+    (ds.sum('v'), False), (ds.min('v'), False), (ds.max('v'), False),
+    (ds.any(), False), (ds.summary(c=ds.count(), m=ds.max('v')), False),
+])
+@pytest.mark.parametrize('resolution', [None, 2])
+def test_windowed(agg, retractable, resolution):
+    window = 3
+    stream = ds.WindowedAggregator(cvs, Point('x', 'y'), agg,
+                                   window=window, resolution=resolution)
+    for t, batch in enumerate(batches):
+        stream.append(batch, timestamp=t)
+        # Batches expire with the latest batch of their bucket
+        if resolution is None:
+            latest = list(range(t + 1))
+        else:
+            latest = [min((s // resolution + 1) * resolution - 1, t)
+                      for s in range(t + 1)]
+        rows = pd.concat([batches[s] for s in range(t + 1)
+                          if latest[s] > t - window])
+        assert stream.nrows == len(rows)
+        xr.testing.assert_allclose(stream.finalize(),
+                                   cvs.points(rows, 'x', 'y', agg))
+    assert (stream._retract is not None) == retractable
+
+    # Expire everything
+    empty = stream.finalize(now=len(batches) + window)
+    assert stream.nrows == 0
+    xr.testing.assert_allclose(empty, cvs.points(df.iloc[:0], 'x', 'y', agg))
+
+
+def test_windowed_line():
+    stream = ds.WindowedAggregator(cvs, LineAxis0('x', 'y'), window=100)
+    for t, batch in enumerate(batches):
+        stream.append(batch, timestamp=t)
+    xr.testing.assert_equal(stream.finalize(),
+                            cvs.line(df, 'x', 'y', ds.count()))
+
+
+def test_m2_retract():
+    from datashader.compiler import compile_retract
+
+    agg = ds.var('v')
+    schema = ds.utils.dshape_from_pandas(df).measure
+    retract = compile_retract(agg, schema)
+    whole, head, tail = [points_bases(agg, rows, (7, 9))
+                         for rows in [df, df[:300], df[300:]]]
+    for result, expected in zip(retract((whole, head)), tail):
+        np.testing.assert_allclose(result, expected, atol=1e-10)
+    assert compile_retract(ds.max('v'), schema) is None
@@ -302,6 +302,35 @@ def test_shade_category(array):
     assert_eq_xr(img, sol)
 
 
+def test_shade_category_sparse():
+    coords = [np.array([0, 1]), np.array([2, 5])]
+    cat_agg = xr.DataArray(np.array([[(0, 12, 0), (3, 0, 3)],
+                                     [(12, 12, 12), (24, 0, 0)]]),
+                           coords=(coords + [['a', 'b', 'c']]),
+                           dims=(dims + ['cats']))
+    # The same counts as (code, count) pairs, with an unused "other" entry
+    codes = np.array([[(1, -1, -1, -1), (0, 2, -1, -1)],
+                      [(0, 1, 2, -1), (0, -1, -1, -1)]])
+    counts = np.array([[(12, 0, 0, 0), (3, 3, 0, 0)],
+                       [(12, 12, 12, 0), (24, 0, 0, 0)]])
+    sparse_dims = dims + ['cats_rank']
+    sparse_agg = xr.DataArray(
+        counts, dims=sparse_dims,
+        coords=OrderedDict([(dims[0], coords[0]), (dims[1], coords[1]),
+                            ('cats', (sparse_dims, codes))]),
+        attrs=dict(categories=['a', 'b', 'c'], codes='cats'))
+
+    colors = [(255, 0, 0), '#0000FF', 'orange']
+    for how in ['log', 'linear']:
+        assert_eq_xr(tf.shade(sparse_agg, color_key=colors, how=how),
+                     tf.shade(cat_agg, color_key=colors, how=how))
+
+    # "Other" rows are mixed in as gray
+    sparse_agg.values[0, 0] = (0, 0, 0, 5)
+    img = tf.shade(sparse_agg, color_key=colors, how='linear')
+    assert img.values[0, 0] & 0xffffff == 0x808080
+
+
 coords2 = [np.array([0, 2]), np.array([3, 5])]
 img1 = tf.Image(np.array([[0xff00ffff, 0x00000000],
                           [0x00000000, 0xff00ff7d]], dtype='uint32'),
@@ -1,6 +1,9 @@
 from __future__ import absolute_import
+import numpy as np
+import pandas as pd
 from datashape import dshape
 
+from datashader import utils
 from datashader.utils import Dispatcher, isreal
 
 
@@ -26,3 +29,32 @@ def test_isreal():
     assert isreal('float64')
     assert not isreal('complex64')
     assert not isreal('{x: int64, y: float64}')
+
+
+def test_dshape_from_pandas_cached(monkeypatch):
+    monkeypatch.setattr(utils, '_dshape_cache', utils.OrderedDict())
+    calls = []
+    helper = utils.dshape_from_pandas_helper
+
+    def counting_helper(col):
+        calls.append(col.name)
+        return helper(col)
+
+    monkeypatch.setattr(utils, 'dshape_from_pandas_helper', counting_helper)
+    df = pd.DataFrame({'x': np.arange(3.), 'y': np.arange(3.),
+                       'cat': pd.Categorical(['a', 'b', 'a'])})
+    expected = 3 * utils.datashape.Record([(k, helper(df[k])) for k in df])
+    for _ in range(2):
+        assert utils.dshape_from_pandas(df) == expected
+    assert calls == ['x', 'cat']
+
+    # The same categories are recognized in other frames
+    assert utils.dshape_from_pandas(df.iloc[:2]).measure == expected.measure
+    assert calls == ['x', 'cat']
+
+    # Different categories or ordering are not confused
+    df['cat'] = pd.Categorical(['a', 'b', 'c'])
+    assert 'c' in utils.dshape_from_pandas(df).measure['cat'].categories
+    df['cat'] = df['cat'].cat.as_ordered()
+    assert utils.dshape_from_pandas(df).measure['cat'].ordered
+    assert calls == ['x', 'cat', 'cat', 'cat']
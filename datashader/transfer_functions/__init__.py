@@ -11,6 +11,7 @@ from PIL.Image import fromarray
 
 from datashader.colors import rgb, Sets1to3
 from datashader.composite import composite_op_lookup, over
+from datashader import profiling
 from datashader.utils import ngjit, orient_array
 
 try:
@@ -310,6 +311,10 @@ def _interpolate(agg, cmap, how, alpha, span, min_alpha, name):
     return Image(img, coords=agg.coords, dims=agg.dims, name=name)
 
 
+# Color of the "other" rows of ``count_cat_topk`` aggregates
+_other_color = (128, 128, 128)
+
+
 def _colorize(agg, color_key, how, min_alpha, name):
     if cupy and isinstance(agg.data, cupy.ndarray):
         from ._cuda_utils import interp
@@ -320,7 +325,15 @@ def _colorize(agg, color_key, how, min_alpha, name):
 
     if not agg.ndim == 3:
         raise ValueError("agg must be 3D")
-    cats = agg.indexes[agg.dims[-1]]
+    # Sparse aggregates (e.g. from ``count_cat_topk``) store the category
+    # codes of their entries in a coordinate, named by the "codes" attribute
+    sparse = 'codes' in agg.attrs
+    if sparse:
+        cats, codes_name = agg.attrs['categories'], agg.attrs['codes']
+        codes = agg.copy(data=agg[codes_name].data).drop(codes_name)
+        agg = agg.drop(codes_name)
+    else:
+        cats = agg.indexes[agg.dims[-1]]
     if color_key is None:
         raise ValueError("Color key must be provided, with at least as many " +
                          "colors as there are categorical fields")
@@ -332,16 +345,24 @@ def _colorize(agg, color_key, how, min_alpha, name):
     if not (0 <= min_alpha <= 255):
         raise ValueError("min_alpha ({}) must be between 0 and 255".format(min_alpha))
     colors = [rgb(color_key[c]) for c in cats]
+    if sparse:
+        # Indexed by the code -1 of "other"
+        colors.append(_other_color)
     rs, gs, bs = map(array, zip(*colors))
     # Reorient array (transposing the category dimension first)
     agg_t = agg.transpose(*((agg.dims[-1],)+agg.dims[:2]))
     data = orient_array(agg_t).transpose([1, 2, 0])
     total = data.sum(axis=2)
+    if sparse:
+        codes = orient_array(codes.transpose(*agg_t.dims)).transpose([1, 2, 0])
+        dot = lambda cs: (data * cs[codes]).sum(axis=2)
+    else:
+        dot = data.dot
     # zero-count pixels will be 0/0, but it's safe to ignore that when dividing
     with np.errstate(divide='ignore', invalid='ignore'):
-        r = (data.dot(rs)/total).astype(np.uint8)
-        g = (data.dot(gs)/total).astype(np.uint8)
-        b = (data.dot(bs)/total).astype(np.uint8)
+        r = (dot(rs)/total).astype(np.uint8)
+        g = (dot(gs)/total).astype(np.uint8)
+        b = (dot(bs)/total).astype(np.uint8)
     offset = total.min()
     mask = np.isnan(total)
     if offset == 0:
@@ -433,12 +454,15 @@ def shade(agg, cmap=["lightblue", "darkblue"], color_key=Sets1to3,
         raise TypeError("agg must be instance of DataArray")
     name = agg.name if name is None else name
 
-    if agg.ndim == 2:
-        return _interpolate(agg, cmap, how, alpha, span, min_alpha, name)
-    elif agg.ndim == 3:
-        return _colorize(agg, color_key, how, min_alpha, name)
-    else:
-        raise ValueError("agg must use 2D or 3D coordinates")
+    with profiling.stage('shade', rows=agg.size) as stage:
+        if agg.ndim == 2:
+            img = _interpolate(agg, cmap, how, alpha, span, min_alpha, name)
+        elif agg.ndim == 3:
+            img = _colorize(agg, color_key, how, min_alpha, name)
+        else:
+            raise ValueError("agg must use 2D or 3D coordinates")
+        stage.nbytes = img.nbytes
+    return img
 
 
 def set_background(img, color=None, name=None):
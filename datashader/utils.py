@@ -1,6 +1,7 @@
 from __future__ import absolute_import, division, print_function
 
 import os
+from collections import OrderedDict
 
 from inspect import getmro
 
@@ -410,9 +411,43 @@ def dshape_from_pandas_helper(col):
     return dshape
 
 
+#: Maximum number of column dtypes whose datashapes are remembered.
+dshape_cache_size = 256
+_dshape_cache = OrderedDict()
+
+
+def _cached_dshape_from_pandas_helper(col):
+    """Memoized ``dshape_from_pandas_helper`` for pandas columns.
+
+    Datashapes are cached by dtype, or for categoricals by the identity of
+    the categories (whose conversion to a ``datashape.Categorical`` is
+    expensive for many categories) and their ordering.
+    """
+    dtype = col.dtype
+    if isinstance(dtype, pd.api.types.CategoricalDtype):
+        categories = dtype.categories
+        key = ('category', id(categories), dtype.ordered)
+    else:
+        categories = None
+        key = dtype
+    entry = _dshape_cache.pop(key, None)
+    if entry is None or entry[0] is not categories:
+        # Keep a reference to the categories, so their id cannot be reused
+        entry = categories, dshape_from_pandas_helper(col)
+    # (Re-)insert as most recently used
+    _dshape_cache[key] = entry
+    while len(_dshape_cache) > dshape_cache_size:
+        _dshape_cache.popitem(last=False)
+    return entry[1]
+
+
 def dshape_from_pandas(df):
     """Return a datashape.DataShape object given a pandas dataframe."""
-    return len(df) * datashape.Record([(k, dshape_from_pandas_helper(df[k]))
+    if isinstance(df, pd.DataFrame):
+        helper = _cached_dshape_from_pandas_helper
+    else:
+        helper = dshape_from_pandas_helper
+    return len(df) * datashape.Record([(k, helper(df[k]))
                                        for k in df.columns])
 
 
@@ -423,7 +458,7 @@ def dshape_from_dask(df):
         col for col in df.columns
         if (isinstance(df[col].dtype, type(pd.Categorical.dtype)) or
             isinstance(df[col].dtype, pd.api.types.CategoricalDtype))
-           and not getattr(df['cat'].cat, 'known', True)]
+           and not getattr(df[col].cat, 'known', True)]
     df = df.categorize(cat_columns, index=False)
     # get_partition(0) used below because categories are sometimes repeated
     # for dask-cudf DataFrames with multiple partitions
@@ -440,6 +475,22 @@ def dshape_from_xarray_dataset(xr_ds):
     ])
 
 
+def with_row_offset(df, offset=0):
+    """Number the rows of the pandas DataFrame ``df`` from ``offset``.
+
+    Returns ``df``, or a shallow copy of it, with a ``RangeIndex`` starting
+    at ``offset``, giving the positions of the rows of a chunk of a larger
+    source to row index reductions like ``argmin``.
+    """
+    index = df.index
+    if (isinstance(index, pd.RangeIndex) and index.start == offset and
+            index.step == 1):
+        return df
+    df = df.copy(deep=False)
+    df.index = pd.RangeIndex(offset, offset + len(df))
+    return df
+
+
 def dataframe_from_multiple_sequences(x_values, y_values):
    """
    Converts a set of multiple sequences (eg: time series), stored as a 2 dimensional
@@ -35,6 +35,7 @@ extras_require = {
         'flake8',
         'nbsmoke >=0.2.6',
         'fastparquet >=0.1.6',  # optional dependency
+        'pyarrow',  # optional dependency
         'pandas >=0.24.1',  # optional ragged array support
     ],
     'examples': [],